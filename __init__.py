@@ -2,5 +2,11 @@ def classFactory(iface):
     """
     QGIS calls this to instantiate the plugin.
     """
+    import time
+    start = time.perf_counter()
     from .clip_raster_layout import ClipRasterLayoutPlugin
-    return ClipRasterLayoutPlugin(iface)
+    plugin = ClipRasterLayoutPlugin(iface)
+    from qgis.core import QgsMessageLog, Qgis
+    QgsMessageLog.logMessage(f"Plugin loaded in {(time.perf_counter() - start) * 1000:.0f} ms",
+                             "ClipRasterLayout", Qgis.Info)
+    return plugin
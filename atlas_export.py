@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: atlas_export.py
+# Atlas PDF export page by page: each page is kept as its own PDF named after
+# a fingerprint of what is drawn on it, only pages whose fingerprint changed
+# are rendered (in headless QGIS processes, atlas_worker.py, or in QGIS), and
+# the pages are merged in atlas order with pypdf.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+import hashlib
+import json
+import math
+import os
+import re
+import subprocess
+import tempfile
+import time
+
+from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtWidgets import QApplication, QProgressDialog
+from qgis.PyQt.QtXml import QDomDocument
+from qgis.core import (QgsApplication, QgsProject, QgsVectorLayer, QgsRasterLayer, QgsVectorFileWriter,
+                       QgsMessageLog, Qgis, QgsLayoutExporter, QgsLayoutItemMap, QgsLayoutItemPicture,
+                       QgsReadWriteContext, QgsFeatureRequest)
+
+from .export_presets import EXPORT_PRESETS, DEFAULT_PRESET, pdf_export_settings
+from .profile_render_pool import python_executable
+
+# pypdf merges the page PDFs; without it only the serial export is available
+try:
+    import pypdf
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+# Qt5/Qt6 compatibility
+if hasattr(Qt, 'WindowModality'):
+    Qt_WindowModal = Qt.WindowModality.WindowModal
+else:
+    Qt_WindowModal = Qt.WindowModal
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'atlas_worker.py')
+
+# Each worker loads the whole project before its first page: below this
+# many pages per worker the start-up costs more than it saves
+MIN_PAGES_PER_WORKER = 8
+
+# Bump when the fingerprint content changes, so older page caches are not reused
+FINGERPRINT_VERSION = 2
+PAGE_FILE = re.compile(r'^[0-9a-f]{40}\.pdf$')
+
+
+def default_workers():
+    """Export processes used by default: each one loads QGIS and the whole
+    project, so one core is left to QGIS and more than 4 rarely pay off
+    (time it with benchmark_export.py --workers)"""
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+def atlas_chunks(count, workers):
+    """Contiguous (start, end) page ranges of nearly equal size"""
+    workers = max(1, min(workers, math.ceil(count / MIN_PAGES_PER_WORKER)))
+    edges = [round(i * count / workers) for i in range(workers + 1)]
+    return [(edges[i], edges[i + 1]) for i in range(workers) if edges[i] < edges[i + 1]]
+
+
+def page_cache_dir(output):
+    """Folder next to the PDF keeping its pages between exports"""
+    return os.path.splitext(output)[0] + '_pages'
+
+
+# Fingerprints ---------------------------------------------------------------
+
+def layout_signature(layout, preset):
+    """Hash of what every page shares: layout items, layer sources and
+    styles, data of the layers shown in the maps, export preset
+
+    Extents of atlas-driven maps are left out, they follow the current
+    atlas feature (which is part of each page fingerprint).
+    """
+    doc = QDomDocument()
+    doc.appendChild(layout.writeXml(doc, QgsReadWriteContext()))
+    atlas_maps = {item.uuid() for item in layout.items()
+                  if isinstance(item, QgsLayoutItemMap) and item.atlasDriven()}
+    items = doc.elementsByTagName('LayoutItem')
+    for i in range(items.count()):
+        element = items.item(i).toElement()
+        if element.attribute('uuid') in atlas_maps:
+            extent = element.firstChildElement('Extent')
+            if not extent.isNull():
+                element.removeChild(extent)
+
+    settings = json.dumps(EXPORT_PRESETS.get(preset, EXPORT_PRESETS[DEFAULT_PRESET]), sort_keys=True)
+    digest = hashlib.sha1(f"{FINGERPRINT_VERSION}|{settings}".encode())
+    digest.update(doc.toString().encode())
+    for layer_id, layer in sorted(layout.project().mapLayers().items()):
+        style = QDomDocument()
+        layer.exportNamedStyle(style)
+        digest.update(f"{layer_id}|{layer.source()}|".encode())
+        digest.update(style.toString().encode())
+    for layer in sorted(_map_layers(layout), key=lambda layer: layer.id()):
+        digest.update(f"|{layer.id()}|{_layer_data_digest(layer)}".encode())
+    return digest.hexdigest()
+
+
+def _map_layers(layout):
+    """Layers drawn by the map items of layout"""
+    layers = set()
+    for item in layout.items():
+        if isinstance(item, QgsLayoutItemMap):
+            if hasattr(item, 'layersToRender'):
+                layers.update(item.layersToRender())
+            elif item.keepLayerSet():
+                layers.update(item.layers())
+            else:
+                layers.update(layout.project().layerTreeRoot().checkedLayers())
+    return layers
+
+
+def _stat_digest(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ''
+    return f"{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def _layer_data_digest(layer):
+    """Digest of the data of layer: feature ids, geometries and attributes of
+    vector layers (edit buffer included), size and modification time of
+    file rasters"""
+    if isinstance(layer, QgsVectorLayer):
+        digest = hashlib.sha1()
+        for feature in layer.getFeatures(QgsFeatureRequest()):
+            digest.update(f"{feature.id()}|{feature.attributes()!r}|".encode())
+            digest.update(bytes(feature.geometry().asWkb()))
+        return digest.hexdigest()
+    if isinstance(layer, QgsRasterLayer):
+        return _stat_digest(layer.source().split('|')[0])
+    # Services (WMS, tiles): only their source and style are known
+    return ''
+
+
+def _file_digest(path):
+    """Digest of an image: its render digest sidecar (profile_renderer.digest_path)
+    when there is one, else size and modification time"""
+    try:
+        with open(path + '.sha1', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    return _stat_digest(path)
+
+
+def page_fingerprint(layout, signature, name):
+    """Hash of the current atlas page: feature geometry and attributes, page
+    name and the images shown (profile charts)"""
+    feature = layout.reportContext().feature()
+    digest = hashlib.sha1(signature.encode())
+    digest.update(bytes(feature.geometry().asWkb()))
+    digest.update(f"|{feature.attributes()!r}|{name}".encode())
+    for item in layout.items():
+        if isinstance(item, QgsLayoutItemPicture):
+            path = item.evaluatedPath()
+            digest.update(f"|{path}|{_file_digest(path)}".encode())
+    return digest.hexdigest()
+
+
+def atlas_pages(layout, preset, fingerprints=True):
+    """(name, fingerprint) of every atlas page, in atlas order
+
+    The fingerprints are None unless fingerprints is True.
+    """
+    signature = layout_signature(layout, preset) if fingerprints else None
+    atlas = layout.atlas()
+    if not atlas.beginRender():
+        raise RuntimeError("Cannot start the atlas")
+    pages = []
+    for page in range(atlas.count()):
+        atlas.seekTo(page)
+        name = atlas.nameForPage(page)
+        pages.append((name, page_fingerprint(layout, signature, name) if fingerprints else None))
+    atlas.endRender()
+    return pages
+
+
+# Rendering ------------------------------------------------------------------
+
+def _write_vector(layer, path, project):
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.layerName = 'data'
+    if hasattr(QgsVectorFileWriter, 'writeAsVectorFormatV3'):
+        result = QgsVectorFileWriter.writeAsVectorFormatV3(layer, path, project.transformContext(), options)
+    else:
+        result = QgsVectorFileWriter.writeAsVectorFormatV2(layer, path, project.transformContext(), options)
+    if result[0] != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f"Cannot save {layer.name()} for the workers: {result[1]}")
+    return f"{path}|layername=data"
+
+
+def worker_job(layout, directory):
+    """What the worker processes need besides the saved project file
+
+    The workers read the project as last saved; nothing is written to the
+    open project. Unsaved changes of the layout (its XML), of the layer
+    styles and of the project variables are sent along, and memory layers
+    (sections, profiles, clip polygons; with unsaved edits) are saved to
+    GeoPackage for the workers to point the layers at. Raises RuntimeError
+    when the project was never saved.
+    """
+    project = layout.project()
+    path = project.absoluteFilePath()
+    if not path or not os.path.exists(path):
+        raise RuntimeError("The project must be saved once for the export processes")
+
+    layers = _map_layers(layout)
+    coverage = layout.atlas().coverageLayer()
+    if coverage is not None:
+        layers.add(coverage)
+    sources, styles = {}, {}
+    for i, layer in enumerate(sorted(layers, key=lambda layer: layer.id())):
+        if isinstance(layer, QgsVectorLayer) and layer.providerType() == 'memory':
+            sources[layer.id()] = _write_vector(layer, os.path.join(directory, f'layer_{i}.gpkg'), project)
+        style = QDomDocument()
+        layer.exportNamedStyle(style)
+        styles[layer.id()] = style.toString()
+
+    context = QgsReadWriteContext()
+    context.setPathResolver(project.pathResolver())
+    doc = QDomDocument()
+    doc.appendChild(layout.writeXml(doc, context))
+    return {'project': path, 'sources': sources, 'styles': styles, 'layout': layout.name(),
+            'layout_xml': doc.toString(), 'variables': project.customVariables()}
+
+
+def _progress(count, parent):
+    progress = QProgressDialog('Exporting atlas pages...', 'Cancel', 0, count, parent)
+    progress.setWindowTitle('Atlas PDF')
+    progress.setWindowModality(Qt_WindowModal)
+    progress.setMinimumDuration(0)
+    return progress
+
+
+def _remove_partial_pages(jobs):
+    """Remove the .part files left by interrupted or failed page exports"""
+    for _, _, path in jobs:
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+
+
+def render_pages_here(layout, jobs, preset, parent=None):
+    """Render [(page, name, path)] in QGIS; False if cancelled"""
+    settings = pdf_export_settings(layout, preset)
+    exporter = QgsLayoutExporter(layout)
+    atlas = layout.atlas()
+    progress = _progress(len(jobs), parent)
+    atlas.beginRender()
+    try:
+        for done, (page, name, path) in enumerate(jobs):
+            if progress.wasCanceled():
+                return False
+            progress.setValue(done)
+            QApplication.processEvents()
+            atlas.seekTo(page)
+            # Written under a temporary name: an interrupted page is never reused
+            result = exporter.exportToPdf(path + '.part', settings)
+            if result != QgsLayoutExporter.Success:
+                raise RuntimeError(f"Export of page {page} ({name}) failed: {result}")
+            os.replace(path + '.part', path)
+    finally:
+        atlas.endRender()
+        progress.close()
+        _remove_partial_pages(jobs)
+    return True
+
+
+def render_pages_parallel(layout, jobs, preset, workers, parent=None):
+    """Render [(page, name, path)] in worker processes; False if cancelled
+
+    Raises RuntimeError when the workers cannot run or one fails.
+    """
+    python = python_executable()
+    if python is None:
+        raise RuntimeError("No Python interpreter found for the workers")
+    with tempfile.TemporaryDirectory(prefix='clip_atlas_') as directory:
+        job = dict(worker_job(layout, directory), prefix=QgsApplication.prefixPath(), preset=preset,
+                   count=layout.atlas().count())
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+        processes = []
+        for start, end in atlas_chunks(len(jobs), workers):
+            job_path = os.path.join(directory, f'job_{start:05d}.json')
+            with open(job_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(job, pages=jobs[start:end]), f)
+            log = open(os.path.join(directory, f'job_{start:05d}.log'), 'w+', encoding='utf-8')
+            processes.append((subprocess.Popen([python, WORKER_SCRIPT, job_path], env=env,
+                                               stdout=subprocess.DEVNULL, stderr=log), log))
+        QgsMessageLog.logMessage(f"Atlas export: {len(jobs)} pages in {len(processes)} worker processes",
+                                 "ClipRasterLayout", Qgis.Info)
+
+        progress = _progress(len(jobs), parent)
+        try:
+            while any(process.poll() is None for process, _ in processes):
+                if progress.wasCanceled():
+                    for process, _ in processes:
+                        process.kill()
+                    for process, _ in processes:
+                        process.wait()
+                    return False
+                progress.setValue(sum(1 for _, _, path in jobs if os.path.exists(path)))
+                QApplication.processEvents()
+                time.sleep(0.1)
+            errors = []
+            for process, log in processes:
+                if process.returncode != 0:
+                    log.seek(0)
+                    errors.append(log.read().strip() or f"exit code {process.returncode}")
+            if errors:
+                raise RuntimeError("\n".join(errors))
+        finally:
+            progress.close()
+            for _, log in processes:
+                log.close()
+            # Killed workers cannot clean up after themselves
+            _remove_partial_pages(jobs)
+    return True
+
+
+def merge_pdfs(paths, output):
+    writer = pypdf.PdfWriter()
+    for path in paths:
+        writer.append(path)
+    with open(output, 'wb') as f:
+        writer.write(f)
+
+
+def _render_pages(layout, pages, paths, workers, preset, reuse, parent):
+    """Render the pages whose file is missing (all unless reuse); the number
+    rendered, or None if cancelled"""
+    jobs = [(page, name, path) for page, ((name, _), path) in enumerate(zip(pages, paths))
+            if not reuse or not os.path.exists(path)]
+
+    remaining = jobs
+    if workers > 1 and len(jobs) >= 2 * MIN_PAGES_PER_WORKER:
+        try:
+            if not render_pages_parallel(layout, jobs, preset, workers, parent):
+                return None
+            remaining = []
+        except (RuntimeError, OSError) as e:
+            QgsMessageLog.logMessage(f"Parallel atlas export failed, rendering the pages in QGIS: {e}",
+                                     "ClipRasterLayout", Qgis.Warning)
+            remaining = [job for job in jobs if not os.path.exists(job[2])]
+    if remaining and not render_pages_here(layout, remaining, preset, parent):
+        return None
+    return len(jobs)
+
+
+def export_atlas(layout, output, workers=1, preset=DEFAULT_PRESET, reuse=True, parent=None):
+    """Export the atlas of layout to output, one page at a time
+
+    Pages whose fingerprint matches a page kept from an earlier export (in
+    page_cache_dir(output)) are reused; the others are rendered by up to
+    workers processes (in QGIS for a single worker or a few pages, or when
+    the workers fail). Without reuse the pages go to a temporary folder and
+    no fingerprints are computed. Returns (pages, reused), or None if
+    cancelled. Raises RuntimeError when the export fails.
+    """
+    if not HAS_PYPDF:
+        raise RuntimeError("pypdf is not installed")
+    project = layout.project() or QgsProject.instance()
+    if project.layoutManager().layoutByName(layout.name()) is None:
+        raise RuntimeError("The layout is not part of the project")
+
+    start_time = time.perf_counter()
+    layout.atlas().updateFeatures()
+    pages = atlas_pages(layout, preset, fingerprints=reuse)
+    if not pages:
+        raise RuntimeError("The atlas has no pages")
+
+    if reuse:
+        cache = page_cache_dir(output)
+        os.makedirs(cache, exist_ok=True)
+        paths = [os.path.join(cache, f'{fingerprint}.pdf') for _, fingerprint in pages]
+        rendered = _render_pages(layout, pages, paths, workers, preset, reuse, parent)
+        if rendered is None:
+            return None
+        merge_pdfs(paths, output)
+        # Pages no longer in the atlas, and pages left unfinished by any earlier run
+        current = {os.path.basename(path) for path in paths}
+        for name in os.listdir(cache):
+            if (PAGE_FILE.match(name) and name not in current) or name.endswith('.pdf.part'):
+                os.remove(os.path.join(cache, name))
+    else:
+        with tempfile.TemporaryDirectory(prefix='clip_atlas_pages_') as directory:
+            paths = [os.path.join(directory, f'{page:05d}.pdf') for page in range(len(pages))]
+            rendered = _render_pages(layout, pages, paths, workers, preset, reuse, parent)
+            if rendered is None:
+                return None
+            merge_pdfs(paths, output)
+
+    reused = len(pages) - rendered
+    QgsMessageLog.logMessage(f"Atlas export ({preset}): {len(pages)} pages, {rendered} rendered, {reused} reused, "
+                             f"{time.perf_counter() - start_time:.1f} s", "ClipRasterLayout", Qgis.Info)
+    return len(pages), reused
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: atlas_worker.py
+# Headless QGIS process rendering atlas pages to one PDF per page.
+# Started by atlas_export.py with the QGIS Python:
+#     python atlas_worker.py job.json
+# Runs as a script: only export_presets.py is imported from the plugin folder.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+import json
+import os
+import sys
+
+
+def render_pages(job):
+    """Render the atlas pages job['pages'] ([page, name, path]) of job['layout']"""
+    from qgis.PyQt.QtXml import QDomDocument
+    from qgis.core import QgsProject, QgsLayoutExporter, QgsPrintLayout, QgsReadWriteContext
+    from export_presets import pdf_export_settings
+
+    # The project as last saved, brought up to date with what QGIS sent
+    project = QgsProject.instance()
+    if not project.read(job['project']):
+        raise RuntimeError(f"Cannot read project: {project.error()}")
+    missing = [layer_id for layer_id in job['styles'] if project.mapLayer(layer_id) is None]
+    if missing:
+        raise RuntimeError(f"{len(missing)} layers of the layout are not in the saved project")
+    # Memory layers were saved to GeoPackage by the exporting QGIS
+    for layer_id, source in job['sources'].items():
+        layer = project.mapLayer(layer_id)
+        layer.setDataSource(source, layer.name(), 'ogr')
+    for layer_id, style in job['styles'].items():
+        doc = QDomDocument()
+        doc.setContent(style)
+        project.mapLayer(layer_id).importNamedStyle(doc)
+    project.setCustomVariables(job['variables'])
+
+    doc = QDomDocument()
+    doc.setContent(job['layout_xml'])
+    context = QgsReadWriteContext()
+    context.setPathResolver(project.pathResolver())
+    layout = QgsPrintLayout(project)
+    if not layout.readXml(doc.documentElement(), doc, context):
+        raise RuntimeError(f"Cannot read layout {job['layout']}")
+    atlas = layout.atlas()
+    if not atlas.beginRender():
+        raise RuntimeError("Cannot start the atlas")
+    if atlas.count() != job['count']:
+        raise RuntimeError(f"Atlas has {atlas.count()} pages here, {job['count']} in QGIS")
+
+    settings = pdf_export_settings(layout, job['preset'])
+    exporter = QgsLayoutExporter(layout)
+    for page, name, path in job['pages']:
+        atlas.seekTo(page)
+        # Same feature order as in QGIS, or the merged PDF would be shuffled
+        if atlas.nameForPage(page) != name:
+            raise RuntimeError(f"Page {page} is '{atlas.nameForPage(page)}' here, '{name}' in QGIS")
+        # Written under a temporary name: an interrupted page is never reused
+        try:
+            result = exporter.exportToPdf(path + '.part', settings)
+            if result != QgsLayoutExporter.Success:
+                raise RuntimeError(f"Export of page {page} ({name}) failed: {result}")
+            os.replace(path + '.part', path)
+        finally:
+            if os.path.exists(path + '.part'):
+                os.remove(path + '.part')
+    atlas.endRender()
+
+
+def main(job_path):
+    with open(job_path, encoding='utf-8') as f:
+        job = json.load(f)
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.core import QgsApplication
+
+    QgsApplication.setPrefixPath(job['prefix'], True)
+    app = QgsApplication([], False)
+    app.initQgis()
+    try:
+        render_pages(job)
+    except Exception as e:
+        print(f"Atlas worker (pages {job['pages'][0][0]}-{job['pages'][-1][0]}): {e}", file=sys.stderr)
+        return 1
+    finally:
+        app.exitQgis()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main(sys.argv[1]))
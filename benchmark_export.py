@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark the PDF export presets (draft/review/print) on a saved project
+
+Exports a layout of the project once per preset, headless, and reports the
+time and file size of each. For an atlas layout only the first --pages
+pages are exported. With --workers the whole atlas is also exported
+page by page (atlas_export.py) with each number of processes, using the
+first preset, to choose the number of export processes. Run it with the
+Python of the QGIS installation.
+
+Usage: python benchmark_export.py PROJECT LAYOUT [--presets draft review print]
+                                  [--pages 10] [--workers 1 2 4] [--prefix /usr]
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PLUGIN_DIR)
+
+
+def export(layout, preset, path, pages):
+    from qgis.core import QgsLayoutExporter
+    from export_presets import pdf_export_settings
+
+    settings = pdf_export_settings(layout, preset)
+    exporter = QgsLayoutExporter(layout)
+    atlas = layout.atlas()
+    if not atlas.enabled():
+        return exporter.exportToPdf(path, settings), 1
+    atlas.beginRender()
+    count = min(pages, atlas.count())
+    result = QgsLayoutExporter.Success
+    for page in range(count):
+        atlas.seekTo(page)
+        result = exporter.exportToPdf(f"{path[:-4]}_{page}.pdf", settings)
+        if result != QgsLayoutExporter.Success:
+            break
+    atlas.endRender()
+    return result, count
+
+
+def time_workers(layout, preset, counts, out_dir):
+    """Print the time of a full atlas export with each number of processes"""
+    # atlas_export uses relative imports: load it through the plugin package
+    sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+    atlas_export = importlib.import_module(f"{os.path.basename(PLUGIN_DIR)}.atlas_export")
+    if not atlas_export.HAS_PYPDF:
+        sys.exit("--workers needs the pypdf package")
+
+    print(f"\n{'workers':>8} {'pages':>6} {'total s':>9} {'s/page':>8}  (preset {preset})")
+    for workers in counts:
+        start = time.perf_counter()
+        result = atlas_export.export_atlas(layout, os.path.join(out_dir, f'atlas_{workers}.pdf'),
+                                           workers, preset, reuse=False)
+        elapsed = time.perf_counter() - start
+        pages = result[0] if result else 0
+        print(f"{workers:>8} {pages:>6} {elapsed:>9.2f} {elapsed / max(pages, 1):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('project')
+    parser.add_argument('layout')
+    parser.add_argument('--presets', nargs='+', default=['draft', 'review', 'print'])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[])
+    parser.add_argument('--prefix', default='/usr')
+    args = parser.parse_args()
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.core import QgsApplication, QgsProject, QgsLayoutExporter
+    QgsApplication.setPrefixPath(args.prefix, True)
+    # GUI enabled: the atlas export shows a progress dialog (offscreen)
+    app = QgsApplication([], bool(args.workers))
+    app.initQgis()
+
+    project = QgsProject.instance()
+    if not project.read(args.project):
+        sys.exit(f"Cannot read {args.project}: {project.error()}")
+    layout = project.layoutManager().layoutByName(args.layout)
+    if layout is None:
+        sys.exit(f"No layout named {args.layout}")
+
+    print(f"{'preset':>8} {'pages':>6} {'total s':>9} {'s/page':>8} {'MB':>8}")
+    with tempfile.TemporaryDirectory() as out_dir:
+        for preset in args.presets:
+            folder = os.path.join(out_dir, preset)
+            os.makedirs(folder)
+            start = time.perf_counter()
+            result, pages = export(layout, preset, os.path.join(folder, 'layout.pdf'), args.pages)
+            elapsed = time.perf_counter() - start
+            if result != QgsLayoutExporter.Success:
+                sys.exit(f"Export with preset {preset} failed: {result}")
+            size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder)) / 1048576
+            print(f"{preset:>8} {pages:>6} {elapsed:>9.2f} {elapsed / max(pages, 1):>8.2f} {size:>8.2f}")
+        if args.workers:
+            if not layout.atlas().enabled():
+                sys.exit(f"{args.layout} has no atlas: --workers needs one")
+            time_workers(layout, args.presets[0], args.workers, out_dir)
+    app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark profile chart rendering (runs outside QGIS)
+
+Compares, for 10/100/1000 synthetic sections:
+  pyplot    new pyplot figure per section, tight bounding box (previous code)
+  fresh     new object-oriented Agg figure per section
+  template  one reusable figure per style (profile_renderer default)
+
+With --formats png svg the same charts are also written as SVG, the vector
+format the layouts can embed instead of PNG.
+
+Usage: python benchmark_profiles.py [--counts 10 100 1000] [--style section]
+                                    [--points 500] [--dpi 150] [--workers N]
+                                    [--formats png svg]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import profile_renderer  # noqa: E402
+
+
+def make_jobs(count, style, points, dpi, out_dir, fmt='png'):
+    rng = np.random.default_rng(0)
+    jobs = []
+    for i in range(count):
+        dist = np.linspace(0, rng.uniform(200, 5000), points)
+        elev = 100 + np.cumsum(rng.normal(0, 1, points))
+        jobs.append({'name': f'S{i:04d}', 'path': os.path.join(out_dir, f'profile_{i:04d}.{fmt}'),
+                     'style': style, 'dpi': dpi, 'distances': dist, 'elevations': elev,
+                     'min': elev - 5, 'max': elev + 5})
+    return jobs
+
+
+def render_pyplot(job):
+    """The per-section pyplot code the renderer replaced"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    dist, elev = job['distances'], job['elevations']
+    fig = plt.figure(figsize=(10, 4))
+    plt.plot(dist, elev, 'b-', linewidth=1.5)
+    plt.fill_between(dist, elev.min(), elev, alpha=0.3)
+    plt.xlabel('Distance (m)')
+    plt.ylabel('Elevation (m)')
+    plt.title(f"Section {job['name']}")
+    plt.grid(True, alpha=0.3)
+    elev_range = elev.max() - elev.min()
+    if elev_range > 0:
+        plt.ylim(elev.min() - elev_range * 0.1, elev.max() + elev_range * 0.1)
+    fig.savefig(job['path'], dpi=job['dpi'], bbox_inches='tight')
+    plt.close(fig)
+
+
+def run(mode, jobs, workers):
+    start = time.perf_counter()
+    if mode == 'pyplot':
+        for job in jobs:
+            render_pyplot(job)
+    elif workers > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            list(pool.map(profile_renderer.render_profile, jobs, [mode == 'template'] * len(jobs),
+                          chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        for job in jobs:
+            profile_renderer.render_profile(job, reuse=(mode == 'template'))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--style', default='section', choices=sorted(profile_renderer.TEMPLATES))
+    parser.add_argument('--points', type=int, default=500)
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--modes', nargs='+', default=['pyplot', 'fresh', 'template'])
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'svg'])
+    args = parser.parse_args()
+    if args.style != 'section' and 'pyplot' in args.modes:
+        args.modes.remove('pyplot')  # the pyplot baseline only exists for sections
+
+    print(f"style={args.style} points={args.points} dpi={args.dpi} workers={args.workers}")
+    print(f"{'sections':>8} {'format':>6} {'mode':>9} {'total s':>9} {'ms/section':>11} {'MB written':>11}")
+    for count in args.counts:
+        for fmt in args.formats:
+            for mode in args.modes:
+                with tempfile.TemporaryDirectory() as out_dir:
+                    jobs = make_jobs(count, args.style, args.points, args.dpi, out_dir, fmt)
+                    elapsed = run(mode, jobs, args.workers)
+                    size = sum(os.path.getsize(j['path']) for j in jobs) / 1048576
+                print(f"{count:>8} {fmt:>6} {mode:>9} {elapsed:>9.2f} {elapsed / count * 1000:>11.1f} {size:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
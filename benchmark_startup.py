@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark the plugin import time (what classFactory costs at QGIS startup)
+
+Each run imports the plugin module in a fresh interpreter, after the QGIS
+modules QGIS itself has already loaded, and reports the median time and
+which heavy modules the import pulled in. Run it with the Python of the
+QGIS installation.
+
+Usage: python benchmark_startup.py [--runs 7] [--compare REV]
+                                   [--plugins-path DIR]
+
+--compare REV also measures the tree at a git revision (e.g. HEAD~1).
+--plugins-path is the QGIS python/plugins folder (for `processing`) when
+it is not found next to the qgis package.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+HEAVY = ('processing', 'numpy', 'matplotlib', 'matplotlib.pyplot',
+         'matplotlib.backends.backend_agg', 'matplotlib.backends.backend_qt5agg')
+
+CHILD = r'''
+import json, os, sys, time
+sys.path[:0] = [{parent!r}] + {plugins!r}
+import qgis.core, qgis.gui
+from qgis.PyQt import QtCore, QtGui, QtWidgets
+try:
+    import qgis
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(qgis.__file__)), 'plugins'))
+except Exception:
+    pass
+start = time.perf_counter()
+__import__({package!r} + '.clip_raster_layout')
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def measure(tree, runs, plugins):
+    parent, package = os.path.split(os.path.abspath(tree))
+    code = CHILD.format(parent=parent, plugins=plugins, package=package, heavy=HEAVY)
+    times, loaded = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        if out.returncode != 0:
+            sys.exit(f"Import failed in {tree}:\n{out.stderr}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result['ms'])
+        loaded = result['loaded']
+    return statistics.median(times), loaded
+
+
+def export_revision(rev, repo, target):
+    """Extract the tree at rev into target/<package name>"""
+    package = os.path.join(target, os.path.basename(os.path.abspath(repo)))
+    os.makedirs(package)
+    archive = subprocess.run(['git', '-C', repo, 'archive', '--format=tar', rev],
+                             capture_output=True, check=True).stdout
+    archive_path = os.path.join(target, 'tree.tar')
+    with open(archive_path, 'wb') as f:
+        f.write(archive)
+    with tarfile.open(archive_path) as tar:
+        tar.extractall(package)
+    return package
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--compare', metavar='REV')
+    parser.add_argument('--plugins-path', action='append', default=[])
+    args = parser.parse_args()
+    plugins = args.plugins_path + ['/usr/share/qgis/python/plugins']
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    trees = [('working tree', here)]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.compare:
+            trees.insert(0, (args.compare, export_revision(args.compare, here, tmp)))
+        print(f"{'tree':>14} {'import ms':>10}  heavy modules loaded")
+        for label, tree in trees:
+            ms, loaded = measure(tree, args.runs, plugins)
+            print(f"{label:>14} {ms:>10.1f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from qgis.PyQt.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                                QComboBox, QListWidget, QListWidgetItem,
                                QPushButton, QCheckBox, QFileDialog,
                                QProgressBar, QMessageBox, QAbstractItemView)
-from qgis.core import (QgsProject, QgsRasterLayer, QgsVectorLayer,
+from qgis.core import (QgsProject, QgsRasterLayer, QgsWkbTypes,
                       QgsProcessing, QgsProcessingFeedback, QgsLayerTreeGroup)
 from qgis.gui import QgsFileWidget
 import processing
@@ -13,6 +13,8 @@ import os
 import re
 from datetime import datetime
 
+from .layer_registry import LayerRegistry
+
 class ClipRasterDialog(QDialog):
     def __init__(self, iface, parent=None):
         super().__init__(parent)
@@ -87,17 +89,16 @@ class ClipRasterDialog(QDialog):
         self.polygon_combo.clear()
         self.raster_list.clear()
         
+        registry = LayerRegistry.instance()
         # Populate polygon layers
-        for layer in QgsProject.instance().mapLayers().values():
-            if isinstance(layer, QgsVectorLayer) and layer.geometryType() == 2:  # Polygon
-                self.polygon_combo.addItem(layer.name(), layer)
+        for layer in registry.vector_layers(QgsWkbTypes.PolygonGeometry):
+            self.polygon_combo.addItem(layer.name(), layer)
                 
         # Populate raster layers
-        for layer in QgsProject.instance().mapLayers().values():
-            if isinstance(layer, QgsRasterLayer):
-                item = QListWidgetItem(layer.name())
-                item.setData(Qt.UserRole, layer)
-                self.raster_list.addItem(item)
+        for layer in registry.raster_layers():
+            item = QListWidgetItem(layer.name())
+            item.setData(Qt.UserRole, layer)
+            self.raster_list.addItem(item)
                 
     def toggle_select_all(self, state):
         for i in range(self.raster_list.count()):
@@ -6,16 +6,26 @@ from qgis.PyQt import QtWidgets, QtCore, QtGui
 from qgis.PyQt.QtCore import QVariant, QRectF
 from qgis.PyQt.QtGui import QFont, QColor
 from qgis.core import (
-    QgsProject, QgsMapLayer, QgsWkbTypes, QgsLayoutExporter,
+    QgsProject, QgsWkbTypes, QgsLayoutExporter,
     QgsPrintLayout, QgsLayoutItemMap, QgsLayoutItemLabel,
     QgsLayoutItemPicture, QgsLayoutItemScaleBar, QgsUnitTypes,
     QgsVectorLayer, QgsField, QgsFeature, QgsGeometry, QgsPointXY,
     QgsLineSymbol, QgsMarkerLineSymbolLayer, QgsSimpleMarkerSymbolLayer,
     QgsPalLayerSettings, QgsTextFormat, QgsVectorLayerSimpleLabeling,
-    QgsFillSymbol, QgsSimpleFillSymbolLayer
+    QgsFillSymbol, QgsSimpleFillSymbolLayer, QgsDistanceArea, QgsCoordinateTransform,
+    QgsExpression, QgsExpressionContext, QgsExpressionContextUtils, QgsFeatureRequest,
+    QgsMessageLog, Qgis
 )
-from qgis.gui import QgsMapTool, QgsRubberBand
-import processing, os, tempfile, numpy as np, matplotlib.pyplot as plt
+from qgis.gui import QgsMapTool, QgsRubberBand, QgsFieldExpressionWidget
+import os, re, tempfile
+# Only light modules at import time (QGIS startup): processing, numpy,
+# matplotlib and the profile_* helpers built on them are imported on use
+from .layer_registry import LayerRegistry, ROLE_SECTIONS, ROLE_CLIP_POLYGON, ROLE_PROFILES
+from .profile_render_pool import (ProfileRenderPool, profile_image_path, profile_image_format,
+                                  set_profile_image_format, profile_image_expression, queue_profile_sheets)
+
+# Combined sheets keep each profile decimated to about this many pixel columns
+SHEET_COLUMNS = 800
 
 # Qt5/Qt6 compatibility layer
 try:
@@ -35,6 +45,7 @@ if _qt6:
     Qt_Checked = Qt.CheckState.Checked
     Qt_UserRole = Qt.ItemDataRole.UserRole
     Qt_Key_Escape = Qt.Key.Key_Escape
+    Qt_WindowModal = Qt.WindowModality.WindowModal
 else:
     # Qt5 style enums
     from qgis.PyQt.QtCore import Qt
@@ -46,6 +57,7 @@ else:
     Qt_Checked = Qt.Checked
     Qt_UserRole = Qt.UserRole
     Qt_Key_Escape = Qt.Key_Escape
+    Qt_WindowModal = Qt.WindowModal
 
 
 class ClipRasterLayoutPlugin:
@@ -59,6 +71,8 @@ class ClipRasterLayoutPlugin:
         self.action = QtWidgets.QAction(icon, 'Clip & Profile Layout', self.iface.mainWindow())
         self.action.triggered.connect(self.run)
         self.iface.addToolBarIcon(self.action)
+        ProfileRenderPool.instance().idle.connect(self.onProfilesRendered)
+        LayerRegistry.instance()
         self.iface.addPluginToMenu('Clip Raster & Profile', self.action)
 
     def unload(self):
@@ -66,18 +80,38 @@ class ClipRasterLayoutPlugin:
             self.iface.removeDockWidget(self.dock)
         self.iface.removeToolBarIcon(self.action)
         self.iface.removePluginMenu('Clip Raster & Profile', self.action)
+        ProfileRenderPool.shutdown_instance()
+        LayerRegistry.shutdown_instance()
+
+    def onProfilesRendered(self, written, skipped):
+        """All queued profile charts have been written"""
+        message = f'{written} profile images written'
+        if skipped:
+            message += f', {skipped} unchanged'
+        self.iface.messageBar().pushInfo('Clip & Profile', message)
 
     def run(self):
         if not self.dock:
             self.dock = ClipDockWidget(self.iface)
             self.dock.processRequested.connect(self.process)
+            self.dock.lineProfilesRequested.connect(self.process_line_layer)
             self.iface.addDockWidget(Qt_LeftDockWidgetArea, self.dock)
         self.dock.show()
         self.dock.raise_()
         self.dock.activateWindow()
 
-    def process(self, rasters, poly_layer, output_dir, sections):
+    def process(self, rasters, poly_layer, output_dir, sections, options=None):
         """Process the clip operation with optional sections"""
+        import processing
+        from .profile_sampler import RasterBlockCache
+        from .profile_stats import ensure_stats_fields
+        from .profile_store import ProfileArchive
+        options = options or {}
+        # Corridor width for swath profiles (0 = single-line profile)
+        swath_width = options.get('swath_width', 0.0)
+        # Sample budget per section; full resolution samples every DEM pixel
+        max_points = options.get('max_points', 500)
+        full_resolution = options.get('full_resolution', False)
         try:
             # 1) Clip rasters
             cropped = []
@@ -96,6 +130,8 @@ class ClipRasterLayoutPlugin:
                         'OUTPUT': outp
                     })
                     cropped.append(outp)
+                    # The output may overwrite a raster sampled earlier in this session
+                    RasterBlockCache.instance().invalidate(outp)
 
                     # Load clipped raster to map
                     from qgis.core import QgsRasterLayer
@@ -108,9 +144,11 @@ class ClipRasterLayoutPlugin:
 
             # 2) Generate profiles (only if sections are provided)
             profiles = []
+            sheet = []
             last_png = None
 
             if sections is not None and sections.isValid() and sections.featureCount() > 0:
+                was_editable = sections.isEditable()
                 # Find the first raster to use for elevation sampling
                 dem_provider = None
                 dem_crs = None
@@ -120,84 +158,90 @@ class ClipRasterLayoutPlugin:
 
                 if dem_provider:
                     # Setup distance calculator for accurate measurements
-                    from qgis.core import QgsDistanceArea, QgsCoordinateTransformContext
+                    from qgis.core import (QgsDistanceArea, QgsCoordinateTransformContext,
+                                           QgsCoordinateTransform)
                     distance_calc = QgsDistanceArea()
                     distance_calc.setSourceCrs(sections.crs(), QgsCoordinateTransformContext())
                     distance_calc.setEllipsoid(QgsProject.instance().ellipsoid())
-
-                    for feat in sections.getFeatures():
-                        try:
-                            geom = feat.geometry()
-                            label = feat.attribute('label')
-
-                            # Calculate true length in meters using ellipsoidal calculation
-                            length_meters = distance_calc.measureLength(geom)
-                            # Also get the geometry length in CRS units for interpolation
-                            length_crs = geom.length()
-
-                            if length_meters <= 0 or length_crs <= 0:
-                                continue
-
-                            # Use more points for better resolution
-                            npts = min(500, max(50, int(length_meters)))
-                            interval_crs = length_crs / npts
-
-                            pts = []
-                            for j in range(npts + 1):
-                                d = min(j * interval_crs, length_crs)
-                                interp_geom = geom.interpolate(d)
-                                if interp_geom and not interp_geom.isEmpty():
-                                    pts.append(interp_geom.asPoint())
-
-                            if len(pts) < 2:
-                                continue
-
-                            elev = []
-                            valid_elevations = 0
-                            for p in pts:
-                                val = dem_provider.sample(QgsPointXY(p.x(), p.y()), 1)
-                                if val[0] is not None and val[0] != 0:
-                                    elev.append(float(val[0]))
-                                    valid_elevations += 1
-                                elif elev:  # Use previous value if available
-                                    elev.append(elev[-1])
+                    to_dem = QgsCoordinateTransform(sections.crs(), dem_crs, QgsProject.instance())
+
+                    # Profile statistics are stored on the sections for atlas labels/filters
+                    ensure_stats_fields(sections)
+                    if not sections.isEditable():
+                        sections.startEditing()
+
+                    # Sampled arrays of this run, reloadable without resampling
+                    archive = ProfileArchive(self._new_archive_path(output_dir, 'profiles'), {
+                        'raster': rasters[0].name(),
+                        'source': rasters[0].source(),
+                        'raster_crs': dem_crs.authid(),
+                        'band': 1,
+                        'swath_width': swath_width,
+                        'max_points': max_points,
+                        'full_resolution': full_resolution,
+                    })
+                    section_crs = sections.crs().authid()
+                    crossing_indexes = self._crossing_indexes(options, sections.crs())
+
+                    try:
+                        for feat in sections.getFeatures():
+                            try:
+                                geom = feat.geometry()
+                                label = feat.attribute('label')
+
+                                # Calculate true length in meters using ellipsoidal calculation
+                                length_meters = distance_calc.measureLength(geom)
+                                # Also get the geometry length in CRS units for interpolation
+                                length_crs = geom.length()
+
+                                if length_meters <= 0 or length_crs <= 0:
+                                    continue
+
+                                # Sample in the DEM CRS through the shared block cache
+                                dem_geom = QgsGeometry(geom)
+                                if sections.crs() != dem_crs:
+                                    dem_geom.transform(to_dem)
+
+                                profile = self._sample_section(dem_provider, dem_geom, length_meters, options)
+                                if profile is None:
+                                    print(f"Section {label}: Not enough valid samples")
+                                    continue
+                                dist, elev, swath, stats = profile
+                                self._store_stats(sections, feat, stats)
+                                crossings = self._crossings(crossing_indexes, geom, length_meters / length_crs)
+
+                                last_png = self._queue_plot(dist, elev, swath, label, output_dir, profiles, crossings)
+                                if options.get('sheet'):
+                                    sheet.append(self._sheet_entry(label, dist, elev, swath))
+                                if swath is not None:
+                                    print(f"Section {label}: Length={length_meters:.1f}m, Swath width={swath_width:.1f}m, "
+                                          f"Stations={len(elev)}")
                                 else:
-                                    elev.append(0.0)
-
-                            if len(elev) < 2 or valid_elevations < 2:
-                                print(f"Section {label}: Not enough valid elevations ({valid_elevations})")
+                                    print(f"Section {label}: Length={length_meters:.1f}m, Points={len(elev)}")
+                                archive.append({'name': label, 'distances': dist, 'elevations': elev,
+                                                'min': swath['min'] if swath else None,
+                                                'max': swath['max'] if swath else None,
+                                                'stats': stats, 'image_path': last_png,
+                                                'wkt': geom.asWkt(), 'crs': section_crs,
+                                                'length': length_meters})
+                            except Exception as e:
+                                print(f"Error processing section {label}: {str(e)}")
+                                import traceback
+                                traceback.print_exc()
                                 continue
-
-                            # Use true distance in meters for x-axis
-                            dist = np.linspace(0, length_meters, len(elev))
-
-                            # Create profile plot
-                            fig = plt.figure(figsize=(10, 4))
-                            plt.plot(dist, elev, 'b-', linewidth=1.5)
-                            plt.fill_between(dist, min(elev), elev, alpha=0.3)
-                            plt.xlabel('Distance (m)')
-                            plt.ylabel('Elevation (m)')
-                            plt.title(f"Section {label}")
-                            plt.grid(True, alpha=0.3)
-
-                            # Add some padding to y-axis
-                            elev_range = max(elev) - min(elev)
-                            if elev_range > 0:
-                                plt.ylim(min(elev) - elev_range * 0.1, max(elev) + elev_range * 0.1)
-
-                            png = os.path.join(output_dir, f"profile_{label}.png")
-                            fig.savefig(png, dpi=150, bbox_inches='tight')
-                            plt.close(fig)
-                            profiles.append((label, png, dist[-1], elev[-1] - elev[0]))
-                            last_png = png
-                            print(f"Section {label}: Length={length_meters:.1f}m, Points={len(pts)}, Elevations={valid_elevations}")
-                        except Exception as e:
-                            print(f"Error processing section {label}: {str(e)}")
-                            import traceback
-                            traceback.print_exc()
-                            continue
+                    finally:
+                        archive.close()
 
                 sections.commitChanges()
+                if was_editable:
+                    # Sections are drawn in edit mode: leave it as it was
+                    sections.startEditing()
+                RasterBlockCache.instance().log_stats()
+
+            sheet_paths = []
+            if sheet:
+                sheet_paths = queue_profile_sheets(sheet, output_dir, options['sheet'],
+                                                   f"Sections - {rasters[0].name()}")
 
             # 3) Build result message
             msg = f"Clipping completed!\n\n"
@@ -205,16 +249,250 @@ class ClipRasterLayoutPlugin:
             msg += f"Output folder: {output_dir}"
 
             if profiles:
-                msg += f"\n\nProfiles created: {len(profiles)}"
+                msg += f"\n\nProfiles created: {len(profiles)} (images are rendered in the background)"
+                msg += f"\nProfile data: {archive.path}"
+            if sheet_paths:
+                msg += f"\nCombined sheet: {len(sheet_paths)} page(s)"
 
             QtWidgets.QMessageBox.information(None, 'Done', msg)
 
         except Exception as e:
             QtWidgets.QMessageBox.critical(None, 'Error', f'Processing error: {str(e)}')
 
+    def _sample_section(self, dem_provider, dem_geom, length_meters, options):
+        """Sample one section given in the DEM CRS
+
+        Returns (distances, elevations, swath, stats) with swath None for
+        line profiles, or None when fewer than two valid samples are found.
+        The elevations are gap-filled for plotting; the statistics are
+        computed on the valid samples only.
+        """
+        import numpy as np
+        from .profile_sampler import swath_profile, sample_line, fill_gaps, native_pixel_size
+        from .profile_stats import profile_stats
+        swath_width = options.get('swath_width', 0.0)
+        # Use more points for better resolution; the sampler reads the
+        # overview level matching the spacing unless full resolution is asked
+        level = None
+        if options.get('full_resolution', False):
+            level = 0
+            npts = max(50, int(np.ceil(dem_geom.length() / (native_pixel_size(dem_provider) or 1.0))))
+        else:
+            npts = min(options.get('max_points', 500), max(50, int(length_meters)))
+
+        swath = None
+        if swath_width > 0:
+            # Corridor statistics: one window read, vectorized aggregation
+            scale = dem_geom.length() / length_meters
+            swath = swath_profile(dem_provider, dem_geom, swath_width * scale / 2.0, npts, level=level)
+            if swath is None:
+                return None
+            raw = swath['mean']
+        else:
+            _, raw = sample_line(dem_provider, dem_geom, npts, level=level)
+
+        # No-data and zero values repeat the previous elevation
+        elev, valid_elevations = fill_gaps(raw, raw == 0)
+        if len(elev) < 2 or valid_elevations < 2:
+            return None
+        # Use true distance in meters for x-axis
+        dist = np.linspace(0, length_meters, len(elev))
+        # Filled gaps would count as flat runs and vertical steps
+        stats = profile_stats(dist, np.where(raw == 0, np.nan, raw))
+        return dist, elev, swath, stats
+
+    def _store_stats(self, sections, feat, stats):
+        """Write the profile statistics to the section feature"""
+        from .profile_stats import stats_attribute_map
+        if stats:
+            sections.changeAttributeValues(feat.id(), stats_attribute_map(sections, stats))
+
+    def _queue_plot(self, dist, elev, swath, label, output_dir, profiles, crossings=None):
+        """Queue the profile chart on the render workers and return its image path"""
+        png = profile_image_path(output_dir, label)
+        job = {'name': str(label), 'path': png, 'style': 'section', 'dpi': 150,
+               'distances': dist, 'elevations': elev, 'crossings': crossings}
+        if swath is not None:
+            import numpy as np
+            job.update(style='swath', elevations=swath['mean'], min=swath['min'], max=swath['max'])
+            elev = swath['mean'][~np.isnan(swath['mean'])]
+        ProfileRenderPool.instance().submit(job)
+        profiles.append((label, png, dist[-1], elev[-1] - elev[0]))
+        return png
+
+    def _sheet_entry(self, label, dist, elev, swath):
+        """Profile for the combined sheet, decimated so a long run stays small"""
+        from .profile_decimate import decimate
+        if swath is not None:
+            elev = swath['mean']
+        dist, elev = decimate(dist, elev, SHEET_COLUMNS)
+        return {'name': str(label), 'distances': dist, 'elevations': elev}
+
+    def _crossing_indexes(self, options, crs):
+        """Spatial indexes of the layers whose crossings are marked on the profiles"""
+        from .profile_crossings import CrossingIndex
+        indexes = []
+        for layer_id in options.get('crossing_layers', []):
+            layer = QgsProject.instance().mapLayer(layer_id)
+            if layer is not None:
+                indexes.append(CrossingIndex(layer, crs, layer.displayField()))
+        return indexes
+
+    def _crossings(self, indexes, geom, to_meters):
+        """Crossings of a section as (distance in meters, label)"""
+        if not indexes:
+            return []
+        from .profile_crossings import section_crossings
+        return [(d * to_meters, name) for d, name in section_crossings(indexes, geom)]
+
+    def process_line_layer(self, raster, lines, label_expression, output_dir, options=None):
+        """Profile every feature of an existing line layer
+
+        Features are streamed from the provider and each profile is sampled,
+        plotted, archived and released before the next one, so memory stays
+        bounded by the block cache budget whatever the feature count.
+        Statistics go to the NPZ archive; they are also written to the layer
+        only with the store_stats option (used for the Sections layer).
+        Option fids restricts the run to the given features.
+        """
+        from .profile_sampler import RasterBlockCache
+        from .profile_stats import ensure_stats_fields
+        from .profile_store import ProfileArchive
+        options = options or {}
+        store_stats = options.get('store_stats', False)
+        if options.get('cache_mb'):
+            RasterBlockCache.instance().set_max_bytes(options['cache_mb'] * 1024 * 1024)
+
+        dem_provider = raster.dataProvider()
+        dem_crs = raster.crs()
+        distance_calc = QgsDistanceArea()
+        distance_calc.setSourceCrs(lines.crs(), QgsProject.instance().transformContext())
+        distance_calc.setEllipsoid(QgsProject.instance().ellipsoid())
+        to_dem = QgsCoordinateTransform(lines.crs(), dem_crs, QgsProject.instance())
+
+        # Label expression evaluated per feature (falls back to the feature id)
+        context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(lines))
+        expression = QgsExpression(label_expression or '$id')
+        expression.prepare(context)
+
+        archive = ProfileArchive(self._new_archive_path(output_dir, f"profiles_{lines.name()}"), {
+            'raster': raster.name(),
+            'source': raster.source(),
+            'raster_crs': dem_crs.authid(),
+            'band': 1,
+            'lines': lines.source(),
+            'label_expression': label_expression,
+            'swath_width': options.get('swath_width', 0.0),
+            'max_points': options.get('max_points', 500),
+            'full_resolution': options.get('full_resolution', False),
+        })
+        line_crs = lines.crs().authid()
+        crossing_indexes = self._crossing_indexes(options, lines.crs())
+
+        request = QgsFeatureRequest().setSubsetOfAttributes(expression.referencedColumns(), lines.fields())
+        if options.get('fids'):
+            request.setFilterFids(options['fids'])
+            total = len(options['fids'])
+        else:
+            total = lines.featureCount()
+        was_editable = lines.isEditable()
+        if store_stats:
+            ensure_stats_fields(lines)
+            if not was_editable:
+                lines.startEditing()
+
+        progress = QtWidgets.QProgressDialog('Sampling profiles...', 'Cancel', 0, max(total, 1),
+                                             self.iface.mainWindow())
+        progress.setWindowTitle('Profiles from line layer')
+        progress.setWindowModality(Qt_WindowModal)
+        progress.setMinimumDuration(0)
+
+        profiles = []
+        sheet = []
+        used_labels = set()
+        skipped = 0
+        try:
+            for i, feat in enumerate(lines.getFeatures(request)):
+                if progress.wasCanceled():
+                    break
+                progress.setValue(i)
+                try:
+                    context.setFeature(feat)
+                    label = expression.evaluate(context)
+                    label = _safe_label(label if label not in (None, '') else feat.id())
+                    if label in used_labels:
+                        label = f"{label}_{feat.id()}"
+                    used_labels.add(label)
+
+                    geom = feat.geometry()
+                    length_meters = distance_calc.measureLength(geom)
+                    if geom.isEmpty() or length_meters <= 0:
+                        skipped += 1
+                        continue
+                    dem_geom = QgsGeometry(geom)
+                    if lines.crs() != dem_crs:
+                        dem_geom.transform(to_dem)
+
+                    profile = self._sample_section(dem_provider, dem_geom, length_meters, options)
+                    if profile is None:
+                        skipped += 1
+                        continue
+                    dist, elev, swath, stats = profile
+                    if store_stats:
+                        self._store_stats(lines, feat, stats)
+                    crossings = self._crossings(crossing_indexes, geom, length_meters / geom.length())
+                    png = self._queue_plot(dist, elev, swath, label, output_dir, profiles, crossings)
+                    if options.get('sheet'):
+                        sheet.append(self._sheet_entry(label, dist, elev, swath))
+                    archive.append({'name': label, 'distances': dist, 'elevations': elev,
+                                    'min': swath['min'] if swath else None,
+                                    'max': swath['max'] if swath else None,
+                                    'stats': stats, 'image_path': png,
+                                    'wkt': geom.asWkt(), 'crs': line_crs, 'length': length_meters})
+                except Exception as e:
+                    skipped += 1
+                    QgsMessageLog.logMessage(f"Line profile {feat.id()} failed: {str(e)}", "ClipRasterLayout", Qgis.Warning)
+            progress.setValue(max(total, 1))
+        finally:
+            archive.close()
+        if store_stats:
+            lines.commitChanges()
+            if was_editable:
+                # The layer was being edited before the run: leave it so
+                lines.startEditing()
+
+        sheet_paths = []
+        if sheet:
+            sheet_paths = queue_profile_sheets(sheet, output_dir, options['sheet'], f"Profiles - {lines.name()}")
+
+        RasterBlockCache.instance().log_stats()
+        QgsMessageLog.logMessage(f"Line layer profiles: {len(profiles)} created, {skipped} skipped",
+                                 "ClipRasterLayout", Qgis.Info)
+        QtWidgets.QMessageBox.information(None, 'Done',
+            f"Profiles created: {len(profiles)} (images are rendered in the background)\nSkipped: {skipped}\n"
+            f"Output folder: {output_dir}\nProfile data: {archive.path}"
+            + (f"\nCombined sheet: {len(sheet_paths)} page(s)" if sheet_paths else ""))
+
+    def _new_archive_path(self, output_dir, name):
+        """Unused archive path in output_dir, named after the run time so
+        earlier runs keep their archives"""
+        from datetime import datetime
+        base = os.path.join(output_dir, f"{_safe_label(name)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        path, counter = f"{base}.npz", 1
+        while os.path.exists(path):
+            counter += 1
+            path = f"{base}_{counter}.npz"
+        return path
+
+
+def _safe_label(label):
+    """Label usable in file names"""
+    return re.sub(r'[^\w\-.]+', '_', str(label)).strip('_') or 'profile'
+
 
 class ClipDockWidget(QtWidgets.QDockWidget):
-    processRequested = QtCore.pyqtSignal(list, object, str, object)
+    processRequested = QtCore.pyqtSignal(list, object, str, object, dict)
+    lineProfilesRequested = QtCore.pyqtSignal(object, object, str, str, dict)
 
     def __init__(self, iface):
         super().__init__('Clip & Profile Export', iface.mainWindow())
@@ -285,6 +563,109 @@ class ClipDockWidget(QtWidgets.QDockWidget):
         self.secCountLabel = QtWidgets.QLabel('Sections drawn: 0')
         sec_layout.addWidget(self.secCountLabel)
 
+        swath_h = QtWidgets.QHBoxLayout()
+        self.swathCheck = QtWidgets.QCheckBox('Swath profile, width:')
+        self.swathCheck.setToolTip('Min/mean/max elevation over a corridor perpendicular to each section')
+        self.swathCheck.setEnabled(False)
+        swath_h.addWidget(self.swathCheck)
+        self.swathWidthSpin = QtWidgets.QDoubleSpinBox()
+        self.swathWidthSpin.setRange(0.1, 10000)
+        self.swathWidthSpin.setValue(20)
+        self.swathWidthSpin.setSuffix(' m')
+        self.swathWidthSpin.setEnabled(False)
+        self.swathCheck.toggled.connect(self.swathWidthSpin.setEnabled)
+        swath_h.addWidget(self.swathWidthSpin)
+        swath_h.addStretch()
+        sec_layout.addLayout(swath_h)
+
+        points_h = QtWidgets.QHBoxLayout()
+        points_h.addWidget(QtWidgets.QLabel('Max points per profile:'))
+        self.maxPointsSpin = QtWidgets.QSpinBox()
+        self.maxPointsSpin.setRange(50, 100000)
+        self.maxPointsSpin.setValue(500)
+        self.maxPointsSpin.setToolTip('Long sections are sampled from the DEM overview matching this budget')
+        points_h.addWidget(self.maxPointsSpin)
+        self.fullResCheck = QtWidgets.QCheckBox('Full resolution')
+        self.fullResCheck.setToolTip('Sample every DEM pixel along the section (slow for long sections)')
+        self.fullResCheck.toggled.connect(lambda checked: self.maxPointsSpin.setEnabled(not checked))
+        points_h.addWidget(self.fullResCheck)
+        points_h.addStretch()
+        sec_layout.addLayout(points_h)
+
+        format_h = QtWidgets.QHBoxLayout()
+        format_h.addWidget(QtWidgets.QLabel('Profile images:'))
+        self.imageFormatCombo = QtWidgets.QComboBox()
+        self.imageFormatCombo.addItem('PNG (raster)', 'png')
+        self.imageFormatCombo.addItem('SVG (vector, smaller PDF)', 'svg')
+        self.imageFormatCombo.setToolTip('SVG charts stay vector in the exported layouts')
+        self.imageFormatCombo.setCurrentIndex(max(0, self.imageFormatCombo.findData(profile_image_format())))
+        self.imageFormatCombo.currentIndexChanged.connect(
+            lambda: set_profile_image_format(self.imageFormatCombo.currentData()))
+        format_h.addWidget(self.imageFormatCombo)
+        format_h.addWidget(QtWidgets.QLabel('Combined sheet:'))
+        self.sheetCombo = QtWidgets.QComboBox()
+        self.sheetCombo.addItem('None', '')
+        self.sheetCombo.addItem('Small multiples', 'grid')
+        self.sheetCombo.addItem('Overlay', 'overlay')
+        self.sheetCombo.setToolTip('All profiles of the run on shared-axis pages (6 per page, or 10 overlaid)')
+        format_h.addWidget(self.sheetCombo)
+        format_h.addStretch()
+        sec_layout.addLayout(format_h)
+
+        sec_layout.addWidget(QtWidgets.QLabel('Mark crossings with layers:'))
+        self.crossList = QtWidgets.QListWidget()
+        self.crossList.setSelectionMode(QtWidgets.QAbstractItemView.MultiSelection)
+        self.crossList.setMaximumHeight(70)
+        self.crossList.setToolTip('Rivers, walls, trench limits... drawn as labelled markers on the profiles')
+        self.crossList.setEnabled(False)
+        sec_layout.addWidget(self.crossList)
+
+        # Profiles for every feature of an existing line layer
+        self.lineBox = QtWidgets.QGroupBox('Profiles from line layer')
+        self.lineBox.setEnabled(False)
+        line_layout = QtWidgets.QFormLayout()
+        self.lineCombo = QtWidgets.QComboBox()
+        self.lineCombo.currentIndexChanged.connect(self.onLineLayerChanged)
+        line_layout.addRow('Lines:', self.lineCombo)
+        self.lineLabelExpr = QgsFieldExpressionWidget()
+        self.lineLabelExpr.setToolTip('Expression giving the label of each profile (default: feature id)')
+        line_layout.addRow('Label:', self.lineLabelExpr)
+        self.cacheSpin = QtWidgets.QSpinBox()
+        self.cacheSpin.setRange(32, 8192)
+        self.cacheSpin.setValue(256)
+        self.cacheSpin.setSuffix(' MB')
+        self.cacheSpin.setToolTip('Memory budget of the raster block cache while sampling')
+        line_layout.addRow('Raster cache:', self.cacheSpin)
+        self.lineProfilesBtn = QtWidgets.QPushButton('Profile all lines')
+        self.lineProfilesBtn.clicked.connect(self.emitLineProfiles)
+        line_layout.addRow(self.lineProfilesBtn)
+        self.lineBox.setLayout(line_layout)
+        sec_layout.addWidget(self.lineBox)
+
+        # Cross-sections perpendicular to a centerline (selected feature of the line layer)
+        self.transectBox = QtWidgets.QGroupBox('Transects along centerline')
+        self.transectBox.setEnabled(False)
+        transect_layout = QtWidgets.QFormLayout()
+        self.transectSpacingSpin = QtWidgets.QDoubleSpinBox()
+        self.transectSpacingSpin.setRange(0.1, 100000)
+        self.transectSpacingSpin.setValue(50)
+        self.transectSpacingSpin.setSuffix(' m')
+        transect_layout.addRow('Spacing:', self.transectSpacingSpin)
+        self.transectHalfWidthSpin = QtWidgets.QDoubleSpinBox()
+        self.transectHalfWidthSpin.setRange(0.1, 100000)
+        self.transectHalfWidthSpin.setValue(100)
+        self.transectHalfWidthSpin.setSuffix(' m')
+        transect_layout.addRow('Half-width:', self.transectHalfWidthSpin)
+        self.transectSampleCheck = QtWidgets.QCheckBox('Sample profiles right away')
+        self.transectSampleCheck.setChecked(True)
+        transect_layout.addRow(self.transectSampleCheck)
+        self.transectBtn = QtWidgets.QPushButton('Generate transects')
+        self.transectBtn.setToolTip('Uses the selected feature of the line layer above as centerline')
+        self.transectBtn.clicked.connect(self.generateTransects)
+        transect_layout.addRow(self.transectBtn)
+        self.transectBox.setLayout(transect_layout)
+        sec_layout.addWidget(self.transectBox)
+
         sec_group.setLayout(sec_layout)
         v.addWidget(sec_group)
 
@@ -347,43 +728,81 @@ class ClipDockWidget(QtWidgets.QDockWidget):
         # Initialize layer lists
         self.refreshRasterList()
         self.refreshPolygonList()
+        self.refreshLineList()
+        self.refreshCrossingList()
 
-        # Connect to project signals for auto-refresh
-        QgsProject.instance().layersAdded.connect(self.onLayersChanged)
-        QgsProject.instance().layersRemoved.connect(self.onLayersChanged)
+        # Refresh when the registry sees layers added/removed/renamed
+        LayerRegistry.instance().changed.connect(self.onLayersChanged)
 
-    def onLayersChanged(self, layers=None):
+    def onLayersChanged(self):
         """Auto-refresh lists when layers are added/removed"""
         self.refreshRasterList()
         self.refreshPolygonList()
+        self.refreshLineList()
+        self.refreshCrossingList()
         self.updateStatus('Layer lists updated')
 
     def refreshRasterList(self):
         """Refresh the raster layer list"""
         self.rList.clear()
-        for lyr in QgsProject.instance().mapLayers().values():
-            if lyr.type() == QgsMapLayer.RasterLayer:
-                it = QtWidgets.QListWidgetItem(lyr.name())
-                it.setData(Qt_UserRole, lyr.id())
-                self.rList.addItem(it)
+        for lyr in LayerRegistry.instance().raster_layers():
+            it = QtWidgets.QListWidgetItem(lyr.name())
+            it.setData(Qt_UserRole, lyr.id())
+            self.rList.addItem(it)
 
     def refreshPolygonList(self):
         """Refresh the polygon layer list"""
         current_id = self.pCombo.currentData()
         self.pCombo.clear()
-        for lyr in QgsProject.instance().mapLayers().values():
-            if lyr.type() == QgsMapLayer.VectorLayer and lyr.geometryType() == QgsWkbTypes.PolygonGeometry:
-                self.pCombo.addItem(lyr.name(), lyr.id())
+        for lyr in LayerRegistry.instance().vector_layers(QgsWkbTypes.PolygonGeometry):
+            self.pCombo.addItem(lyr.name(), lyr.id())
         # Restore previous selection if still exists
         if current_id:
             idx = self.pCombo.findData(current_id)
             if idx >= 0:
                 self.pCombo.setCurrentIndex(idx)
 
+    def refreshLineList(self):
+        """Refresh the line layer list"""
+        current_id = self.lineCombo.currentData()
+        self.lineCombo.blockSignals(True)
+        self.lineCombo.clear()
+        for lyr in LayerRegistry.instance().vector_layers(QgsWkbTypes.LineGeometry):
+            self.lineCombo.addItem(lyr.name(), lyr.id())
+        if current_id:
+            idx = self.lineCombo.findData(current_id)
+            if idx >= 0:
+                self.lineCombo.setCurrentIndex(idx)
+        self.lineCombo.blockSignals(False)
+        self.onLineLayerChanged()
+
+    def refreshCrossingList(self):
+        """Refresh the list of line/polygon layers usable for crossings"""
+        selected = {i.data(Qt_UserRole) for i in self.crossList.selectedItems()}
+        self.crossList.clear()
+        registry = LayerRegistry.instance()
+        for lyr in registry.vector_layers(QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry):
+            if registry.role(lyr) == ROLE_SECTIONS:
+                continue
+            it = QtWidgets.QListWidgetItem(lyr.name())
+            it.setData(Qt_UserRole, lyr.id())
+            self.crossList.addItem(it)
+            it.setSelected(lyr.id() in selected)
+
+    def onLineLayerChanged(self, index=None):
+        """Point the label expression editor at the selected line layer"""
+        layer = QgsProject.instance().mapLayer(self.lineCombo.currentData()) if self.lineCombo.currentData() else None
+        self.lineLabelExpr.setLayer(layer)
+
     def toggleSectionsUI(self, state):
         """Enable/disable sections UI"""
         enabled = state == Qt_Checked
         self.secBtn.setEnabled(enabled)
+        self.swathCheck.setEnabled(enabled)
+        self.swathWidthSpin.setEnabled(enabled and self.swathCheck.isChecked())
+        self.lineBox.setEnabled(enabled)
+        self.crossList.setEnabled(enabled)
+        self.transectBox.setEnabled(enabled)
         if enabled and not self.sections_layer_id:
             self._createSectionsLayer()
 
@@ -424,6 +843,7 @@ class ClipDockWidget(QtWidgets.QDockWidget):
         })
         layer.renderer().setSymbol(symbol)
 
+        LayerRegistry.instance().register(layer, ROLE_CLIP_POLYGON)
         QgsProject.instance().addMapLayer(layer)
         self.clip_polygon_layer_id = layer.id()
         layer.startEditing()
@@ -443,12 +863,14 @@ class ClipDockWidget(QtWidgets.QDockWidget):
 
     def _createSectionsLayer(self):
         """Create or recreate the sections memory layer"""
+        from .profile_stats import stats_fields
         try:
             crs = QgsProject.instance().crs().authid() or 'EPSG:4326'
             sections = QgsVectorLayer(f'LineString?crs={crs}', 'Sections', 'memory')
             dp = sections.dataProvider()
-            dp.addAttributes([QgsField('label', QVariant.String)])
+            dp.addAttributes([QgsField('label', QVariant.String)] + stats_fields())
             sections.updateFields()
+            LayerRegistry.instance().register(sections, ROLE_SECTIONS)
             QgsProject.instance().addMapLayer(sections)
             self.sections_layer_id = sections.id()
             sections.startEditing()
@@ -491,6 +913,11 @@ class ClipDockWidget(QtWidgets.QDockWidget):
             layer = QgsProject.instance().mapLayer(self.sections_layer_id)
             if layer is not None:
                 return layer
+        # Sections layer of a reopened project
+        layer = LayerRegistry.instance().layer(ROLE_SECTIONS)
+        if layer is not None:
+            self.sections_layer_id = layer.id()
+            return layer
         # Layer was deleted, recreate it
         self._createSectionsLayer()
         return QgsProject.instance().mapLayer(self.sections_layer_id)
@@ -553,10 +980,133 @@ class ClipDockWidget(QtWidgets.QDockWidget):
 
         # Get sections (optional)
         sections = None
+        options = {}
         if self.createSectionsCheck.isChecked():
             sections = self._getSectionsLayer()
+            options = self._profileOptions()
+
+        self.processRequested.emit(ras, poly, out, sections, options)
+
+    def _profileOptions(self):
+        """Sampling options shared by sections and line layer profiles"""
+        options = {}
+        if self.swathCheck.isChecked():
+            options['swath_width'] = self.swathWidthSpin.value()
+        options['max_points'] = self.maxPointsSpin.value()
+        options['full_resolution'] = self.fullResCheck.isChecked()
+        options['crossing_layers'] = [i.data(Qt_UserRole) for i in self.crossList.selectedItems()]
+        options['sheet'] = self.sheetCombo.currentData()
+        return options
+
+    def _selectedLineLayer(self):
+        """Line layer chosen in the combo, or None (with a warning)"""
+        lines = QgsProject.instance().mapLayer(self.lineCombo.currentData()) if self.lineCombo.currentData() else None
+        if lines is None:
+            QtWidgets.QMessageBox.warning(self, 'Warning', 'Select a line layer.')
+            self.refreshLineList()
+        return lines
+
+    def _profileTarget(self):
+        """(DEM raster, output folder) for profile runs, or None (with a warning)"""
+        ras = [QgsProject.instance().mapLayer(i.data(Qt_UserRole))
+               for i in self.rList.selectedItems()]
+        ras = [r for r in ras if r is not None]
+        if not ras:
+            QtWidgets.QMessageBox.warning(self, 'Warning', 'Select the DEM raster to sample.')
+            return None
+
+        out = self.outEdit.text()
+        if not out:
+            QtWidgets.QMessageBox.warning(self, 'Warning', 'Select an output folder.')
+            return None
+        if not os.path.isdir(out):
+            try:
+                os.makedirs(out)
+            except Exception as e:
+                QtWidgets.QMessageBox.warning(self, 'Error', f'Unable to create folder: {str(e)}')
+                return None
+        return ras[0], out
+
+    def emitLineProfiles(self):
+        """Validate inputs and emit the line layer profiles signal"""
+        lines = self._selectedLineLayer()
+        if lines is None:
+            return
+        target = self._profileTarget()
+        if target is None:
+            return
 
-        self.processRequested.emit(ras, poly, out, sections)
+        options = self._profileOptions()
+        options['cache_mb'] = self.cacheSpin.value()
+        self.lineProfilesRequested.emit(target[0], lines, self.lineLabelExpr.expression(), target[1], options)
+
+    def generateTransects(self):
+        """Add cross-sections perpendicular to the selected centerline to the Sections layer"""
+        import numpy as np
+        from .profile_sampler import line_parts, perpendicular_transects
+        lines = self._selectedLineLayer()
+        if lines is None:
+            return
+        selected = lines.selectedFeatures()
+        if not selected and lines.featureCount() == 1:
+            selected = list(lines.getFeatures())
+        if len(selected) != 1:
+            QtWidgets.QMessageBox.warning(self, 'Warning', 'Select one centerline feature in the line layer.')
+            return
+        target = self._profileTarget() if self.transectSampleCheck.isChecked() else None
+        if self.transectSampleCheck.isChecked() and target is None:
+            return
+
+        sections = self._getSectionsLayer()
+        if sections.crs().isGeographic():
+            QtWidgets.QMessageBox.warning(self, 'Warning',
+                'The Sections layer uses a geographic CRS: spacing and half-width are in degrees.')
+
+        # Centerline in the Sections CRS, all transects computed at once
+        centerline = QgsGeometry(selected[0].geometry())
+        if lines.crs() != sections.crs():
+            centerline.transform(QgsCoordinateTransform(lines.crs(), sections.crs(), QgsProject.instance()))
+        # Each part of a multipart centerline gets its own stations
+        transects = [perpendicular_transects(part, self.transectSpacingSpin.value(),
+                                             self.transectHalfWidthSpin.value())
+                     for part in line_parts(centerline)]
+        starts = np.concatenate([t[1] for t in transects]) if transects else []
+        ends = np.concatenate([t[2] for t in transects]) if transects else []
+        if not len(starts):
+            QtWidgets.QMessageBox.warning(self, 'Warning', 'The centerline is empty.')
+            return
+
+        # Sequential labels continuing after the highest existing T label
+        first = self._lastTransectNumber(sections) + 1
+        feats = []
+        for i, (a, b) in enumerate(zip(starts, ends)):
+            feat = QgsFeature(sections.fields())
+            feat.setGeometry(QgsGeometry.fromPolylineXY([QgsPointXY(*a), QgsPointXY(*b)]))
+            feat.setAttribute('label', f"T{first + i}")
+            feats.append(feat)
+        ok, added = sections.dataProvider().addFeatures(feats)
+        if not ok:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Unable to add the transects to the Sections layer.')
+            return
+        sections.updateExtents()
+        sections.triggerRepaint()
+        self.updateSectionCount()
+        self.updateStatus(f'{len(added)} transects created')
+
+        if target is not None:
+            options = self._profileOptions()
+            options['cache_mb'] = self.cacheSpin.value()
+            options['fids'] = [f.id() for f in added]
+            options['store_stats'] = True
+            self.lineProfilesRequested.emit(target[0], sections, '"label"', target[1], options)
+
+    def _lastTransectNumber(self, sections):
+        """Highest n of the T<n> labels on the Sections layer (0 if none)"""
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(['label'], sections.fields())
+        numbers = [int(match.group(1)) for feat in sections.getFeatures(request)
+                   for match in [re.match(r'^T(\d+)$', str(feat['label'] or ''))] if match]
+        return max(numbers, default=0)
 
     def generateAtlasLayout(self):
         """Generate a layout with Atlas enabled for sections"""
@@ -566,11 +1116,10 @@ class ClipDockWidget(QtWidgets.QDockWidget):
 
             # Also check for "Profili DEM" layer from profile_tool
             if not sections_layer or sections_layer.featureCount() == 0:
-                for layer in QgsProject.instance().mapLayers().values():
-                    if layer.name() == "Profili DEM" and layer.type() == QgsMapLayer.VectorLayer:
-                        if layer.featureCount() > 0:
-                            sections_layer = layer
-                            break
+                for layer in LayerRegistry.instance().layers(ROLE_PROFILES):
+                    if layer.featureCount() > 0:
+                        sections_layer = layer
+                        break
 
             if not sections_layer or sections_layer.featureCount() == 0:
                 QtWidgets.QMessageBox.warning(self, 'Warning',
@@ -686,6 +1235,9 @@ class ClipDockWidget(QtWidgets.QDockWidget):
             info_label.setText(
                 "SECTION INFO\n"
                 "Label: [% \"label\" %]\n"
+                "3D length: [% round(\"length_3d\", 1) %] m\n"
+                "Min / Max: [% round(\"elev_min\", 1) %] / [% round(\"elev_max\", 1) %] m\n"
+                "Max slope: [% round(\"max_slope\", 1) %]°\n"
                 "Page: [% @atlas_featurenumber %] / [% @atlas_totalfeatures %]"
             )
             info_label.setFont(QFont("Arial", 9))
@@ -753,7 +1305,7 @@ class ClipDockWidget(QtWidgets.QDockWidget):
 
             profile_pic.dataDefinedProperties().setProperty(
                 QgsLayoutObject.PictureSource,
-                QgsProperty.fromExpression(f"'{save_dir}/profile_' || \"label\" || '.png'")
+                QgsProperty.fromExpression(profile_image_expression(save_dir, '"label"'))
             )
 
             profile_pic.attemptMove(QgsLayoutPoint(margin, profile_y, QgsUnitTypes.LayoutMillimeters))
@@ -788,8 +1340,7 @@ class ClipDockWidget(QtWidgets.QDockWidget):
     def closeEvent(self, event):
         """Disconnect signals on close"""
         try:
-            QgsProject.instance().layersAdded.disconnect(self.onLayersChanged)
-            QgsProject.instance().layersRemoved.disconnect(self.onLayersChanged)
+            LayerRegistry.instance().changed.disconnect(self.onLayersChanged)
         except:
             pass
         super().closeEvent(event)
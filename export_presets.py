@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: export_presets.py
+# Named PDF export presets (draft/review/print) for layouts and atlases.
+# Only qgis imports: atlas_worker.py also loads this module as a script.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+from qgis.core import Qgis, QgsProject, QgsLayoutExporter, QgsLayoutRenderContext, QgsRenderContext
+
+# Plain values, also hashed into the atlas page fingerprints (atlas_export.py)
+#   lossless  images embedded without JPEG compression (larger, slower)
+#   simplify  vector geometries simplified to the output resolution
+#   text      'text' (searchable, small) or 'outlines' (exact glyphs)
+EXPORT_PRESETS = {
+    'draft': {'label': 'Draft (96 dpi, fast)', 'dpi': 96, 'lossless': False, 'simplify': True,
+              'georeference': False, 'metadata': False, 'text': 'text'},
+    'review': {'label': 'Review (150 dpi)', 'dpi': 150, 'lossless': False, 'simplify': True,
+               'georeference': True, 'metadata': True, 'text': 'text'},
+    'print': {'label': 'Print (300 dpi, lossless)', 'dpi': 300, 'lossless': True, 'simplify': False,
+              'georeference': True, 'metadata': True, 'text': 'outlines'},
+}
+DEFAULT_PRESET = 'print'
+
+
+def export_preset():
+    """Export preset chosen for this project"""
+    name, _ = QgsProject.instance().readEntry("ClipRasterLayout", "export_preset", DEFAULT_PRESET)
+    return name if name in EXPORT_PRESETS else DEFAULT_PRESET
+
+
+def set_export_preset(name):
+    QgsProject.instance().writeEntry("ClipRasterLayout", "export_preset", name)
+
+
+def _text_format(name):
+    # Qgis.TextRenderFormat since QGIS 3.22, QgsRenderContext before
+    formats = getattr(Qgis, 'TextRenderFormat', None)
+    if formats is not None:
+        return formats.AlwaysText if name == 'text' else formats.AlwaysOutlines
+    return QgsRenderContext.TextFormatAlwaysText if name == 'text' else QgsRenderContext.TextFormatAlwaysOutlines
+
+
+def pdf_export_settings(layout, name):
+    """QgsLayoutExporter.PdfExportSettings of preset name for layout
+
+    Settings missing from older QGIS versions are skipped.
+    """
+    preset = EXPORT_PRESETS.get(name, EXPORT_PRESETS[DEFAULT_PRESET])
+    settings = QgsLayoutExporter.PdfExportSettings()
+    settings.dpi = preset['dpi']
+    settings.rasterizeWholeImage = False
+    settings.forceVectorOutput = False
+    settings.appendGeoreference = preset['georeference']
+    settings.exportMetadata = preset['metadata']
+    if hasattr(settings, 'simplifyGeometries'):
+        settings.simplifyGeometries = preset['simplify']
+    if hasattr(settings, 'textRenderFormat'):
+        settings.textRenderFormat = _text_format(preset['text'])
+
+    flags = layout.renderContext().flags()
+    lossless = getattr(QgsLayoutRenderContext, 'FlagLosslessImageRendering', None)
+    if lossless is not None:
+        flags = flags | lossless if preset['lossless'] else flags & ~lossless
+    settings.flags = flags
+    return settings
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: layer_registry.py
+# Plugin layers by role (sections, profiles, clip polygon, DEM) and project
+# layers by kind, kept current through the QgsProject signals.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+from qgis.core import QgsProject, QgsRasterLayer, QgsVectorLayer
+
+ROLE_SECTIONS = 'sections'  # sections drawn in the clip dock
+ROLE_PROFILES = 'profiles'  # "Profili DEM" layer of the profile tool
+ROLE_CLIP_POLYGON = 'clip_polygon'
+ROLE_DEM = 'dem'
+
+# Stored on the layer, so the role survives saving and reopening the project
+ROLE_PROPERTY = 'ClipRasterLayout/role'
+
+# Layers of projects saved before roles were stored are recognised by name
+ROLE_NAMES = {
+    'Sections': ROLE_SECTIONS,
+    'Profili DEM': ROLE_PROFILES,
+    'Clip Polygon': ROLE_CLIP_POLYGON,
+}
+
+DEM_NAME_HINTS = ('dem', 'dtm', 'elevation')
+
+
+class LayerRegistry(QObject):
+    """Index of the project layers used by the plugin
+
+    Layers are classified once when they are added to the project (or
+    renamed) instead of scanning mapLayers() and comparing names on every
+    lookup. Each role keeps its layers in insertion order and layer(role)
+    returns the most recent one.
+    """
+    changed = pyqtSignal()  # layers were added, removed or re-classified
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def shutdown_instance(cls):
+        if cls._instance is not None:
+            cls._instance.disconnect_project()
+            cls._instance = None
+
+    def __init__(self, project=None):
+        super().__init__()
+        self.project = project or QgsProject.instance()
+        self.project.layersAdded.connect(self._layers_added)
+        self.project.layersWillBeRemoved.connect(self._layers_removed)
+        self.project.cleared.connect(self._reset)
+        self.name_slots = {}  # layer id -> (layer, nameChanged slot)
+        self._reset()
+        self._layers_added(list(self.project.mapLayers().values()))
+
+    def disconnect_project(self):
+        self.project.layersAdded.disconnect(self._layers_added)
+        self.project.layersWillBeRemoved.disconnect(self._layers_removed)
+        self.project.cleared.disconnect(self._reset)
+        for layer_id in list(self.name_slots):
+            self._disconnect_layer(layer_id)
+
+    # Maintenance ---------------------------------------------------------------
+
+    def _reset(self):
+        for layer_id in list(self.name_slots):
+            self._disconnect_layer(layer_id)
+        # Dicts used as ordered sets of layer ids
+        self.roles = {}  # role -> {layer id: None}
+        self.layer_roles = {}  # layer id -> role
+        self.rasters = {}
+        self.vectors = {}  # geometry type -> {layer id: None}
+        self.changed.emit()
+
+    def _classify(self, layer):
+        role = layer.customProperty(ROLE_PROPERTY) or ROLE_NAMES.get(layer.name())
+        self._unassign(layer.id())
+        if role:
+            self.layer_roles[layer.id()] = role
+            self.roles.setdefault(role, {})[layer.id()] = None
+
+    def _unassign(self, layer_id):
+        role = self.layer_roles.pop(layer_id, None)
+        if role is not None:
+            self.roles[role].pop(layer_id, None)
+
+    def _layers_added(self, layers):
+        for layer in layers:
+            if isinstance(layer, QgsRasterLayer):
+                self.rasters[layer.id()] = None
+            elif isinstance(layer, QgsVectorLayer):
+                self.vectors.setdefault(layer.geometryType(), {})[layer.id()] = None
+            self._classify(layer)
+            self._disconnect_layer(layer.id())
+            slot = lambda layer=layer: self._renamed(layer)
+            layer.nameChanged.connect(slot)
+            self.name_slots[layer.id()] = (layer, slot)
+        if layers:
+            self.changed.emit()
+
+    def _disconnect_layer(self, layer_id):
+        layer, slot = self.name_slots.pop(layer_id, (None, None))
+        if layer is not None:
+            try:
+                layer.nameChanged.disconnect(slot)
+            except (RuntimeError, TypeError):
+                pass  # layer already deleted
+
+    def _renamed(self, layer):
+        self._classify(layer)
+        self.changed.emit()
+
+    def _layers_removed(self, layer_ids):
+        for layer_id in layer_ids:
+            self._disconnect_layer(layer_id)
+            self._unassign(layer_id)
+            self.rasters.pop(layer_id, None)
+            for ids in self.vectors.values():
+                ids.pop(layer_id, None)
+        if layer_ids:
+            self.changed.emit()
+
+    # Lookups -------------------------------------------------------------------
+
+    def register(self, layer, role):
+        """Give layer a role (stored on the layer)"""
+        layer.setCustomProperty(ROLE_PROPERTY, role)
+        if self.project.mapLayer(layer.id()) is not None:
+            self._classify(layer)
+            self.changed.emit()
+
+    def role(self, layer):
+        return self.layer_roles.get(layer.id())
+
+    def layer(self, role):
+        """Most recently added layer with role, or None"""
+        ids = self.roles.get(role)
+        if not ids:
+            return None
+        return self.project.mapLayer(next(reversed(ids)))
+
+    def layers(self, role):
+        return [self.project.mapLayer(layer_id) for layer_id in self.roles.get(role, ())]
+
+    def layer_by_id(self, layer_id):
+        return self.project.mapLayer(layer_id) if layer_id else None
+
+    def raster_layers(self):
+        return [self.project.mapLayer(layer_id) for layer_id in self.rasters]
+
+    def vector_layers(self, *geometry_types):
+        """Vector layers, optionally only of the given geometry types"""
+        types = geometry_types or tuple(self.vectors)
+        return [self.project.mapLayer(layer_id) for geometry_type in types
+                for layer_id in self.vectors.get(geometry_type, ())]
+
+    def dem_layer(self):
+        """DEM used for profiles: the registered one, else a single-band
+        raster named like a DEM, else the first single-band raster"""
+        dem = self.layer(ROLE_DEM)
+        if dem is not None:
+            return dem
+        single_band = [layer for layer in self.raster_layers() if layer.bandCount() == 1]
+        for layer in single_band:
+            if any(hint in layer.name().lower() for hint in DEM_NAME_HINTS):
+                return layer
+        return single_band[0] if single_band else None
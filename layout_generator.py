@@ -11,15 +11,17 @@ from qgis.core import (QgsProject, QgsLayout, QgsPrintLayout, QgsLayoutItemMap,
                       QgsLayoutItemLabel, QgsLayoutItemScaleBar, QgsLayoutItemPicture,
                       QgsLayoutItemLegend, QgsLayoutPoint, QgsLayoutSize,
                       QgsUnitTypes, QgsLayoutExporter, QgsLayoutItemShape,
-                      QgsLayoutItemPolyline, QgsTextFormat, QgsVectorLayer,
-                      QgsRasterLayer, QgsLayoutMeasurement, QgsLayoutItemPage,
+                      QgsLayoutItemPolyline, QgsTextFormat,
+                      QgsLayoutMeasurement, QgsLayoutItemPage, QgsSettings,
                       QgsLayoutItemPicture, QgsLayoutNorthArrowHandler,
                       QgsLayoutItemAttributeTable, QgsLayoutTableColumn,
                       QgsLayoutFrame, QgsLayoutMultiFrame, QgsRectangle,
                       QgsCoordinateReferenceSystem, QgsCoordinateTransform,
                       QgsLayoutRenderContext, QgsLayoutItem, QgsLayoutItemMapOverview,
                       QgsLayoutItemHtml, QgsSymbol, QgsScaleBarSettings, QgsMessageLog, Qgis,
-                      QgsWkbTypes, QgsLayoutAtlas, QgsLayoutObject, QgsProperty)
+                      QgsWkbTypes, QgsLayoutAtlas, QgsLayoutObject, QgsProperty,
+                      QgsFeatureRequest, QgsReadWriteContext)
+from qgis.PyQt.QtXml import QDomDocument
 
 # Qt5/Qt6 compatibility
 try:
@@ -30,9 +32,11 @@ except ImportError:
 
 if _qt6:
     Qt_AlignHCenter = Qt.AlignmentFlag.AlignHCenter
+    Qt_ToolTipRole = Qt.ItemDataRole.ToolTipRole
 else:
     from qgis.PyQt.QtCore import Qt
     Qt_AlignHCenter = Qt.AlignHCenter
+    Qt_ToolTipRole = Qt.ToolTipRole
 
 # Try to import elevation profile (QGIS 3.26+)
 try:
@@ -41,8 +45,44 @@ try:
 except ImportError:
     HAS_ELEVATION_PROFILE = False
 import os
+import time
 from datetime import datetime
 
+from .layer_registry import LayerRegistry, ROLE_PROFILES, ROLE_SECTIONS
+from .profile_render_pool import (IMAGE_FORMATS, profile_image_format, set_profile_image_format, profile_image_path,
+                                  profile_image_expression)
+from .export_presets import EXPORT_PRESETS, export_preset, set_export_preset, pdf_export_settings
+
+# Parsed .qpt templates: absolute path -> ((mtime, size), QDomDocument)
+_template_cache = {}
+
+
+def parsed_template(template_path):
+    """QDomDocument of a layout template, parsed once per version of the file
+
+    The document is shared: readLayoutXml() only reads it, so every layout
+    built from the same template reuses one parse. Returns None when the
+    file cannot be parsed.
+    """
+    path = os.path.abspath(template_path)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _template_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        template_content = f.read()
+    doc = QDomDocument()
+    if not doc.setContent(template_content):
+        _template_cache.pop(path, None)
+        return None
+    _template_cache[path] = (version, doc)
+    QgsMessageLog.logMessage(f"Parsed template {os.path.basename(path)} in {(time.perf_counter() - start) * 1000:.0f} ms",
+                             "ClipRasterLayout", Qgis.Info)
+    return doc
+
 class LayoutGenerator(QDialog):
     def __init__(self, iface, parent=None):
         super().__init__(parent)
@@ -82,6 +122,20 @@ class LayoutGenerator(QDialog):
         self.include_profile.setChecked(True)
         profile_layout.addRow(self.include_profile)
 
+        self.profile_format_combo = QComboBox()
+        self.profile_format_combo.addItem("PNG (raster)", "png")
+        self.profile_format_combo.addItem("SVG (vector, smaller PDF)", "svg")
+        self.profile_format_combo.setToolTip("Format of the profile charts rendered from now on and used by the layouts")
+        self.profile_format_combo.setCurrentIndex(max(0, self.profile_format_combo.findData(profile_image_format())))
+        self.profile_format_combo.currentIndexChanged.connect(
+            lambda: set_profile_image_format(self.profile_format_combo.currentData()))
+        profile_layout.addRow("Profile images:", self.profile_format_combo)
+
+        self.include_sheets = QCheckBox("Add combined profile sheets (one page each)")
+        self.include_sheets.setToolTip("Pages of the last combined sheet (small multiples or overlay)")
+        self.include_sheets.setChecked(False)
+        profile_layout.addRow(self.include_sheets)
+
         profile_group.setLayout(profile_layout)
         layout.addWidget(profile_group)
 
@@ -173,6 +227,28 @@ class LayoutGenerator(QDialog):
         atlas_margin_layout.addWidget(self.atlas_margin)
         atlas_layout.addLayout(atlas_margin_layout)
 
+        from .atlas_export import HAS_PYPDF, default_workers
+        self.atlas_workers = QSpinBox()
+        self.atlas_workers.setRange(1, 64)
+        self.atlas_workers.setValue(default_workers() if HAS_PYPDF else 1)
+        self.atlas_workers.setEnabled(HAS_PYPDF)
+        self.atlas_workers.setToolTip("Atlas pages are split among this many QGIS processes and merged into one PDF; "
+                                      "the processes read the saved project file"
+                                      if HAS_PYPDF else "Parallel export needs the pypdf Python package")
+        atlas_workers_layout = QHBoxLayout()
+        atlas_workers_layout.addWidget(QLabel("Export processes:"))
+        atlas_workers_layout.addWidget(self.atlas_workers)
+        atlas_layout.addLayout(atlas_workers_layout)
+
+        self.atlas_reuse = QCheckBox("Re-render only changed pages")
+        self.atlas_reuse.setChecked(HAS_PYPDF)
+        self.atlas_reuse.setEnabled(HAS_PYPDF)
+        self.atlas_reuse.setToolTip("Pages are kept next to the PDF (<name>_pages) and reused while their section, "
+                                    "profile image, map data and the layout are unchanged; "
+                                    "unchecked, no page folder is kept"
+                                    if HAS_PYPDF else "Needs the pypdf Python package")
+        atlas_layout.addWidget(self.atlas_reuse)
+
         atlas_group.setLayout(atlas_layout)
         layout.addWidget(atlas_group)
         
@@ -183,6 +259,16 @@ class LayoutGenerator(QDialog):
         self.generate_button.clicked.connect(self.generate_layout)
         button_layout.addWidget(self.generate_button)
 
+        self.preset_combo = QComboBox()
+        for name, preset in EXPORT_PRESETS.items():
+            self.preset_combo.addItem(preset['label'], name)
+        self.preset_combo.setCurrentIndex(max(0, self.preset_combo.findData(export_preset())))
+        self.preset_combo.currentIndexChanged.connect(
+            lambda: set_export_preset(self.preset_combo.currentData()))
+        self.update_preset_tooltips()
+        button_layout.addWidget(QLabel("PDF preset:"))
+        button_layout.addWidget(self.preset_combo)
+
         self.export_button = QPushButton("Export PDF")
         self.export_button.clicked.connect(self.export_pdf)
         self.export_button.setEnabled(False)
@@ -214,21 +300,32 @@ class LayoutGenerator(QDialog):
         self.profile_combo.clear()
         
         # Populate raster layers
-        for layer in QgsProject.instance().mapLayers().values():
-            if isinstance(layer, QgsRasterLayer):
-                self.raster_combo.addItem(layer.name(), layer)
-                
+        registry = LayerRegistry.instance()
+        for layer in registry.raster_layers():
+            self.raster_combo.addItem(layer.name(), layer)
+
         # Add profile options
         self.profile_combo.addItem("None", None)
-        
-        # Check for profile layer
-        for layer in QgsProject.instance().mapLayers().values():
-            if layer.name() == "Profili DEM" and isinstance(layer, QgsVectorLayer):
-                # Add each profile feature
-                for feature in layer.getFeatures():
-                    profile_name = feature['name']
-                    if profile_name:
-                        self.profile_combo.addItem(profile_name, feature)
+
+        # One entry per profile: only the names are read, the selected
+        # feature is fetched by id when the layout is generated
+        layer = registry.layer(ROLE_PROFILES)
+        if layer is not None:
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(['name'], layer.fields())
+            for feature in layer.getFeatures(request):
+                profile_name = feature['name']
+                if profile_name:
+                    self.profile_combo.addItem(profile_name, feature.id())
+
+    def selected_profile_feature(self):
+        """Feature of the profile chosen in profile_combo, or None"""
+        fid = self.profile_combo.currentData()
+        layer = LayerRegistry.instance().layer(ROLE_PROFILES)
+        if fid is None or layer is None:
+            return None
+        feature = layer.getFeature(fid)
+        return feature if feature.isValid() else None
         
     def select_logo(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Select Logo", "", "Images (*.png *.jpg *.jpeg *.svg)")
@@ -262,6 +359,8 @@ class LayoutGenerator(QDialog):
                     
                     # Populate it with data
                     self.populate_template_layout(layout, raster_layer)
+                    if self.include_sheets.isChecked():
+                        self.add_profile_sheets(layout)
                     
                     self.export_button.setEnabled(True)
                     
@@ -302,15 +401,12 @@ class LayoutGenerator(QDialog):
         extent = raster_layer.extent()
         
         # Check if we need to include profile lines
-        profile_layer = None
-        for layer in QgsProject.instance().mapLayers().values():
-            if layer.name() == "Profili DEM":
-                profile_layer = layer
-                # Expand extent to include all profiles
-                profile_extent = layer.extent()
-                if not profile_extent.isEmpty():
-                    extent.combineExtentWith(profile_extent)
-                break
+        profile_layer = LayerRegistry.instance().layer(ROLE_PROFILES)
+        if profile_layer is not None:
+            # Expand extent to include all profiles
+            profile_extent = profile_layer.extent()
+            if not profile_extent.isEmpty():
+                extent.combineExtentWith(profile_extent)
         
         # Add 10% buffer
         extent = extent.buffered(extent.width() * 0.1)
@@ -424,10 +520,9 @@ class LayoutGenerator(QDialog):
                 root.addLayer(raster_layer)
                 
             # Add profile layer if it exists
-            for layer in QgsProject.instance().mapLayers().values():
-                if layer.name() == "Profili DEM":
-                    root.addLayer(layer)
-                    break
+            profile_layer = LayerRegistry.instance().layer(ROLE_PROFILES)
+            if profile_layer is not None:
+                root.addLayer(profile_layer)
                     
             if self.paper_combo.currentText() == "A3 Landscape":
                 legend.attemptMove(QgsLayoutPoint(209.9, 70, QgsUnitTypes.LayoutMillimeters))
@@ -462,7 +557,7 @@ class LayoutGenerator(QDialog):
             layout.addLayoutItem(overview)
             
         # Profile graph
-        if self.include_profile.isChecked() and self.profile_combo.currentData():
+        if self.include_profile.isChecked() and self.profile_combo.currentData() is not None:
             # Check if native elevation profile is available
             if HAS_ELEVATION_PROFILE:
                 try:
@@ -489,6 +584,9 @@ class LayoutGenerator(QDialog):
             logo.attemptResize(QgsLayoutSize(40, 30, QgsUnitTypes.LayoutMillimeters))
             layout.addLayoutItem(logo)
             
+        if self.include_sheets.isChecked():
+            self.add_profile_sheets(layout)
+            
         # Add layout to project
         project.layoutManager().addLayout(layout)
         
@@ -502,7 +600,7 @@ class LayoutGenerator(QDialog):
         
     def add_native_elevation_profile(self, layout, page_size):
         """Add elevation profile using QGIS native elevation profile tool"""
-        profile_feature = self.profile_combo.currentData()
+        profile_feature = self.selected_profile_feature()
         if not profile_feature:
             return
             
@@ -521,20 +619,7 @@ class LayoutGenerator(QDialog):
             profile_item.attemptResize(QgsLayoutSize(page_size[0] - 20, 40, QgsUnitTypes.LayoutMillimeters))
         
         # Find DEM layer
-        dem_layer = None
-        for layer in QgsProject.instance().mapLayers().values():
-            if isinstance(layer, QgsRasterLayer) and layer.bandCount() == 1:
-                # Check if it's a DEM by looking at the name or checking if it has elevation data
-                if 'dem' in layer.name().lower() or 'dtm' in layer.name().lower() or 'elevation' in layer.name().lower():
-                    dem_layer = layer
-                    break
-        
-        if not dem_layer:
-            # If no DEM found by name, use the first single-band raster
-            for layer in QgsProject.instance().mapLayers().values():
-                if isinstance(layer, QgsRasterLayer) and layer.bandCount() == 1:
-                    dem_layer = layer
-                    break
+        dem_layer = LayerRegistry.instance().dem_layer()
         
         # Set the profile curve from the line geometry
         profile_item.setProfileCurve(profile_geom)
@@ -572,7 +657,7 @@ class LayoutGenerator(QDialog):
         
     def add_profile_graph(self, layout, page_size):
         """Add the selected profile graph to the layout"""
-        profile_feature = self.profile_combo.currentData()
+        profile_feature = self.selected_profile_feature()
         if not profile_feature:
             QgsMessageLog.logMessage("No profile feature selected", "ClipRasterLayout", Qgis.Warning)
             return
@@ -584,22 +669,7 @@ class LayoutGenerator(QDialog):
         
         QgsMessageLog.logMessage(f"Adding profile: {profile_name}", "ClipRasterLayout", Qgis.Info)
         
-        # Import at the beginning
-        import os
-        import tempfile
-        
-        # First try to get path from project custom properties
-        profile_path, _ = QgsProject.instance().readEntry("ClipRasterLayout", f"profile_{profile_name}")
-        
-        if not profile_path or not os.path.exists(profile_path):
-            # Try profile save directory
-            save_dir, _ = QgsProject.instance().readEntry("ClipRasterLayout", "profile_save_dir")
-            if save_dir and os.path.exists(save_dir):
-                profile_path = os.path.join(save_dir, f"profile_{profile_name}.png")
-            else:
-                # Fallback to temp directory
-                temp_dir = tempfile.gettempdir()
-                profile_path = os.path.join(temp_dir, f"profile_{profile_name}.png")
+        profile_path = self.find_profile_image(profile_name)
         
         # Debug: check if file exists
         QgsMessageLog.logMessage(f"Looking for profile at: {profile_path}", "ClipRasterLayout", Qgis.Info)
@@ -610,7 +680,7 @@ class LayoutGenerator(QDialog):
         if os.path.exists(profile_dir):
             QgsMessageLog.logMessage(f"Available profile files in {profile_dir}:", "ClipRasterLayout", Qgis.Info)
             for file in os.listdir(profile_dir):
-                if file.startswith("profile_") and file.endswith(".png"):
+                if file.startswith("profile_") and file.endswith(IMAGE_FORMATS):
                     QgsMessageLog.logMessage(f"  - {file}", "ClipRasterLayout", Qgis.Info)
         
         if os.path.exists(profile_path):
@@ -641,6 +711,48 @@ class LayoutGenerator(QDialog):
                 f"Immagine del profilo non trovata.\n"
                 f"Assicurati di aver generato il profilo '{profile_name}' prima di creare il layout.")
     
+    def add_profile_sheets(self, layout):
+        """Append one page per combined profile sheet, with the sheet filling it"""
+        paths = QgsProject.instance().readListEntry("ClipRasterLayout", "profile_sheets")[0]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            QgsMessageLog.logMessage("No combined profile sheet found", "ClipRasterLayout", Qgis.Warning)
+            return
+        collection = layout.pageCollection()
+        size = collection.page(0).pageSize()
+        margin = 10
+        for path in paths:
+            page = QgsLayoutItemPage(layout)
+            page.setPageSize(size)
+            collection.addPage(page)
+            picture = QgsLayoutItemPicture(layout)
+            picture.setPicturePath(path)
+            picture.setResizeMode(QgsLayoutItemPicture.Zoom)
+            layout.addLayoutItem(picture)
+            picture.attemptResize(QgsLayoutSize(size.width() - 2 * margin, size.height() - 2 * margin,
+                                                QgsUnitTypes.LayoutMillimeters))
+            picture.attemptMove(QgsLayoutPoint(margin, margin, QgsUnitTypes.LayoutMillimeters),
+                                page=collection.pageCount() - 1)
+        QgsMessageLog.logMessage(f"Added {len(paths)} combined profile sheet page(s)", "ClipRasterLayout", Qgis.Info)
+    
+    def find_profile_image(self, profile_name):
+        """Chart of a profile: project entry first, then the profile/temp folder"""
+        profile_path, _ = QgsProject.instance().readEntry("ClipRasterLayout", f"profile_{profile_name}")
+        if profile_path and os.path.exists(profile_path):
+            return profile_path
+        
+        save_dir, _ = QgsProject.instance().readEntry("ClipRasterLayout", "profile_save_dir")
+        if not save_dir or not os.path.exists(save_dir):
+            import tempfile
+            save_dir = tempfile.gettempdir()
+        # Preferred format first, then any other format already rendered
+        preferred = profile_image_format()
+        for fmt in [preferred] + [f for f in IMAGE_FORMATS if f != preferred]:
+            path = profile_image_path(save_dir, profile_name, fmt)
+            if os.path.exists(path):
+                return path
+        return profile_image_path(save_dir, profile_name, preferred)
+    
     def add_metadata_table(self, layout, raster_layer, page_size):
         # Create frame for metadata  
         # Metadata position based on template
@@ -693,18 +805,47 @@ class LayoutGenerator(QDialog):
         file_path, _ = QFileDialog.getSaveFileName(self, "Export PDF", "", "PDF Files (*.pdf)")
         if file_path:
             exporter = QgsLayoutExporter(self.current_layout)
+            settings = pdf_export_settings(self.current_layout, self.preset_combo.currentData())
 
-            settings = QgsLayoutExporter.PdfExportSettings()
-            settings.dpi = 300
-            settings.rasterizeWholeImage = False
-
+            start = time.perf_counter()
             result = exporter.exportToPdf(file_path, settings)
 
             if result == QgsLayoutExporter.Success:
-                QMessageBox.information(self, "Success", "PDF exported successfully!")
+                report = self.export_report(file_path, start)
+                QMessageBox.information(self, "Success", f"PDF exported successfully!\n\n{report}")
             else:
                 QMessageBox.warning(self, "Error", "Error exporting PDF")
 
+    def export_report(self, file_path, start):
+        """Export time and PDF size (logged, to compare presets and PNG/SVG profiles)
+
+        The last measurement of each preset is kept in the user settings
+        (not the project, which it would mark as modified) and shown in
+        the preset tooltips.
+        """
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(file_path) / 1048576 if os.path.exists(file_path) else 0
+        preset = self.preset_combo.currentData()
+        report = (f"Time: {elapsed:.1f} s, size: {size_mb:.1f} MB "
+                  f"(preset: {preset}, profiles: {profile_image_format().upper()})")
+        QgsMessageLog.logMessage(f"Exported {file_path}: {report}", "ClipRasterLayout", Qgis.Info)
+        QgsSettings().setValue(f"ClipRasterLayout/export_report/{preset}",
+                               f"{elapsed:.1f} s, {size_mb:.1f} MB, {os.path.basename(file_path)}")
+        self.update_preset_tooltips()
+        return report
+
+    def update_preset_tooltips(self):
+        for index in range(self.preset_combo.count()):
+            name = self.preset_combo.itemData(index)
+            preset = EXPORT_PRESETS[name]
+            last = QgsSettings().value(f"ClipRasterLayout/export_report/{name}", "")
+            tip = (f"{preset['dpi']} dpi, {'lossless' if preset['lossless'] else 'JPEG-compressed'} images, "
+                   f"{'simplified' if preset['simplify'] else 'full'} geometries, text as {preset['text']}"
+                   f"{', georeferenced' if preset['georeference'] else ''}")
+            if last:
+                tip += f"\nLast export: {last}"
+            self.preset_combo.setItemData(index, tip, Qt_ToolTipRole)
+
     def export_atlas_pdf(self):
         """Export Atlas to PDF (one page per section)"""
         if not self.current_layout:
@@ -719,22 +860,41 @@ class LayoutGenerator(QDialog):
         if not file_path:
             return
 
+        from .atlas_export import HAS_PYPDF, export_atlas
+        if HAS_PYPDF:
+            start = time.perf_counter()
+            try:
+                result = export_atlas(self.current_layout, file_path, self.atlas_workers.value(),
+                                      preset=self.preset_combo.currentData(),
+                                      reuse=self.atlas_reuse.isChecked(), parent=self)
+            except Exception as e:
+                QgsMessageLog.logMessage(f"Page-by-page atlas export failed, exporting the whole atlas: {e}",
+                                         "ClipRasterLayout", Qgis.Warning)
+            else:
+                if result is not None:
+                    feature_count, reused = result
+                    report = self.export_report(file_path, start)
+                    QMessageBox.information(self, "Success",
+                        f"Atlas PDF exported successfully!\n\n"
+                        f"Pages: {feature_count} ({feature_count - reused} rendered, {reused} unchanged and reused)\n"
+                        f"File: {file_path}\n{report}")
+                return
+
         try:
             exporter = QgsLayoutExporter(self.current_layout)
-
-            settings = QgsLayoutExporter.PdfExportSettings()
-            settings.dpi = 300
-            settings.rasterizeWholeImage = False
+            settings = pdf_export_settings(self.current_layout, self.preset_combo.currentData())
 
             # Export all Atlas pages to single PDF
+            start = time.perf_counter()
             result = exporter.exportToPdf(atlas, file_path, settings)
 
             if result == QgsLayoutExporter.Success:
                 feature_count = atlas.count()
+                report = self.export_report(file_path, start)
                 QMessageBox.information(self, "Success",
                     f"Atlas PDF exported successfully!\n\n"
                     f"Pages: {feature_count}\n"
-                    f"File: {file_path}")
+                    f"File: {file_path}\n{report}")
             else:
                 QMessageBox.warning(self, "Error", f"Error exporting Atlas PDF: {result}")
 
@@ -745,12 +905,9 @@ class LayoutGenerator(QDialog):
         """Generate a layout with Atlas enabled for sections"""
         try:
             # Find the sections/profile layer
-            profile_layer = None
-            for layer in QgsProject.instance().mapLayers().values():
-                if layer.name() in ["Profili DEM", "Sections"] and isinstance(layer, QgsVectorLayer):
-                    if layer.featureCount() > 0:
-                        profile_layer = layer
-                        break
+            registry = LayerRegistry.instance()
+            profile_layer = next((layer for layer in registry.layers(ROLE_PROFILES) + registry.layers(ROLE_SECTIONS)
+                                  if layer.featureCount() > 0), None)
 
             if not profile_layer:
                 QMessageBox.warning(self, "Warning",
@@ -821,7 +978,10 @@ class LayoutGenerator(QDialog):
                 "3D Length: [% round(\"length_3d\", 2) %] m\n"
                 "Elevation A: [% round(\"elev_a\", 1) %] m\n"
                 "Elevation B: [% round(\"elev_b\", 1) %] m\n"
-                "Elevation Change: [% round(\"elev_b\" - \"elev_a\", 1) %] m"
+                "Elevation Change: [% round(\"elev_b\" - \"elev_a\", 1) %] m\n"
+                "Min / Max: [% round(\"elev_min\", 1) %] / [% round(\"elev_max\", 1) %] m\n"
+                "Ascent / Descent: [% round(\"ascent\", 1) %] / [% round(\"descent\", 1) %] m\n"
+                "Max Slope: [% round(\"max_slope\", 1) %]°"
             )
             info_label.setFont(QFont("Arial", 10))
             info_label.attemptMove(QgsLayoutPoint(size[0] * 0.7, 40, QgsUnitTypes.LayoutMillimeters))
@@ -835,20 +995,15 @@ class LayoutGenerator(QDialog):
 
             # Get profile save directory
             save_dir, _ = QgsProject.instance().readEntry("ClipRasterLayout", "profile_save_dir")
-            if save_dir:
-                # Use expression to get profile image based on section name
-                profile_pic.setDataDefinedProperty(
-                    QgsLayoutObject.PictureSource,
-                    QgsProperty.fromExpression(f"'{save_dir}/profile_' || \"name\" || '.png'")
-                )
-            else:
+            if not save_dir:
                 # Fallback to temp directory
                 import tempfile
-                temp_dir = tempfile.gettempdir()
-                profile_pic.setDataDefinedProperty(
-                    QgsLayoutObject.PictureSource,
-                    QgsProperty.fromExpression(f"'{temp_dir}/profile_' || \"name\" || '.png'")
-                )
+                save_dir = tempfile.gettempdir()
+            # Use expression to get profile image based on section name (SVG stays vector in the PDF)
+            profile_pic.setDataDefinedProperty(
+                QgsLayoutObject.PictureSource,
+                QgsProperty.fromExpression(profile_image_expression(save_dir, '"name"'))
+            )
 
             profile_pic.attemptMove(QgsLayoutPoint(10, size[1] * 0.6, QgsUnitTypes.LayoutMillimeters))
             profile_pic.attemptResize(QgsLayoutSize(size[0] - 20, size[1] * 0.3, QgsUnitTypes.LayoutMillimeters))
@@ -928,15 +1083,8 @@ class LayoutGenerator(QDialog):
                 return None
             
             # Now load the template content into the existing layout
-            from qgis.core import QgsReadWriteContext
-            from qgis.PyQt.QtXml import QDomDocument
-            
-            # Read template content
-            with open(template_path, 'r', encoding='utf-8') as f:
-                template_content = f.read()
-            
-            doc = QDomDocument()
-            if not doc.setContent(template_content):
+            doc = parsed_template(template_path)
+            if doc is None:
                 QgsMessageLog.logMessage("Failed to parse template XML", "ClipRasterLayout", Qgis.Critical)
                 manager.removeLayout(layout)
                 return None
@@ -1003,15 +1151,12 @@ class LayoutGenerator(QDialog):
                 extent = raster_layer.extent()
                 
                 # Check if we need to include profile lines
-                profile_layer = None
-                for layer in QgsProject.instance().mapLayers().values():
-                    if layer.name() == "Profili DEM":
-                        profile_layer = layer
-                        # Expand extent to include all profiles
-                        profile_extent = layer.extent()
-                        if not profile_extent.isEmpty():
-                            extent.combineExtentWith(profile_extent)
-                        break
+                profile_layer = LayerRegistry.instance().layer(ROLE_PROFILES)
+                if profile_layer is not None:
+                    # Expand extent to include all profiles
+                    profile_extent = profile_layer.extent()
+                    if not profile_extent.isEmpty():
+                        extent.combineExtentWith(profile_extent)
                 
                 # Add 10% buffer
                 extent = extent.buffered(extent.width() * 0.1)
@@ -1048,14 +1193,10 @@ class LayoutGenerator(QDialog):
         try:
             # Get all profile features
             profile_features = []
-            for layer in QgsProject.instance().mapLayers().values():
-                if layer.name() == "Profili DEM" and isinstance(layer, QgsVectorLayer):
-                    for feature in layer.getFeatures():
-                        profile_features.append(feature)
-                    break
-            
-            # Limit to 6 profiles
-            profile_features = profile_features[:6]
+            layer = LayerRegistry.instance().layer(ROLE_PROFILES)
+            if layer is not None:
+                # Limit to 6 profiles
+                profile_features = list(layer.getFeatures(QgsFeatureRequest().setLimit(6)))
             
             if not profile_features:
                 QgsMessageLog.logMessage("No profiles found to add to layout", "ClipRasterLayout", Qgis.Info)
@@ -1094,18 +1235,7 @@ class LayoutGenerator(QDialog):
                         profile_name = profile_feature['name']
                         
                         # Get profile image path
-                        profile_path, _ = QgsProject.instance().readEntry("ClipRasterLayout", f"profile_{profile_name}")
-                        
-                        if not profile_path or not os.path.exists(profile_path):
-                            # Try profile save directory
-                            save_dir, _ = QgsProject.instance().readEntry("ClipRasterLayout", "profile_save_dir")
-                            if save_dir and os.path.exists(save_dir):
-                                profile_path = os.path.join(save_dir, f"profile_{profile_name}.png")
-                            else:
-                                # Fallback to temp directory
-                                import tempfile
-                                temp_dir = tempfile.gettempdir()
-                                profile_path = os.path.join(temp_dir, f"profile_{profile_name}.png")
+                        profile_path = self.find_profile_image(profile_name)
                         
                         if os.path.exists(profile_path):
                             pic_item.setPicturePath(profile_path)
@@ -1220,19 +1350,7 @@ class LayoutGenerator(QDialog):
             profile_item.setProfileCurve(profile_feature.geometry().constGet())
             
             # Find DEM layer
-            dem_layer = None
-            for layer in QgsProject.instance().mapLayers().values():
-                if isinstance(layer, QgsRasterLayer) and layer.bandCount() == 1:
-                    if 'dem' in layer.name().lower() or 'dtm' in layer.name().lower() or 'elevation' in layer.name().lower():
-                        dem_layer = layer
-                        break
-            
-            # If no DEM found by name, use the first single-band raster
-            if not dem_layer:
-                for layer in QgsProject.instance().mapLayers().values():
-                    if isinstance(layer, QgsRasterLayer) and layer.bandCount() == 1:
-                        dem_layer = layer
-                        break
+            dem_layer = LayerRegistry.instance().dem_layer()
             
             if dem_layer:
                 try:
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_crossings.py
+# Where sections cross features of other vector layers (rivers, walls, ...).
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+from qgis.core import (QgsSpatialIndex, QgsFeatureRequest, QgsGeometry, QgsProject,
+                       QgsWkbTypes)
+
+
+class CrossingIndex:
+    """Spatial index of one vector layer for section crossing queries
+
+    The layer is read once; geometries are reprojected to crs and kept in
+    the index, so each query only touches the features whose bounding box
+    meets the section.
+    """
+
+    def __init__(self, layer, crs, label_field=None):
+        self.name = layer.name()
+        self.polygons = layer.geometryType() == QgsWkbTypes.PolygonGeometry
+        self.labels = {}
+
+        request = QgsFeatureRequest().setDestinationCrs(crs, QgsProject.instance().transformContext())
+        if label_field and layer.fields().indexOf(label_field) >= 0:
+            request.setSubsetOfAttributes([label_field], layer.fields())
+        else:
+            label_field = None
+            request.setNoAttributes()
+
+        self.index = QgsSpatialIndex(QgsSpatialIndex.FlagStoreFeatureGeometries)
+        for feature in layer.getFeatures(request):
+            if not feature.hasGeometry():
+                continue
+            self.index.addFeature(feature)
+            if label_field:
+                value = feature[label_field]
+                if value not in (None, ''):
+                    self.labels[feature.id()] = str(value)
+
+    def crossings(self, section):
+        """[(distance along section in CRS units, label)] sorted by distance"""
+        found = []
+        for fid in self.index.intersects(section.boundingBox()):
+            geom = self.index.geometry(fid)
+            if self.polygons:
+                # Crossing a polygon means crossing its outline
+                geom = QgsGeometry(geom.constGet().boundary())
+            hit = section.intersection(geom)
+            if hit.isEmpty():
+                continue
+            label = self.labels.get(fid, self.name)
+            for vertex in hit.vertices():
+                found.append((section.lineLocatePoint(QgsGeometry(vertex.clone())), label))
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+def section_crossings(indexes, section):
+    """Crossings of section with all indexes, sorted by distance"""
+    found = []
+    for index in indexes:
+        found.extend(index.crossings(section))
+    found.sort(key=lambda item: item[0])
+    return found
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_decimate.py
+# Display-time decimation of dense profiles (on-screen charts only; exported
+# data and layout images keep every sample).
+# No QGIS/Qt imports.
+# -----------------------------------------------------------------------------
+import numpy as np
+
+# Profiles shorter than this many points per pixel column are drawn as is
+POINTS_PER_PIXEL = 2
+
+
+def _buckets(n, count):
+    """Start indices of count nearly equal buckets over n samples (+ end)"""
+    return np.linspace(0, n, count + 1).astype(np.int64)
+
+
+def decimate_minmax(x, y, width):
+    """Keep the lowest and highest sample of each pixel column
+
+    Peaks and pits survive at any zoom, which is what matters for terrain.
+    Returns at most 2 * width points in their original order; NaN samples
+    are only kept where a whole column is NaN (so gaps stay visible).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if width < 1 or n <= POINTS_PER_PIXEL * width:
+        return x, y
+    edges = _buckets(n, width)
+    # One row of sample indices per column, short columns padded with
+    # their last index
+    size = int(np.diff(edges).max())
+    index = np.minimum(edges[:-1, None] + np.arange(size), edges[1:, None] - 1)
+    values = y[index]
+    nan = np.isnan(values)
+    rows = np.arange(width)
+    low = index[rows, np.argmin(np.where(nan, np.inf, values), axis=1)]
+    high = index[rows, np.argmax(np.where(nan, -np.inf, values), axis=1)]
+    keep = np.unique(np.concatenate([low, high]))
+    return x[keep], y[keep]
+
+
+def decimate_lttb(x, y, count):
+    """Largest-Triangle-Three-Buckets down to count points
+
+    Keeps the overall shape with fewer points than min-max, but may drop
+    single-sample spikes; NaN samples are ignored.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+    n = len(y)
+    if count < 3 or n <= count:
+        return x, y
+    edges = _buckets(n - 2, count - 2) + 1
+    keep = np.empty(count, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(count - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point)
+        if i < count - 3:
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        keep[i + 1] = previous
+    return x[keep], y[keep]
+
+
+def decimate(x, y, width, method='minmax'):
+    """Decimate a profile for a chart width pixels wide
+
+    method is 'minmax' (default) or 'lttb'. Returns x, y unchanged when
+    there are fewer than POINTS_PER_PIXEL points per column.
+    """
+    if method == 'lttb':
+        return decimate_lttb(x, y, int(width) * POINTS_PER_PIXEL)
+    return decimate_minmax(x, y, int(width))
+
+
+def decimate_figure_lines(figure, method='minmax'):
+    """Decimate in place the line artists of a figure to its pixel width
+
+    For figures built elsewhere and only displayed (fills and markers are
+    left as they are).
+    """
+    width = figure.get_figwidth() * figure.dpi
+    for ax in figure.axes:
+        for line in ax.get_lines():
+            x, y = line.get_data()
+            if len(x) > POINTS_PER_PIXEL * width:
+                line.set_data(*decimate(x, y, width, method))
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_render_pool.py
+# Worker processes rendering profile charts off the QGIS GUI thread.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+import os
+import sys
+import threading
+
+from qgis.PyQt.QtCore import QEventLoop, QObject, QTimer, pyqtSignal
+from qgis.core import QgsMessageLog, Qgis, QgsProject, QgsExpressionContextUtils
+
+
+# Jobs queued per worker before submit() waits: a run of thousands of
+# profiles keeps only a few job payloads in memory
+MAX_JOBS_PER_WORKER = 2
+
+# Profile image formats: PNG (raster) or SVG (vector, embedded as such in layouts)
+IMAGE_FORMATS = ('png', 'svg')
+# Project variable mirroring the format, read by the layout picture expressions
+FORMAT_VARIABLE = 'clip_profile_format'
+
+
+def profile_image_format():
+    """Image format chosen for the profile charts of this project"""
+    fmt, _ = QgsProject.instance().readEntry("ClipRasterLayout", "profile_format", "png")
+    return fmt if fmt in IMAGE_FORMATS else 'png'
+
+
+def set_profile_image_format(fmt):
+    project = QgsProject.instance()
+    project.writeEntry("ClipRasterLayout", "profile_format", fmt)
+    QgsExpressionContextUtils.setProjectVariable(project, FORMAT_VARIABLE, fmt)
+
+
+def profile_image_expression(directory, name_expression):
+    """Expression of the chart path of the profile named by name_expression
+
+    The extension comes from @clip_profile_format, so layouts follow later
+    format changes; projects without the variable use the current format.
+    """
+    return (f"'{directory}/profile_' || {name_expression} || '.' || "
+            f"coalesce(@{FORMAT_VARIABLE}, '{profile_image_format()}')")
+
+
+def profile_image_path(directory, name, fmt=None):
+    """Path of the chart of profile name in directory"""
+    return os.path.join(directory, f"profile_{name}.{fmt or profile_image_format()}")
+
+
+def profile_sheet_path(directory, page, fmt=None):
+    """Path of page (1-based) of the combined profile sheet in directory"""
+    return os.path.join(directory, f"profile_sheet_{page:02d}.{fmt or profile_image_format()}")
+
+
+def queue_profile_sheets(profiles, directory, mode='grid', title='Profiles'):
+    """Queue the combined sheet pages of profiles and return their paths
+
+    The paths are stored in the project (entry "profile_sheets") for the
+    layout generator.
+    """
+    from .profile_renderer import sheet_jobs
+    fmt = profile_image_format()
+    jobs = sheet_jobs(profiles, lambda page: profile_sheet_path(directory, page, fmt), mode, title)
+    for job in jobs:
+        ProfileRenderPool.instance().submit(job)
+    paths = [job['path'] for job in jobs]
+    QgsProject.instance().writeEntry("ClipRasterLayout", "profile_sheets", paths)
+    return paths
+
+
+def python_executable():
+    """Python interpreter for the worker processes, or None
+
+    Inside QGIS sys.executable can be the QGIS binary itself (Windows,
+    macOS bundles), which must not be spawned as a worker: look for the
+    bundled interpreter next to it.
+    """
+    version = sys.version_info
+    if os.name == 'nt':
+        names = ['pythonw.exe', 'python.exe', f'python{version.major}.exe']
+    else:
+        names = [f'python{version.major}.{version.minor}', f'python{version.major}', 'python']
+    folders = [sys.exec_prefix, os.path.join(sys.exec_prefix, 'bin'), os.path.dirname(sys.executable or '')]
+
+    candidates = [sys.executable] + [os.path.join(folder, name) for folder in folders for name in names]
+    for path in candidates:
+        if path and os.path.isfile(path) and os.path.basename(path).lower().startswith('python'):
+            return path
+    return None
+
+
+class ProfileRenderPool(QObject):
+    """Process pool rendering profile charts in parallel
+
+    Jobs are plain dicts handled by profile_renderer.render_job; only
+    the finished image path comes back, through Qt signals delivered on
+    the GUI thread. Without a usable interpreter (or after the pool broke)
+    jobs are rendered in the calling process with the same renderer.
+    Images whose digest sidecar matches the job are not rendered again
+    (rendered is still emitted for them).
+    """
+    rendered = pyqtSignal(str, str)  # profile name, image path
+    failed = pyqtSignal(str, str)  # profile name, error message
+    idle = pyqtSignal(int, int)  # images written, unchanged images skipped since last idle
+    _job_finished = pyqtSignal()  # wakes up _wait_for_workers
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def shutdown_instance(cls):
+        if cls._instance is not None:
+            cls._instance.shutdown()
+            cls._instance = None
+
+    def __init__(self, workers=None):
+        super().__init__()
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.executor = None
+        self.disabled = False
+        self.pending = 0
+        self.completed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self.executor is None and not self.disabled:
+            executable = python_executable()
+            if executable is None:
+                QgsMessageLog.logMessage("No Python interpreter found for render workers, rendering in QGIS",
+                                         "ClipRasterLayout", Qgis.Warning)
+                self.disabled = True
+                return None
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: workers must not inherit the QGIS/Qt state of this process
+            context = multiprocessing.get_context('spawn')
+            context.set_executable(executable)
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=context)
+            QgsMessageLog.logMessage(f"Started {self.workers} profile render workers ({executable})",
+                                     "ClipRasterLayout", Qgis.Info)
+        return self.executor
+
+    def submit(self, job):
+        """Queue a render job; rendered/failed is emitted when it is done"""
+        # Renderer (numpy, matplotlib) and process pool are imported on the
+        # first job, not at QGIS startup
+        from concurrent.futures.process import BrokenProcessPool
+        from .profile_renderer import render_job, image_is_current
+        with self._lock:
+            self.pending += 1
+        try:
+            unchanged = image_is_current(job)
+        except Exception:
+            unchanged = False
+        if unchanged:
+            # Finished from the event loop, so a batch submitted in one go
+            # still ends with a single idle signal
+            QTimer.singleShot(0, lambda job=job: self._finish(job['name'], job['path'], None, skipped=True))
+            return
+        executor = self._executor()
+        if executor is not None:
+            self._wait_for_workers()
+            try:
+                future = executor.submit(render_job, job)
+                future.add_done_callback(lambda f, job=job: self._done(job, f))
+                return
+            except (BrokenProcessPool, RuntimeError) as e:
+                self._disable(e)
+        self._render_here(job)
+
+    def _wait_for_workers(self):
+        """Run an event loop until fewer than MAX_JOBS_PER_WORKER jobs per worker are in flight"""
+        loop = QEventLoop()
+        # Connected before the check: a job finishing in between still quits
+        # the loop (the signal is queued from the executor thread)
+        self._job_finished.connect(loop.quit)
+        try:
+            # pending includes the job being submitted
+            while self.pending > MAX_JOBS_PER_WORKER * self.workers and not self.disabled:
+                # exec_() is deprecated in Qt6, exec() works in both
+                if hasattr(loop, 'exec'):
+                    loop.exec()
+                else:
+                    loop.exec_()
+        finally:
+            self._job_finished.disconnect(loop.quit)
+
+    def _done(self, job, future):
+        # Runs in the executor thread: the signals are queued to the GUI thread
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            name, path = future.result()
+        except BrokenProcessPool as e:
+            self._disable(e)
+            self._render_here(job)
+            return
+        except Exception as e:
+            self._finish(job['name'], None, str(e))
+            return
+        self._finish(name, path, None)
+
+    def _render_here(self, job):
+        from .profile_renderer import render_job
+        try:
+            name, path = render_job(job)
+        except Exception as e:
+            self._finish(job['name'], None, str(e))
+            return
+        self._finish(name, path, None)
+
+    def _disable(self, error):
+        QgsMessageLog.logMessage(f"Profile render workers unavailable ({error}), rendering in QGIS",
+                                 "ClipRasterLayout", Qgis.Warning)
+        self.disabled = True
+        self.executor = None
+
+    def _finish(self, name, path, error, skipped=False):
+        if error is None:
+            self.rendered.emit(name, path)
+        else:
+            QgsMessageLog.logMessage(f"Rendering profile {name} failed: {error}", "ClipRasterLayout", Qgis.Warning)
+            self.failed.emit(name, error)
+        with self._lock:
+            self.pending -= 1
+            if skipped:
+                self.skipped += 1
+            else:
+                self.completed += 1
+            counts = (self.completed, self.skipped) if self.pending == 0 else None
+            if counts is not None:
+                self.completed = self.skipped = 0
+        self._job_finished.emit()
+        if counts is not None:
+            QgsMessageLog.logMessage(f"Profile images: {counts[0]} rendered, {counts[1]} unchanged and skipped",
+                                     "ClipRasterLayout", Qgis.Info)
+            self.idle.emit(*counts)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_renderer.py
+# Profile charts drawn with the matplotlib object-oriented Agg API.
+# No QGIS/Qt imports and no pyplot: this module also runs inside the render
+# worker processes (see profile_render_pool.py).
+# -----------------------------------------------------------------------------
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.patches import Patch
+
+
+def _xlim(ax, dist):
+    # Same 5% side margins matplotlib's autoscaling would give
+    span = (dist[-1] - dist[0]) or 1.0
+    ax.set_xlim(dist[0] - span * 0.05, dist[-1] + span * 0.05)
+
+
+def _ylim(ax, low, high, margin=0.1):
+    span = high - low
+    pad = span * margin if span > 0 else 1
+    ax.set_ylim(low - pad, high + pad)
+
+
+class ProfileTemplate:
+    """One configured figure reused for every profile of a style
+
+    Axes, labels, grid, line artists and legend are built once; each
+    render only swaps the line data, the fill, the limits, the title and
+    the crossing markers, so bulk runs are dominated by rasterization. The
+    layout is fixed (no tight bounding box), which also gives every image
+    of a style the same pixel size.
+    """
+
+    figsize = (10, 4)
+    margins = dict(left=0.08, right=0.98, bottom=0.13, top=0.91)
+
+    def __init__(self):
+        self.fig = Figure(figsize=self.figsize)
+        FigureCanvasAgg(self.fig)
+        self.fig.subplots_adjust(**self.margins)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.grid(True, alpha=0.3)
+        self.fill = None
+        self.markers = []
+        self.setup()
+
+    def setup(self):
+        pass
+
+    def update(self, job):
+        raise NotImplementedError
+
+    def _set_fill(self, *args, **kwargs):
+        if self.fill is not None:
+            self.fill.remove()
+        self.fill = self.ax.fill_between(*args, **kwargs)
+
+    def _set_crossings(self, crossings):
+        """Vertical markers with labels where the section crosses other layers"""
+        for artist in self.markers:
+            artist.remove()
+        self.markers = []
+        for distance, name in crossings or ():
+            self.markers.append(self.ax.axvline(distance, color='tab:red', linestyle='--',
+                                                linewidth=0.8, alpha=0.8))
+            self.markers.append(self.ax.text(distance, 0.98, name, transform=self.ax.get_xaxis_transform(),
+                                             rotation=90, ha='right', va='top', fontsize=7, color='tab:red'))
+
+    def render(self, job):
+        self.update(job)
+        self._set_crossings(job.get('crossings'))
+        self.fig.savefig(job['path'], dpi=job.get('dpi', 150))
+
+
+class SectionTemplate(ProfileTemplate):
+    """Single-line section profile (clip run / line layer profiles)"""
+
+    def setup(self):
+        self.line, = self.ax.plot([], [], 'b-', linewidth=1.5)
+        self.ax.set_xlabel('Distance (m)')
+        self.ax.set_ylabel('Elevation (m)')
+        self.title = self.ax.set_title('')
+
+    def update(self, job):
+        dist, elev = job['distances'], job['elevations']
+        self.line.set_data(dist, elev)
+        self._set_fill(dist, elev.min(), elev, color='tab:blue', alpha=0.3)
+        self.title.set_text(f"Section {job['name']}")
+        _xlim(self.ax, dist)
+        _ylim(self.ax, elev.min(), elev.max())
+
+
+class SwathTemplate(ProfileTemplate):
+    """Swath profile: mean line inside its min/max envelope"""
+
+    def setup(self):
+        self.low_line, = self.ax.plot([], [], color='tab:blue', linewidth=0.6, alpha=0.6)
+        self.high_line, = self.ax.plot([], [], color='tab:blue', linewidth=0.6, alpha=0.6)
+        self.mean_line, = self.ax.plot([], [], 'b-', linewidth=1.5, label='Mean')
+        self.ax.set_xlabel('Distance (m)')
+        self.ax.set_ylabel('Elevation (m)')
+        self.title = self.ax.set_title('')
+        envelope = Patch(facecolor='tab:blue', alpha=0.2, linewidth=0, label='Min-max envelope')
+        self.ax.legend(handles=[envelope, self.mean_line], loc='upper right', fontsize=8)
+
+    def update(self, job):
+        dist, low_band, high_band = job['distances'], job['min'], job['max']
+        self.low_line.set_data(dist, low_band)
+        self.high_line.set_data(dist, high_band)
+        self.mean_line.set_data(dist, job['elevations'])
+        self._set_fill(dist, low_band, high_band, color='tab:blue', alpha=0.2, linewidth=0)
+        self.title.set_text(f"Section {job['name']} (swath)")
+        _xlim(self.ax, dist)
+        _ylim(self.ax, np.nanmin(low_band), np.nanmax(high_band))
+
+
+class TopographicTemplate(ProfileTemplate):
+    """Profile drawn with the profile tool (min/max annotations)"""
+
+    figsize = (10, 6)
+    margins = dict(left=0.09, right=0.98, bottom=0.1, top=0.93)
+
+    def setup(self):
+        self.line, = self.ax.plot([], [], 'b-', linewidth=2)
+        self.ax.set_xlabel('Distanza (m)', fontsize=12)
+        self.ax.set_ylabel('Elevazione (m)', fontsize=12)
+        self.title = self.ax.set_title('', fontsize=14, fontweight='bold')
+        box = dict(boxstyle='round,pad=0.3', fc='yellow', alpha=0.7)
+        self.min_note = self.ax.annotate('', xy=(0, 0), xytext=(10, 10), textcoords='offset points',
+                                         ha='left', fontsize=10, bbox=box)
+        self.max_note = self.ax.annotate('', xy=(0, 0), xytext=(10, -10), textcoords='offset points',
+                                         ha='left', fontsize=10, bbox=dict(box))
+
+    def update(self, job):
+        dist, elev = job['distances'], job['elevations']
+        self.line.set_data(dist, elev)
+        self._set_fill(dist, elev, color='tab:blue', alpha=0.3)
+
+        min_idx, max_idx = int(np.argmin(elev)), int(np.argmax(elev))
+        min_elev, max_elev = float(elev[min_idx]), float(elev[max_idx])
+        self.min_note.xy = (dist[min_idx], min_elev)
+        self.min_note.set_text(f'Min: {min_elev:.1f}m')
+        self.max_note.xy = (dist[max_idx], max_elev)
+        self.max_note.set_text(f'Max: {max_elev:.1f}m')
+        self.title.set_text(f"Profilo Topografico {job['name']}")
+        _xlim(self.ax, dist)
+        _ylim(self.ax, min_elev, max_elev)
+
+
+TEMPLATES = {
+    'section': SectionTemplate,
+    'swath': SwathTemplate,
+    'topographic': TopographicTemplate,
+}
+
+# Bump when a template changes look, so existing images are rendered again
+TEMPLATE_VERSION = 1
+
+ARRAY_KEYS = ('distances', 'elevations', 'min', 'max')
+
+
+def _normalized(job):
+    job = dict(job)
+    for key in ARRAY_KEYS:
+        if job.get(key) is not None:
+            job[key] = np.asarray(job[key], dtype=np.float64)
+    return job
+
+
+def _update_digest(digest, job):
+    job = _normalized(job)
+    settings = {key: value for key, value in job.items()
+                if key not in ARRAY_KEYS and key not in ('path', 'profiles')}
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    for key in ARRAY_KEYS:
+        if job.get(key) is not None:
+            digest.update(key.encode('ascii'))
+            digest.update(np.ascontiguousarray(job[key]).tobytes())
+    for profile in job.get('profiles') or ():
+        _update_digest(digest, profile)
+
+
+def job_digest(job):
+    """SHA-1 of everything that shows in the image of job (profile or sheet)"""
+    digest = hashlib.sha1()
+    digest.update(f"template {TEMPLATE_VERSION}".encode('ascii'))
+    _update_digest(digest, job)
+    return digest.hexdigest()
+
+
+def digest_path(path):
+    """Sidecar file holding the digest of the image at path"""
+    return path + '.sha1'
+
+
+def image_is_current(job):
+    """True if job['path'] exists and was rendered from the same data and settings"""
+    path = job['path']
+    try:
+        with open(digest_path(path), encoding='ascii') as f:
+            stored = f.read().strip()
+    except OSError:
+        return False
+    return os.path.exists(path) and stored == job_digest(job)
+
+
+def _write_digest(job):
+    with open(digest_path(job['path']), 'w', encoding='ascii') as f:
+        f.write(job_digest(job))
+
+# Templates of this process (one per style, built on first use)
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def render_profile(job, reuse=True):
+    """Render one profile chart to job['path'] and return (name, path)
+
+    job is a plain dict (picklable): name, path, style, distances,
+    elevations, optional min/max (swath), crossings and dpi. With reuse
+    (the default) the process-wide template of the style is used; pass
+    False to build a fresh figure (benchmark baseline). The digest of the
+    job is written next to the image (see image_is_current).
+    """
+    style = job.get('style', 'section')
+    job = _normalized(job)
+
+    if not reuse:
+        TEMPLATES[style]().render(job)
+    else:
+        # The pool may fall back to rendering in QGIS from more than one thread
+        with _templates_lock:
+            template = _templates.get(style)
+            if template is None:
+                template = _templates[style] = TEMPLATES[style]()
+            template.render(job)
+    _write_digest(job)
+    return job['name'], job['path']
+
+
+# Combined sheets: profiles per page as small multiples (rows x columns)
+SHEET_GRID = (3, 2)
+SHEET_SIZE = (11.69, 8.27)  # A4 landscape, inches
+OVERLAY_PER_PAGE = 10  # matches the colour cycle
+
+
+def sheet_jobs(profiles, paths, mode='grid', title='Profiles', dpi=150):
+    """Split profiles into page jobs for render_sheet
+
+    profiles is a list of dicts with name, distances and elevations;
+    paths(page) gives the image path of a page (1-based). All pages share
+    the elevation axis (and the distance axis in overlay mode) so they can
+    be compared side by side.
+    """
+    profiles = [_normalized(p) for p in profiles if len(p['elevations'])]
+    if not profiles:
+        return []
+    low = min(float(np.nanmin(p['elevations'])) for p in profiles)
+    high = max(float(np.nanmax(p['elevations'])) for p in profiles)
+    length = max(float(p['distances'][-1]) for p in profiles)
+    per_page = SHEET_GRID[0] * SHEET_GRID[1] if mode == 'grid' else OVERLAY_PER_PAGE
+    pages = (len(profiles) + per_page - 1) // per_page
+
+    jobs = []
+    for page in range(pages):
+        jobs.append({'kind': 'sheet', 'name': f"{title} {page + 1}/{pages}", 'path': paths(page + 1),
+                     'mode': mode, 'dpi': dpi, 'ylim': (low, high), 'length': length,
+                     'profiles': [{'name': str(p['name']), 'distances': p['distances'],
+                                   'elevations': p['elevations']}
+                                  for p in profiles[page * per_page:(page + 1) * per_page]]})
+    return jobs
+
+
+def render_sheet(job):
+    """Render one page of profiles in a single figure and return (name, path)"""
+    job = dict(job, profiles=[_normalized(p) for p in job['profiles']])
+    low, high = job['ylim']
+    fig = Figure(figsize=SHEET_SIZE)
+    FigureCanvasAgg(fig)
+    if job.get('mode', 'grid') == 'grid':
+        rows, cols = SHEET_GRID
+        axes = fig.subplots(rows, cols, sharey=True, squeeze=False).ravel()
+        fig.subplots_adjust(left=0.07, right=0.98, bottom=0.07, top=0.91, hspace=0.45, wspace=0.06)
+        for ax, profile in zip(axes, job['profiles']):
+            dist, elev = profile['distances'], profile['elevations']
+            ax.plot(dist, elev, 'b-', linewidth=1)
+            ax.fill_between(dist, low, elev, color='tab:blue', alpha=0.3)
+            ax.set_title(f"Section {profile['name']}", fontsize=9)
+            ax.tick_params(labelsize=7)
+            ax.grid(True, alpha=0.3)
+            _xlim(ax, dist)
+        used = len(job['profiles'])
+        for ax in axes[used:]:
+            ax.set_visible(False)
+        for ax in axes[:used:cols]:
+            ax.set_ylabel('Elevation (m)', fontsize=8)
+        # Distance label under the lowest chart of each column
+        for ax in axes[max(0, used - cols):used]:
+            ax.set_xlabel('Distance (m)', fontsize=8)
+        _ylim(axes[0], low, high)
+    else:
+        ax = fig.add_subplot(111)
+        fig.subplots_adjust(left=0.07, right=0.98, bottom=0.08, top=0.91)
+        for profile in job['profiles']:
+            ax.plot(profile['distances'], profile['elevations'], linewidth=1.2, label=str(profile['name']))
+        ax.set_xlabel('Distance (m)')
+        ax.set_ylabel('Elevation (m)')
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best', fontsize=8, ncol=2)
+        _xlim(ax, np.array([0.0, job['length']]))
+        _ylim(ax, low, high)
+    fig.suptitle(job['name'], fontsize=12, fontweight='bold')
+    fig.savefig(job['path'], dpi=job.get('dpi', 150))
+    _write_digest(job)
+    return job['name'], job['path']
+
+
+def render_job(job):
+    """Entry point of the render workers: profile chart or combined sheet"""
+    if job.get('kind') == 'sheet':
+        return render_sheet(job)
+    return render_profile(job)
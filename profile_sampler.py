@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_sampler.py
+# Raster sampling helpers shared by the section/profile tools.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from qgis.core import Qgis, QgsRectangle, QgsMessageLog
+
+# Size (pixels) of the square blocks kept by the shared cache
+BLOCK_SIZE = 256
+# Default memory budget of the shared cache
+DEFAULT_CACHE_MB = 256
+
+# numpy dtype for each raster data type we can decode
+_DTYPE_NAMES = (
+    ('Byte', np.uint8), ('Int8', np.int8),
+    ('UInt16', np.uint16), ('Int16', np.int16),
+    ('UInt32', np.uint32), ('Int32', np.int32),
+    ('Float32', np.float32), ('Float64', np.float64),
+)
+_DTYPES = None
+
+
+def _numpy_dtype(data_type):
+    """Return the numpy dtype matching a Qgis.DataType, or None"""
+    global _DTYPES
+    if _DTYPES is None:
+        enum = getattr(Qgis, 'DataType', Qgis)
+        _DTYPES = {}
+        for name, dtype in _DTYPE_NAMES:
+            value = getattr(enum, name, None)
+            if value is not None:
+                _DTYPES[value] = dtype
+    return _DTYPES.get(data_type)
+
+
+def block_to_array(block, width, height):
+    """Decode a QgsRasterBlock into a float32 array with NaN for no-data"""
+    dtype = _numpy_dtype(block.dataType())
+    if dtype is None or block.isEmpty():
+        return np.full((height, width), np.nan, dtype=np.float32)
+    values = np.frombuffer(bytes(block.data()), dtype=dtype, count=width * height)
+    values = values.reshape(height, width).astype(np.float32)
+    if block.hasNoDataValue():
+        values[values == np.float32(block.noDataValue())] = np.nan
+    return values
+
+
+class RasterWindow:
+    """A decoded rectangle of raster values with its georeferencing"""
+
+    def __init__(self, values, extent):
+        self.values = values
+        self.extent = extent
+        rows, cols = values.shape
+        self.pixel_width = extent.width() / cols if cols else 0.0
+        self.pixel_height = extent.height() / rows if rows else 0.0
+
+    def sample(self, xs, ys):
+        """Nearest-pixel values at the given map coordinates (NaN outside)"""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        out = np.full(xs.shape, np.nan, dtype=np.float32)
+        if not self.values.size:
+            return out
+        cols = np.floor((xs - self.extent.xMinimum()) / self.pixel_width).astype(np.int64)
+        rows = np.floor((self.extent.yMaximum() - ys) / self.pixel_height).astype(np.int64)
+        inside = ((cols >= 0) & (cols < self.values.shape[1]) &
+                  (rows >= 0) & (rows < self.values.shape[0]))
+        out[inside] = self.values[rows[inside], cols[inside]]
+        return out
+
+
+class _PixelGrid:
+    """Pixel grid of a raster provider at an overview level
+
+    Level 0 is the native resolution; level n has pixels 2**n times larger.
+    """
+
+    def __init__(self, provider, level=0):
+        self.extent = provider.extent()
+        self.level = level
+        native_cols, native_rows = provider.xSize(), provider.ySize()
+        self.valid = native_cols > 0 and native_rows > 0
+        factor = 2 ** level
+        self.cols = -(-native_cols // factor)
+        self.rows = -(-native_rows // factor)
+        self.px = self.extent.width() / native_cols * factor if self.valid else 0.0
+        self.py = self.extent.height() / native_rows * factor if self.valid else 0.0
+        self.blocks_x = -(-self.cols // BLOCK_SIZE)
+
+    def cell(self, xs, ys):
+        cols = np.floor((xs - self.extent.xMinimum()) / self.px).astype(np.int64)
+        rows = np.floor((self.extent.yMaximum() - ys) / self.py).astype(np.int64)
+        return cols, rows
+
+    def rect(self, col0, row0, col1, row1):
+        """Map rectangle of the pixel range [col0, col1) x [row0, row1)"""
+        xmin, ymax = self.extent.xMinimum(), self.extent.yMaximum()
+        return QgsRectangle(xmin + col0 * self.px, ymax - row1 * self.py,
+                            xmin + col1 * self.px, ymax - row0 * self.py)
+
+
+def _source_key(provider):
+    return provider.dataSourceUri()
+
+
+class RasterBlockCache:
+    """Process-wide LRU cache of decoded raster blocks
+
+    Blocks are BLOCK_SIZE x BLOCK_SIZE float32 arrays keyed by
+    (layer source, band, overview level, block row, block column). Every
+    sampling path of the plugin reads through the shared instance, so
+    profiles drawn again in the same area are served from memory. Blocks
+    above level 0 are requested from the provider at reduced size, which
+    lets GDAL read them from the raster overviews.
+    """
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls(DEFAULT_CACHE_MB * 1024 * 1024)
+        return cls._instance
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._blocks:
+            _, values = self._blocks.popitem(last=False)
+            self.bytes -= values.nbytes
+            self.evictions += 1
+
+    def _block(self, provider, grid, band, block_row, block_col):
+        key = (_source_key(provider), band, grid.level, block_row, block_col)
+        with self._lock:
+            values = self._blocks.get(key)
+            if values is not None:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+                return values
+            self.misses += 1
+
+        col0, row0 = block_col * BLOCK_SIZE, block_row * BLOCK_SIZE
+        col1 = min(grid.cols, col0 + BLOCK_SIZE)
+        row1 = min(grid.rows, row0 + BLOCK_SIZE)
+        width, height = col1 - col0, row1 - row0
+        block = provider.block(band, grid.rect(col0, row0, col1, row1), width, height)
+        values = block_to_array(block, width, height)
+
+        with self._lock:
+            if key not in self._blocks:
+                self._blocks[key] = values
+                self.bytes += values.nbytes
+                self._evict()
+        return values
+
+    def sample(self, provider, xs, ys, band=1, level=0):
+        """Nearest-pixel values at map coordinates in the raster CRS"""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        out = np.full(xs.shape, np.nan, dtype=np.float32)
+        grid = _PixelGrid(provider, level)
+        if not grid.valid or not xs.size:
+            return out
+        cols, rows = grid.cell(xs.ravel(), ys.ravel())
+        flat = out.ravel()
+        idx = np.nonzero((cols >= 0) & (cols < grid.cols) & (rows >= 0) & (rows < grid.rows))[0]
+        if not idx.size:
+            return out
+
+        # Group the points by block so each block is fetched once
+        keys = (rows[idx] // BLOCK_SIZE) * grid.blocks_x + cols[idx] // BLOCK_SIZE
+        order = np.argsort(keys, kind='stable')
+        idx, keys = idx[order], keys[order]
+        unique, starts = np.unique(keys, return_index=True)
+        for key, chunk in zip(unique, np.split(idx, starts[1:])):
+            block_row, block_col = divmod(int(key), grid.blocks_x)
+            values = self._block(provider, grid, band, block_row, block_col)
+            flat[chunk] = values[rows[chunk] - block_row * BLOCK_SIZE,
+                                 cols[chunk] - block_col * BLOCK_SIZE]
+        return flat.reshape(xs.shape)
+
+    def window(self, provider, extent, band=1, level=0):
+        """Assemble the window covering extent at an overview level from cached blocks"""
+        grid = _PixelGrid(provider, level)
+        if not grid.valid:
+            return None
+
+        # Snap the request to the pixel grid so samples hit pixel centres exactly
+        full = grid.extent
+        col0 = max(0, int(np.floor((extent.xMinimum() - full.xMinimum()) / grid.px)))
+        col1 = min(grid.cols, int(np.ceil((extent.xMaximum() - full.xMinimum()) / grid.px)))
+        row0 = max(0, int(np.floor((full.yMaximum() - extent.yMaximum()) / grid.py)))
+        row1 = min(grid.rows, int(np.ceil((full.yMaximum() - extent.yMinimum()) / grid.py)))
+        if col1 <= col0 or row1 <= row0:
+            return None
+
+        values = np.empty((row1 - row0, col1 - col0), dtype=np.float32)
+        for block_row in range(row0 // BLOCK_SIZE, (row1 - 1) // BLOCK_SIZE + 1):
+            for block_col in range(col0 // BLOCK_SIZE, (col1 - 1) // BLOCK_SIZE + 1):
+                block = self._block(provider, grid, band, block_row, block_col)
+                top, left = block_row * BLOCK_SIZE, block_col * BLOCK_SIZE
+                r0, r1 = max(row0, top), min(row1, top + block.shape[0])
+                c0, c1 = max(col0, left), min(col1, left + block.shape[1])
+                values[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = block[r0 - top:r1 - top, c0 - left:c1 - left]
+        return RasterWindow(values, grid.rect(col0, row0, col1, row1))
+
+    def invalidate(self, path=None):
+        """Drop the blocks of one raster file (e.g. after overwriting it), or all blocks"""
+        with self._lock:
+            if path is None:
+                self._blocks.clear()
+                self.bytes = 0
+                return
+            path = os.path.normcase(os.path.abspath(path))
+            for key in [k for k in self._blocks
+                        if os.path.normcase(os.path.abspath(k[0].split('|')[0])) == path]:
+                self.bytes -= self._blocks.pop(key).nbytes
+
+    def stats(self):
+        """Hit-rate and memory counters for instrumentation"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'blocks': len(self._blocks),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def log_stats(self):
+        s = self.stats()
+        QgsMessageLog.logMessage(
+            f"Raster block cache: {s['blocks']} blocks, {s['bytes'] / 1048576:.1f}/"
+            f"{s['max_bytes'] / 1048576:.0f} MB, hit rate {s['hit_rate']:.0%} "
+            f"({s['hits']} hits, {s['misses']} misses, {s['evictions']} evictions)",
+            "ClipRasterLayout", Qgis.Info)
+
+
+def native_pixel_size(provider):
+    """Smallest native pixel dimension, in raster CRS units"""
+    extent = provider.extent()
+    if provider.xSize() <= 0 or provider.ySize() <= 0:
+        return 0.0
+    return min(extent.width() / provider.xSize(), extent.height() / provider.ySize())
+
+
+_overview_hint_logged = set()
+
+
+def overview_level(provider, spacing):
+    """Coarsest power-of-two level whose pixels are no larger than spacing
+
+    spacing is the distance between samples in raster CRS units. Sampling a
+    long section at the level matching its spacing reads a fraction of the
+    data the native resolution would need.
+    """
+    native = native_pixel_size(provider)
+    if native <= 0 or spacing < 2 * native:
+        return 0
+    level = int(np.floor(np.log2(spacing / native)))
+    level = min(level, int(np.log2(max(provider.xSize(), provider.ySize()))))
+
+    source = _source_key(provider)
+    has_pyramids = getattr(provider, 'hasPyramids', None)
+    if level > 0 and has_pyramids and not has_pyramids() and source not in _overview_hint_logged:
+        _overview_hint_logged.add(source)
+        QgsMessageLog.logMessage(
+            f"{source} has no overviews: long profiles read the full-resolution data. "
+            f"Build overviews (Raster > Miscellaneous > Build Overviews) to speed them up.",
+            "ClipRasterLayout", Qgis.Info)
+    return level
+
+
+def sample_points(provider, xs, ys, band=1, level=0):
+    """Sample the raster at map coordinates through the shared block cache"""
+    return RasterBlockCache.instance().sample(provider, xs, ys, band, level)
+
+
+def read_window(provider, extent, band=1, level=0):
+    """Read the part of the raster covering extent (native resolution by default)"""
+    return RasterBlockCache.instance().window(provider, extent, band, level)
+
+
+def line_parts(geometry):
+    """Vertices of each part of a (multi)line geometry as (N, 2) arrays
+
+    Parts with fewer than two vertices are left out. The parts are kept
+    apart: joining them would add a segment across each gap.
+    """
+    lines = geometry.asMultiPolyline() if geometry.isMultipart() else [geometry.asPolyline()]
+    parts = [np.array([(p.x(), p.y()) for p in line], dtype=np.float64).reshape(-1, 2) for line in lines]
+    return [part for part in parts if len(part) > 1]
+
+
+def stations_along(vertices, distances):
+    """Positions and unit normals at the given distances along a polyline
+
+    Returns (xs, ys, nx, ny); the normal points to the left of the direction
+    of travel.
+    """
+    seg = np.diff(vertices, axis=0)
+    seg_len = np.hypot(seg[:, 0], seg[:, 1])
+    keep = seg_len > 0
+    seg, seg_len = seg[keep], seg_len[keep]
+    starts = vertices[:-1][keep]
+    if not len(seg):
+        zeros = np.zeros(len(distances))
+        return zeros + vertices[0, 0], zeros + vertices[0, 1], zeros, zeros
+
+    cum = np.concatenate(([0.0], np.cumsum(seg_len)))
+    distances = np.clip(distances, 0.0, cum[-1])
+    idx = np.clip(np.searchsorted(cum, distances, side='right') - 1, 0, len(seg) - 1)
+    t = (distances - cum[idx]) / seg_len[idx]
+    ux = seg[idx, 0] / seg_len[idx]
+    uy = seg[idx, 1] / seg_len[idx]
+    xs = starts[idx, 0] + t * seg[idx, 0]
+    ys = starts[idx, 1] + t * seg[idx, 1]
+    return xs, ys, -uy, ux
+
+
+def stations_along_parts(parts, distances):
+    """stations_along() over the parts of a multiline (line_parts)
+
+    Distances run along the parts one after the other, gaps excluded (as
+    QgsDistanceArea measures multilines); each station lies on its part.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    if len(parts) == 1:
+        return stations_along(parts[0], distances)
+    xs, ys, nx, ny = (np.zeros(len(distances)) for _ in range(4))
+    ends = np.cumsum([polyline_length(part) for part in parts])
+    # Station i belongs to the first part ending at or after it
+    which = np.minimum(np.searchsorted(ends, distances, side='left'), len(parts) - 1)
+    for i, part in enumerate(parts):
+        mask = which == i
+        if mask.any():
+            start = ends[i - 1] if i else 0.0
+            xs[mask], ys[mask], nx[mask], ny[mask] = stations_along(part, distances[mask] - start)
+    return xs, ys, nx, ny
+
+
+def polyline_length(vertices):
+    return float(np.hypot(*np.diff(vertices, axis=0).T).sum()) if len(vertices) > 1 else 0.0
+
+
+def parts_length(parts):
+    return sum(polyline_length(part) for part in parts)
+
+
+def perpendicular_transects(vertices, spacing, half_width):
+    """Cross-sections every spacing units along a centerline
+
+    Returns (distances, starts, ends) with starts/ends as (N, 2) arrays; each
+    transect runs from the left to the right of the direction of travel.
+    """
+    length = polyline_length(vertices)
+    if length <= 0 or spacing <= 0:
+        empty = np.empty((0, 2))
+        return np.empty(0), empty, empty
+    # Small tolerance so a length that is a multiple of spacing keeps its last station
+    distances = np.arange(0.0, length + spacing * 1e-9, spacing)
+    xs, ys, nx, ny = stations_along(vertices, distances)
+    offset_x, offset_y = nx * half_width, ny * half_width
+    starts = np.column_stack((xs + offset_x, ys + offset_y))
+    ends = np.column_stack((xs - offset_x, ys - offset_y))
+    return distances, starts, ends
+
+
+def sample_line(provider, geometry, n_samples, band=1, level=None):
+    """Sample n_samples + 1 evenly spaced stations along a line in the raster CRS
+
+    Returns (distances, values) with distances in raster CRS units and NaN
+    where there is no data. level defaults to the overview level matching
+    the sample spacing; pass 0 for full resolution.
+    """
+    parts = line_parts(geometry)
+    distances = np.linspace(0.0, parts_length(parts), n_samples + 1)
+    if not parts:
+        return distances, np.full(distances.shape, np.nan, dtype=np.float32)
+    if level is None:
+        level = overview_level(provider, distances[-1] / max(n_samples, 1))
+    xs, ys, _, _ = stations_along_parts(parts, distances)
+    return distances, sample_points(provider, xs, ys, band, level)
+
+
+def swath_profile(provider, geometry, half_width, n_stations, n_across=None, band=1, level=None):
+    """Min/mean/max statistics over a corridor around a section line
+
+    geometry must be in the raster CRS and half_width in the same units.
+    The corridor window is read once (at the overview level matching the
+    station spacing unless level is given); all stations are then sampled
+    and aggregated with numpy. Returns None if the line does not touch the
+    raster.
+    """
+    parts = line_parts(geometry)
+    if not parts or half_width <= 0:
+        return None
+    length = parts_length(parts)
+    if length <= 0:
+        return None
+
+    if level is None:
+        level = overview_level(provider, min(length / max(n_stations, 1), half_width))
+    bbox = geometry.boundingBox()
+    window = read_window(provider, bbox.buffered(half_width), band, level)
+    if window is None:
+        return None
+
+    if n_across is None:
+        pixel = max(window.pixel_width, window.pixel_height) or half_width
+        n_across = int(min(101, max(3, round(2 * half_width / pixel) + 1)))
+    distances = np.linspace(0.0, length, n_stations + 1)
+    offsets = np.linspace(-half_width, half_width, n_across)
+
+    xs, ys, nx, ny = stations_along_parts(parts, distances)
+    grid_x = xs[:, None] + offsets[None, :] * nx[:, None]
+    grid_y = ys[:, None] + offsets[None, :] * ny[:, None]
+    values = window.sample(grid_x, grid_y)
+
+    with warnings.catch_warnings():
+        # All-NaN stations (outside the raster) simply stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {
+            'distance': distances,
+            'min': np.nanmin(values, axis=1),
+            'mean': np.nanmean(values, axis=1),
+            'max': np.nanmax(values, axis=1),
+            'center': values[:, n_across // 2],
+        }
+
+
+def fill_gaps(values, invalid=None):
+    """Carry the last valid value forward over gaps (leading gaps become 0)
+
+    invalid is an optional boolean mask of extra values to treat as gaps.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    bad = np.isnan(values)
+    if invalid is not None:
+        bad |= invalid
+    if not bad.any():
+        return values, len(values)
+    idx = np.where(~bad, np.arange(len(values)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    filled = values[idx]
+    filled[np.cumsum(~bad) == 0] = 0.0
+    return filled, int((~bad).sum())
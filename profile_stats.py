@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_stats.py
+# Per-profile statistics stored as fields of the sections layers.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+import numpy as np
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import QgsField
+
+# Fields written to the "Profili DEM"/Sections layers (names fit shapefiles)
+STATS_FIELDS = (
+    'length_3d',   # 3D length along the profile (m)
+    'elev_min',    # minimum elevation (m)
+    'elev_max',    # maximum elevation (m)
+    'elev_mean',   # mean elevation (m)
+    'ascent',      # cumulative ascent (m)
+    'descent',     # cumulative descent (m)
+    'max_slope',   # steepest slope between samples (degrees)
+    'roughness',   # std. deviation of elevations around the linear trend (m)
+)
+
+
+def profile_stats(distances, elevations):
+    """Compute all profile statistics in one vectorized pass
+
+    NaN elevations are ignored. Returns a dict keyed by STATS_FIELDS, or
+    None if fewer than two valid samples remain.
+    """
+    d = np.asarray(distances, dtype=np.float64)
+    z = np.asarray(elevations, dtype=np.float64)
+    valid = ~np.isnan(z)
+    d, z = d[valid], z[valid]
+    if len(z) < 2:
+        return None
+
+    dx = np.diff(d)
+    dz = np.diff(z)
+    step = dx > 0
+    slopes = np.abs(dz[step] / dx[step])
+
+    # Roughness: residuals from the straight-line trend of the profile
+    if np.ptp(d) > 0:
+        trend = np.polyval(np.polyfit(d, z, 1), d)
+    else:
+        trend = np.full(z.shape, z.mean())
+
+    return {
+        'length_3d': float(np.hypot(dx, dz).sum()),
+        'elev_min': float(z.min()),
+        'elev_max': float(z.max()),
+        'elev_mean': float(z.mean()),
+        'ascent': float(dz[dz > 0].sum()),
+        'descent': float(-dz[dz < 0].sum()),
+        'max_slope': float(np.degrees(np.arctan(slopes.max()))) if slopes.size else 0.0,
+        'roughness': float(np.std(z - trend)),
+    }
+
+
+def stats_fields():
+    """QgsField definitions for the statistics"""
+    return [QgsField(name, QVariant.Double) for name in STATS_FIELDS]
+
+
+def ensure_stats_fields(layer):
+    """Add the statistics fields missing from layer"""
+    names = layer.fields().names()
+    missing = [field for field in stats_fields() if field.name() not in names]
+    if missing:
+        layer.dataProvider().addAttributes(missing)
+        layer.updateFields()
+
+
+def stats_attribute_map(layer, stats):
+    """{field index: value} for the statistics fields present on layer"""
+    fields = layer.fields()
+    values = {}
+    for name in STATS_FIELDS:
+        idx = fields.indexOf(name)
+        if idx >= 0:
+            values[idx] = stats[name]
+    return values
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_store.py
+# Compact on-disk storage of sampled profiles (NPZ archive, CSV, GeoPackage).
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+import csv
+import json
+import os
+import zipfile
+
+import numpy as np
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (QgsVectorFileWriter, QgsFields, QgsField, QgsFeature,
+                       QgsGeometry, QgsLineString, QgsWkbTypes, QgsProject,
+                       QgsCoordinateReferenceSystem, QgsCoordinateTransform)
+
+from .profile_sampler import line_parts, parts_length, stations_along_parts
+from .profile_stats import STATS_FIELDS
+
+ARCHIVE_VERSION = 1
+_RUN_KEY = '__run__'
+
+
+def _json_array(data):
+    return np.frombuffer(json.dumps(data).encode('utf-8'), dtype=np.uint8)
+
+
+def _from_json_array(array):
+    return json.loads(array.tobytes().decode('utf-8'))
+
+
+class ProfileArchive:
+    """Columnar NPZ archive of sampled profiles
+
+    Each profile is stored as float32 arrays (<key>_distance,
+    <key>_elevation and, for swath profiles, <key>_min/<key>_max) plus a
+    small JSON entry (<key>_meta) with its label, statistics, section
+    geometry, section length (in the units of the distances) and image
+    path. Run metadata (raster, sampling options) is
+    stored once under __run__. Profiles are appended one at a time, so a
+    run never holds more than one profile in memory. The zip file stays
+    open until close(), which writes its directory: only then is the file
+    readable with numpy.load. Appending after close() reopens it.
+    """
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.count = 0
+        self._zip = None
+        if os.path.exists(path):
+            with zipfile.ZipFile(path) as zf:
+                self.count = sum(1 for n in zf.namelist() if n.endswith('_meta.npy'))
+        else:
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+            run = dict(metadata or {}, version=ARCHIVE_VERSION)
+            self._write_array(self._zip, _RUN_KEY, _json_array(run))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _write_array(zf, key, array):
+        with zf.open(f"{key}.npy", 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+
+    def append(self, record):
+        """Append one profile record (dict with name, distances, elevations, ...)"""
+        key = f"p{self.count:05d}"
+        meta = {
+            'name': record['name'],
+            'stats': record.get('stats'),
+            'image_path': record.get('image_path'),
+            'wkt': record.get('wkt'),
+            'crs': record.get('crs'),
+            'length': record.get('length'),
+        }
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self.path, 'a', zipfile.ZIP_DEFLATED)
+        zf = self._zip
+        self._write_array(zf, f"{key}_distance", np.asarray(record['distances'], dtype=np.float32))
+        self._write_array(zf, f"{key}_elevation", np.asarray(record['elevations'], dtype=np.float32))
+        for band in ('min', 'max'):
+            if record.get(band) is not None:
+                self._write_array(zf, f"{key}_{band}", np.asarray(record[band], dtype=np.float32))
+        self._write_array(zf, f"{key}_meta", _json_array(meta))
+        self.count += 1
+
+    def close(self):
+        """Write the zip directory and close the file"""
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+
+def read_archive_metadata(path):
+    """Run metadata (raster, sampling options) of an NPZ archive"""
+    with np.load(path, allow_pickle=False) as npz:
+        return _from_json_array(npz[_RUN_KEY]) if _RUN_KEY in npz.files else {}
+
+
+def read_archive(path):
+    """Yield the profile records of an NPZ archive one at a time"""
+    with np.load(path, allow_pickle=False) as npz:
+        # p00000, p00001, ... p100000: order by index, not as strings
+        keys = sorted((k[:-len('_meta')] for k in npz.files if k.endswith('_meta')), key=lambda k: int(k[1:]))
+        for key in keys:
+            record = _from_json_array(npz[f"{key}_meta"])
+            record['distances'] = npz[f"{key}_distance"]
+            record['elevations'] = npz[f"{key}_elevation"]
+            for band in ('min', 'max'):
+                if f"{key}_{band}" in npz.files:
+                    record[band] = npz[f"{key}_{band}"]
+            yield record
+
+
+def export_csv(path, records):
+    """Write one row per station (label, distance, elevation), streaming"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['label', 'distance', 'elevation'])
+        for record in records:
+            label = record['name']
+            writer.writerows((label, f"{d:.3f}", '' if np.isnan(z) else f"{z:.3f}")
+                             for d, z in zip(record['distances'], record['elevations']))
+
+
+def export_geopackage(path, records, crs=None):
+    """Write one LineStringZM per profile: Z is the elevation, M the distance
+
+    Records need the section geometry ('wkt'); records without it are
+    skipped. Returns the number of features written.
+    """
+    fields = QgsFields()
+    fields.append(QgsField('label', QVariant.String))
+    for name in STATS_FIELDS:
+        fields.append(QgsField(name, QVariant.Double))
+
+    crs = crs or QgsProject.instance().crs()
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.layerName = 'profiles'
+    writer = QgsVectorFileWriter.create(path, fields, QgsWkbTypes.LineStringZM, crs,
+                                        QgsProject.instance().transformContext(), options)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise IOError(writer.errorMessage())
+
+    written = 0
+    for record in records:
+        if not record.get('wkt'):
+            continue
+        geom = QgsGeometry.fromWkt(record['wkt'])
+        if record.get('crs'):
+            record_crs = QgsCoordinateReferenceSystem(record['crs'])
+            if record_crs.isValid() and record_crs != crs:
+                geom.transform(QgsCoordinateTransform(record_crs, crs, QgsProject.instance()))
+        distances = np.asarray(record['distances'], dtype=np.float64)
+        elevations = np.asarray(record['elevations'], dtype=np.float64)
+        parts = line_parts(geom)
+        # Section length in the units of the distances; the last sample need
+        # not sit at the end of the line (archives without it: last distance)
+        length = record.get('length') or (distances[-1] if len(distances) else 0)
+        if not parts or not len(distances) or length <= 0:
+            continue
+
+        # Place the stations proportionally on the line
+        scale = parts_length(parts) / length
+        xs, ys, _, _ = stations_along_parts(parts, distances * scale)
+        feature = QgsFeature(fields)
+        feature.setGeometry(QgsGeometry(QgsLineString(xs.tolist(), ys.tolist(),
+                                                      np.nan_to_num(elevations).tolist(),
+                                                      distances.tolist())))
+        feature.setAttribute('label', record['name'])
+        for name, value in (record.get('stats') or {}).items():
+            if name in STATS_FIELDS:
+                feature.setAttribute(name, value)
+        writer.addFeature(feature)
+        written += 1
+    del writer  # flush and close the file
+    return written
+
+
+def export_profiles(path, records, crs=None, metadata=None):
+    """Export records to NPZ, CSV or GeoPackage depending on the file extension
+
+    metadata is the run metadata stored in an NPZ archive.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        export_csv(path, records)
+    elif ext == '.gpkg':
+        export_geopackage(path, records, crs)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        with ProfileArchive(path, metadata) as archive:
+            for record in records:
+                archive.append(record)
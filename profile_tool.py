@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
-from qgis.PyQt.QtCore import Qt, QPointF, pyqtSignal, QVariant, QSizeF
-from qgis.PyQt.QtGui import QColor, QPen, QFont, QPolygonF, QTextDocument
-from qgis.PyQt.QtWidgets import QDialog, QVBoxLayout, QLabel, QComboBox, QPushButton, QFileDialog, QLineEdit, QHBoxLayout, QMessageBox, QDockWidget, QWidget, QAction, QTabWidget
+from qgis.PyQt.QtCore import (Qt, QPointF, pyqtSignal, QVariant, QSizeF, QSize, QTimer,
+                              QAbstractListModel, QModelIndex, QSortFilterProxyModel)
+from qgis.PyQt.QtGui import QColor, QPen, QFont, QPolygonF, QTextDocument, QPixmap, QPainter
+from qgis.PyQt.QtWidgets import QDialog, QVBoxLayout, QLabel, QComboBox, QPushButton, QFileDialog, QLineEdit, QHBoxLayout, QMessageBox, QDockWidget, QWidget, QAction, QCheckBox, QListView, QSplitter
 from qgis.core import (QgsPointXY, QgsGeometry, QgsFeature,
                       QgsVectorLayer, QgsProject, QgsWkbTypes, QgsField,
-                      QgsFields, QgsCoordinateTransform, QgsRasterLayer,
-                      QgsLineString, QgsPoint, QgsRaster, QgsRasterIdentifyResult,
+                      QgsFields, QgsCoordinateTransform, QgsCoordinateReferenceSystem,
+                      QgsLineString, QgsPoint, QgsRasterIdentifyResult,
                       QgsSymbol, QgsSimpleLineSymbolLayer, QgsMarkerSymbol,
-                      QgsSimpleMarkerSymbolLayer, QgsTextAnnotation, QgsMessageLog, Qgis)
+                      QgsSimpleMarkerSymbolLayer, QgsTextAnnotation, QgsMessageLog, Qgis,
+                      QgsDistanceArea, QgsUnitTypes)
 
 # Try to import elevation profile tools (QGIS 3.26+)
 try:
@@ -19,9 +21,41 @@ except ImportError:
 from qgis.gui import QgsMapToolEmitPoint, QgsRubberBand, QgsMapCanvas, QgsMapTool, QgsMapCanvasAnnotationItem
 import numpy as np
 import math
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import string
+import os
+import tempfile
+from collections import deque
+from datetime import datetime
+
+from .profile_sampler import RasterBlockCache, sample_points, overview_level
+from .profile_stats import STATS_FIELDS, profile_stats, stats_attribute_map
+from .profile_store import ProfileArchive, read_archive, read_archive_metadata, export_profiles
+from .profile_render_pool import ProfileRenderPool, profile_image_path
+from .profile_decimate import decimate_figure_lines
+from .profile_view import ProfileView
+from .layer_registry import LayerRegistry, ROLE_PROFILES, ROLE_DEM
+
+# Qt5/Qt6 compatibility (profile browser and thumbnails)
+if hasattr(Qt, 'ItemDataRole'):
+    Qt_DisplayRole = Qt.ItemDataRole.DisplayRole
+    Qt_DecorationRole = Qt.ItemDataRole.DecorationRole
+    Qt_ToolTipRole = Qt.ItemDataRole.ToolTipRole
+    Qt_CaseInsensitive = Qt.CaseSensitivity.CaseInsensitive
+    QPainter_Antialiasing = QPainter.RenderHint.Antialiasing
+else:
+    Qt_DisplayRole = Qt.DisplayRole
+    Qt_DecorationRole = Qt.DecorationRole
+    Qt_ToolTipRole = Qt.ToolTipRole
+    Qt_CaseInsensitive = Qt.CaseInsensitive
+    QPainter_Antialiasing = QPainter.Antialiasing
+
+# Live preview: minimum interval between redraws and number of samples
+PREVIEW_INTERVAL_MS = 30
+PREVIEW_SAMPLES = 200
+
+# Profile browser: thumbnail size and thumbnails drawn per idle timer tick
+THUMBNAIL_SIZE = (96, 36)
+THUMBNAIL_BATCH = 8
 
 class ProfileTool(QgsMapTool):
     def __init__(self, iface):
@@ -34,13 +68,29 @@ class ProfileTool(QgsMapTool):
         self.profile_count = 0
         self.profiles = []
         self.dem_layer = None
+        self.full_resolution = False  # Sample native pixels instead of overviews
         self.profile_layer = None
         self.labels = []
         self.current_feature_id = None
+        self.feature_ids = {}  # profile id -> feature id on profile_layer
+        self.pending_updates = {}  # feature id -> {field index: value}
         self.elevation_profiles = []  # Store QGIS elevation profile widgets
         self.profile_dock = None  # Single dock widget for all profiles
         self.profile_features_to_process = []  # For sequential processing
         self.current_profile_index = 0
+        self.archive = None  # NPZ archive of the profiles sampled in this session
+        self.rendering = {}  # image path -> profile name, queued on the render workers
+        self.render_pool_connected = False
+        
+        # Live preview while drawing: samples come from the shared in-memory
+        # block cache, mouse moves coalesced into one redraw per interval
+        self.preview_dock = None
+        self.preview_point = None
+        self.preview_distance = None  # QgsDistanceArea set up in show_preview()
+        self.preview_timer = QTimer()
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_INTERVAL_MS)
+        self.preview_timer.timeout.connect(self.update_preview)
         
         # Create profile layer
         self.create_profile_layer()
@@ -49,8 +99,10 @@ class ProfileTool(QgsMapTool):
         # Create memory layer for profiles using project CRS
         project_crs = QgsProject.instance().crs()
         crs_string = project_crs.authid() if project_crs.isValid() else "EPSG:4326"
+        # length_3d is already part of the base fields; the other statistics are appended
+        stats_uri = "".join(f"&field={name}:double" for name in STATS_FIELDS if name != 'length_3d')
         self.profile_layer = QgsVectorLayer(
-            f"LineString?crs={crs_string}&field=id:integer&field=name:string&field=length_2d:double&field=length_3d:double&field=elev_a:double&field=elev_b:double", 
+            f"LineString?crs={crs_string}&field=id:integer&field=name:string&field=length_2d:double&field=length_3d:double&field=elev_a:double&field=elev_b:double{stats_uri}", 
             "Profili DEM", "memory")
         
         # Set dashed line style with arrows
@@ -67,6 +119,7 @@ class ProfileTool(QgsMapTool):
         
         # Simple marker symbols for start and end points will be added via labels
         
+        LayerRegistry.instance().register(self.profile_layer, ROLE_PROFILES)
         QgsProject.instance().addMapLayer(self.profile_layer)
         
     def activate(self):
@@ -75,6 +128,9 @@ class ProfileTool(QgsMapTool):
             dlg = DemSelectionDialog(self.iface)
             if dlg.exec_():
                 self.dem_layer = dlg.selected_layer
+                self.full_resolution = dlg.full_resolution
+                if self.dem_layer is not None:
+                    LayerRegistry.instance().register(self.dem_layer, ROLE_DEM)
                 self.canvas.setMapTool(self)
         else:
             self.canvas.setMapTool(self)
@@ -90,6 +146,7 @@ class ProfileTool(QgsMapTool):
             self.rubberBand.setWidth(2)
             self.rubberBand.setLineStyle(Qt.DashLine)
             self.rubberBand.addPoint(QgsPointXY(self.start_point))
+            self.show_preview()
         else:
             # Second click - end point
             end_point = point
@@ -113,44 +170,34 @@ class ProfileTool(QgsMapTool):
                     start_trans = transform.transform(self.start_point)
                     end_trans = transform.transform(end_point)
                 
-                # Get elevation at start point
-                result_a = self.dem_layer.dataProvider().identify(
-                    start_trans,
-                    QgsRaster.IdentifyFormatValue
-                )
-                elev_a = 0
-                if result_a.isValid():
-                    value = list(result_a.results().values())[0]
-                    if value is not None and not np.isnan(value):
-                        elev_a = value
-                
-                # Get elevation at end point
-                result_b = self.dem_layer.dataProvider().identify(
-                    end_trans,
-                    QgsRaster.IdentifyFormatValue
-                )
-                elev_b = 0
-                if result_b.isValid():
-                    value = list(result_b.results().values())[0]
-                    if value is not None and not np.isnan(value):
-                        elev_b = value
+                # Get elevation at start and end point (shared block cache)
+                values = sample_points(self.dem_layer.dataProvider(),
+                                       [start_trans.x(), end_trans.x()],
+                                       [start_trans.y(), end_trans.y()])
+                elev_a, elev_b = [0 if np.isnan(v) else float(v) for v in values]
             else:
                 elev_a = 0
                 elev_b = 0
             
             # Create profile line feature
-            feature = QgsFeature()
+            feature = QgsFeature(self.profile_layer.fields())
             feature.setGeometry(QgsGeometry.fromPolylineXY([self.start_point, end_point]))
             
             # Set attributes including calculated values
             letter_pair = self.get_next_letter_pair()
-            # Note: length_3d will be calculated after profile extraction
-            feature.setAttributes([self.profile_count, letter_pair, float(length_2d), 0.0, float(elev_a), float(elev_b)])
+            # Note: length_3d and the other statistics are calculated after profile extraction
+            feature.setAttribute('id', self.profile_count)
+            feature.setAttribute('name', letter_pair)
+            feature.setAttribute('length_2d', float(length_2d))
+            feature.setAttribute('length_3d', 0.0)
+            feature.setAttribute('elev_a', float(elev_a))
+            feature.setAttribute('elev_b', float(elev_b))
             
             # Add to layer and get the new feature id
             success, features = self.profile_layer.dataProvider().addFeatures([feature])
             if success and features:
                 self.current_feature_id = features[0].id()
+                self.feature_ids[self.profile_count] = self.current_feature_id
             else:
                 self.current_feature_id = None
                 
@@ -166,8 +213,9 @@ class ProfileTool(QgsMapTool):
             # Add labels
             self.add_labels(self.start_point, end_point, letter_pair)
             
-            # Extract and show profile (will update length_3d)
+            # Extract and show profile (queues the statistics update)
             self.extract_profile(self.start_point, end_point, letter_pair)
+            self.flush_attribute_updates()
             
             # Store geometry for later use with elevation profile
             QgsProject.instance().writeEntry("ClipRasterLayout", f"profile_geom_{letter_pair}", feature.geometry().asWkt())
@@ -177,6 +225,7 @@ class ProfileTool(QgsMapTool):
             self.rubberBand = None
             self.start_point = None
             self.profile_count += 1
+            self.reset_preview()
             
     def canvasMoveEvent(self, event):
         if self.start_point and self.rubberBand:
@@ -185,6 +234,65 @@ class ProfileTool(QgsMapTool):
             self.rubberBand.addPoint(QgsPointXY(self.start_point))
             self.rubberBand.addPoint(QgsPointXY(point))
             
+            # Coalesce moves: only the latest point is drawn when the timer fires
+            self.preview_point = point
+            if not self.preview_timer.isActive():
+                self.preview_timer.start()
+            
+    def deactivate(self):
+        self.reset_preview()
+        if self.archive is not None:
+            # Readable until the next profile reopens it
+            self.archive.close()
+        super().deactivate()
+        
+    def show_preview(self):
+        """Open the live preview panel for the section being drawn"""
+        if not self.dem_layer:
+            return
+        if self.preview_dock is None:
+            self.preview_dock = LiveProfilePreviewDock(self.iface.mainWindow())
+            self.iface.addDockWidget(Qt.BottomDockWidgetArea, self.preview_dock)
+        self.preview_dock.clear()
+        self.preview_dock.show()
+        # Preview distances in metres on the project ellipsoid, whatever the canvas CRS
+        self.preview_distance = QgsDistanceArea()
+        self.preview_distance.setSourceCrs(self.canvas.mapSettings().destinationCrs(),
+                                           QgsProject.instance().transformContext())
+        self.preview_distance.setEllipsoid(QgsProject.instance().ellipsoid())
+        
+    def reset_preview(self):
+        """Stop pending preview updates and clear the panel"""
+        self.preview_timer.stop()
+        self.preview_point = None
+        if self.preview_dock is not None:
+            self.preview_dock.clear()
+            
+    def update_preview(self):
+        """Sample the block cache along start point -> cursor and redraw"""
+        if not (self.dem_layer and self.start_point and self.preview_point and self.preview_dock):
+            return
+        try:
+            start, end = QgsPointXY(self.start_point), QgsPointXY(self.preview_point)
+            meters = Qgis.DistanceUnit.Meters if hasattr(Qgis, 'DistanceUnit') else QgsUnitTypes.DistanceMeters
+            length = self.preview_distance.convertLengthMeasurement(
+                self.preview_distance.measureLine(start, end), meters)
+            transform = QgsCoordinateTransform(
+                self.canvas.mapSettings().destinationCrs(), self.dem_layer.crs(), QgsProject.instance())
+            if transform.isValid():
+                start, end = transform.transform(start), transform.transform(end)
+            t = np.linspace(0.0, 1.0, PREVIEW_SAMPLES)
+            xs = start.x() + t * (end.x() - start.x())
+            ys = start.y() + t * (end.y() - start.y())
+            
+            # Coarse overview blocks: a handful of cached tiles cover the preview
+            provider = self.dem_layer.dataProvider()
+            dem_length = math.hypot(end.x() - start.x(), end.y() - start.y())
+            level = overview_level(provider, dem_length / PREVIEW_SAMPLES)
+            self.preview_dock.update_profile(t * length, sample_points(provider, xs, ys, level=level))
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Live preview failed: {str(e)}", "ClipRasterLayout", Qgis.Warning)
+            
     def get_next_letter_pair(self):
         letters = string.ascii_uppercase
         if self.profile_count < 13:  # A-B through Y-Z
@@ -234,110 +342,111 @@ class ProfileTool(QgsMapTool):
         sample_interval = min(1.0, length / 1000)  # Max 1000 points
         distances = np.arange(0, length, sample_interval)
         
-        elevations = []
-        valid_distances = []
-        
         # Transform to DEM CRS if needed
         transform = QgsCoordinateTransform(
             self.canvas.mapSettings().destinationCrs(),
             self.dem_layer.crs(),
             QgsProject.instance()
         )
-        
-        for dist in distances:
-            point = line.interpolatePoint(dist)
-            point_xy = QgsPointXY(point)
-            
-            # Transform point
-            if transform.isValid():
-                point_xy = transform.transform(point_xy)
-                
-            # Get elevation
-            result = self.dem_layer.dataProvider().identify(
-                point_xy,
-                QgsRaster.IdentifyFormatValue
-            )
-            
-            if result.isValid():
-                value = list(result.results().values())[0]
-                if value is not None and not np.isnan(value):
-                    elevations.append(value)
-                    valid_distances.append(dist)
+        start_xy, end_xy = QgsPointXY(start_point), QgsPointXY(end_point)
+        if transform.isValid():
+            start_xy = transform.transform(start_xy)
+            end_xy = transform.transform(end_xy)
+        
+        # Sample all stations at once through the shared block cache, from the
+        # overview level matching the sample spacing unless full resolution is on
+        t = distances / length if length > 0 else distances
+        xs = start_xy.x() + t * (end_xy.x() - start_xy.x())
+        ys = start_xy.y() + t * (end_xy.y() - start_xy.y())
+        provider = self.dem_layer.dataProvider()
+        level = 0
+        if not self.full_resolution and length > 0:
+            dem_length = math.hypot(end_xy.x() - start_xy.x(), end_xy.y() - start_xy.y())
+            level = overview_level(provider, sample_interval * dem_length / length)
+        values = sample_points(provider, xs, ys, level=level)
+        valid = ~np.isnan(values)
+        elevations = values[valid].astype(float).tolist()
+        valid_distances = distances[valid].tolist()
+        RasterBlockCache.instance().log_stats()
                     
         # Create profile plot
         if elevations:
-            # Calculate 3D length
-            length_3d = 0.0
-            if len(valid_distances) > 1:
-                for i in range(1, len(valid_distances)):
-                    dx = float(valid_distances[i] - valid_distances[i-1])
-                    dz = float(elevations[i] - elevations[i-1])
-                    length_3d += math.sqrt(dx*dx + dz*dz)
-            
-            # Update feature with 3D length
-            if hasattr(self, 'current_profile_info') and self.current_profile_info:
-                # Find feature by profile count (more reliable than feature id)
-                for feature in self.profile_layer.getFeatures():
-                    if feature['id'] == self.current_profile_info['profile_count']:
-                        self.profile_layer.startEditing()
-                        # Update length_3d field (index 3) - ensure it's a Python float
-                        self.profile_layer.changeAttributeValue(feature.id(), 3, float(length_3d))
-                        self.profile_layer.commitChanges()
-                        QgsMessageLog.logMessage(f"Updated profile {feature['name']} with 3D length: {length_3d:.2f}m", "ClipRasterLayout", Qgis.Info)
-                        break
+            # 3D length, elevation range, ascent/descent, slope and roughness
+            stats = profile_stats(valid_distances, elevations)
+            
+            # Queue the statistics for the feature of this profile
+            if stats and hasattr(self, 'current_profile_info') and self.current_profile_info:
+                fid = self.feature_ids.get(self.current_profile_info['profile_count'])
+                if fid is not None:
+                    self.pending_updates.setdefault(fid, {}).update(stats_attribute_map(self.profile_layer, stats))
+                    QgsMessageLog.logMessage(f"Profile {name}: 3D length {stats['length_3d']:.2f}m", "ClipRasterLayout", Qgis.Info)
             
-            self.create_profile_plot(valid_distances, elevations, name)
-            
-    def create_profile_plot(self, distances, elevations, name):
-        # Create matplotlib figure
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        # Plot profile
-        ax.plot(distances, elevations, 'b-', linewidth=2)
-        ax.fill_between(distances, elevations, alpha=0.3)
-        
-        # Set y-axis limits with margin
-        min_elev = min(elevations)
-        max_elev = max(elevations)
-        elev_range = max_elev - min_elev
-        
-        # Add 10% margin on top and bottom
-        margin = elev_range * 0.1 if elev_range > 0 else 1
-        ax.set_ylim(min_elev - margin, max_elev + margin)
-        
-        # Add grid
-        ax.grid(True, alpha=0.3)
-        
-        # Labels
-        ax.set_xlabel('Distanza (m)', fontsize=12)
-        ax.set_ylabel('Elevazione (m)', fontsize=12)
-        ax.set_title(f'Profilo Topografico {name}', fontsize=14, fontweight='bold')
-        
-        # Add min/max annotations
-        min_elev = min(elevations)
-        max_elev = max(elevations)
-        min_idx = elevations.index(min_elev)
-        max_idx = elevations.index(max_elev)
-        
-        ax.annotate(f'Min: {min_elev:.1f}m', 
-                   xy=(distances[min_idx], min_elev),
-                   xytext=(10, 10), textcoords='offset points',
-                   ha='left', fontsize=10,
-                   bbox=dict(boxstyle='round,pad=0.3', fc='yellow', alpha=0.7))
-                   
-        ax.annotate(f'Max: {max_elev:.1f}m', 
-                   xy=(distances[max_idx], max_elev),
-                   xytext=(10, -10), textcoords='offset points',
-                   ha='left', fontsize=10,
-                   bbox=dict(boxstyle='round,pad=0.3', fc='yellow', alpha=0.7))
-        
-        # Show plot
-        plt.tight_layout()
-        
-        # Save plot to user-specified directory or temp
-        import tempfile
-        import os
+            section = QgsGeometry.fromPolylineXY([QgsPointXY(start_point), QgsPointXY(end_point)])
+            self.create_profile_plot(valid_distances, elevations, name, stats, section.asWkt(), length)
+            
+    def flush_attribute_updates(self):
+        """Write all queued attribute changes in a single provider call"""
+        if not self.pending_updates:
+            return
+        if self.profile_layer.dataProvider().changeAttributeValues(self.pending_updates):
+            QgsMessageLog.logMessage(f"Updated attributes of {len(self.pending_updates)} profiles", "ClipRasterLayout", Qgis.Info)
+        else:
+            QgsMessageLog.logMessage("Failed to update profile attributes", "ClipRasterLayout", Qgis.Warning)
+        self.pending_updates = {}
+        self.profile_layer.triggerRepaint()
+        
+    def create_profile_plot(self, distances, elevations, name, stats=None, wkt=None, length=None):
+        save_dir = self.get_save_dir()
+        profile_path = profile_image_path(save_dir, name)
+        # Records keep compact arrays, not Python float lists
+        distances = np.asarray(distances, dtype=np.float32)
+        elevations = np.asarray(elevations, dtype=np.float32)
         
+        # Rendered by the worker pool; the tab is added when the image is ready
+        self.render_profile_image(distances, elevations, name, profile_path)
+        
+        # Store profile data
+        profile_data = {'name': name, 'distances': distances, 'elevations': elevations,
+                        'image_path': profile_path, 'stats': stats, 'wkt': wkt,
+                        'crs': self.canvas.mapSettings().destinationCrs().authid(),
+                        'length': float(length) if length is not None else None}
+        self.profiles.append(profile_data)
+        self.show_profile(profile_data)
+        
+        # Persist the sampled arrays so the session can be reloaded without resampling
+        try:
+            self.get_archive(save_dir).append(profile_data)
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Could not archive profile {name}: {str(e)}", "ClipRasterLayout", Qgis.Warning)
+        
+        # Store profile path in project custom properties
+        QgsProject.instance().writeEntry("ClipRasterLayout", f"profile_{name}", profile_path)
+        
+    def render_profile_image(self, distances, elevations, name, path):
+        """Queue the profile chart on the render workers (300 dpi PNG or SVG)"""
+        if not self.render_pool_connected:
+            pool = ProfileRenderPool.instance()
+            pool.rendered.connect(self.on_profile_rendered)
+            pool.failed.connect(self.on_profile_failed)
+            self.render_pool_connected = True
+        self.rendering[path] = name
+        ProfileRenderPool.instance().submit({
+            'name': name, 'path': path, 'style': 'topographic', 'dpi': 300,
+            'distances': distances, 'elevations': elevations})
+        
+    def on_profile_rendered(self, name, path):
+        """Log a finished profile image (used by the layouts)"""
+        if self.rendering.pop(path, None) is None:
+            return  # rendered for someone else (clip run, other tool)
+        QgsMessageLog.logMessage(f"Profile saved to: {path}", "ClipRasterLayout", Qgis.Info)
+        
+    def on_profile_failed(self, name, error):
+        for path, pending in list(self.rendering.items()):
+            if pending == name:
+                del self.rendering[path]
+        
+    def get_save_dir(self):
+        """Directory for profile images, asked once and stored in the project"""
         # Get save directory from project custom properties
         save_dir, _ = QgsProject.instance().readEntry("ClipRasterLayout", "profile_save_dir")
         if not save_dir or not os.path.exists(save_dir):
@@ -350,45 +459,123 @@ class ProfileTool(QgsMapTool):
             else:
                 # Use temp directory as fallback
                 save_dir = tempfile.gettempdir()
-        
-        profile_path = os.path.join(save_dir, f"profile_{name}.png")
-        fig.savefig(profile_path, dpi=300, bbox_inches='tight')
-        
-        # Debug: log where the file was saved
-        QgsMessageLog.logMessage(f"Profile saved to: {profile_path}", "ClipRasterLayout", Qgis.Info)
-        QgsMessageLog.logMessage(f"File exists: {os.path.exists(profile_path)}", "ClipRasterLayout", Qgis.Info)
-        
-        # Store profile data
-        profile_data = {'name': name, 'figure': fig, 'distances': distances, 'elevations': elevations, 'image_path': profile_path}
-        self.profiles.append(profile_data)
-        
-        # Store profile path in project custom properties
-        QgsProject.instance().writeEntry("ClipRasterLayout", f"profile_{name}", profile_path)
-        
-        # Create or update profile dock widget
+        return save_dir
+        
+    def get_archive(self, save_dir):
+        """Profile archive of this session (one NPZ per session)"""
+        if self.archive is None:
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            self.archive = ProfileArchive(os.path.join(save_dir, f"profiles_{stamp}.npz"), self.archive_metadata())
+            QgsMessageLog.logMessage(f"Profile archive: {self.archive.path}", "ClipRasterLayout", Qgis.Info)
+        return self.archive
+        
+    def archive_metadata(self):
+        """Run metadata stored with the NPZ archives of this session"""
+        metadata = {'full_resolution': self.full_resolution}
+        if self.dem_layer:
+            metadata.update(raster=self.dem_layer.name(),
+                            source=self.dem_layer.source(),
+                            raster_crs=self.dem_layer.crs().authid(),
+                            band=1)
+        return metadata
+        
+    def show_profile(self, profile):
+        """Add a profile record to the profile browser dock"""
         try:
             if self.profile_dock is None:
                 # Create the main dock widget if it doesn't exist
-                self.profile_dock = ProfileTabDockWidget(self.iface)
+                self.profile_dock = ProfileBrowserDockWidget(self.iface, profile_tool=self)
                 self.iface.addDockWidget(Qt.LeftDockWidgetArea, self.profile_dock)
                 self.profile_dock.show()
                 QgsMessageLog.logMessage("Created main profile dock widget", "ClipRasterLayout", Qgis.Info)
             
-            # Add new tab with the profile
-            canvas = FigureCanvas(fig)
-            self.profile_dock.add_profile_tab(canvas, name)
-            
-            QgsMessageLog.logMessage(f"Added profile tab for {name}", "ClipRasterLayout", Qgis.Info)
+            self.profile_dock.add_profile(profile)
             
         except Exception as e:
             QgsMessageLog.logMessage(f"Failed to create/update dock widget: {str(e)}", "ClipRasterLayout", Qgis.Warning)
-            # Fallback to dialog
-            try:
-                dlg = ProfileDialog(fig, name)
-                dlg.show()
-                QgsMessageLog.logMessage(f"Created profile dialog for {name} as fallback", "ClipRasterLayout", Qgis.Info)
-            except Exception as e2:
-                QgsMessageLog.logMessage(f"Failed to create profile dialog: {str(e2)}", "ClipRasterLayout", Qgis.Critical)
+            
+    def memory_usage(self):
+        """(bytes of the profile arrays, bytes of the browser thumbnails)"""
+        data = sum(np.asarray(profile[key]).nbytes for profile in self.profiles
+                   for key in ('distances', 'elevations'))
+        thumbnails = self.profile_dock.model.thumbnail_bytes() if self.profile_dock is not None else 0
+        return data, thumbnails
+        
+    def memory_report(self):
+        data, thumbnails = self.memory_usage()
+        return (f"{len(self.profiles)} profili, dati {data / 1048576:.1f} MB, "
+                f"anteprime {thumbnails / 1048576:.1f} MB")
+        
+    def export_profiles(self, path):
+        """Export the sampled profiles to NPZ, CSV or GeoPackage"""
+        export_profiles(path, self.profiles, self.profile_layer.crs(), self.archive_metadata())
+        QgsMessageLog.logMessage(f"Exported {len(self.profiles)} profiles to {path}", "ClipRasterLayout", Qgis.Info)
+        
+    def load_profiles(self, path):
+        """Restore profiles from an archive without resampling the DEM
+        
+        Sections are added back to the "Profili DEM" layer with their
+        statistics, images are re-rendered only if missing and the project
+        entries used by the layout generator are written again.
+        """
+        run = read_archive_metadata(path)
+        layer_crs = self.profile_layer.crs()
+        loaded = 0
+        for record in read_archive(path):
+            name = record['name']
+            distances, elevations = record['distances'], record['elevations']
+            if not len(elevations):
+                continue
+            
+            # Section feature with its statistics
+            if record.get('wkt'):
+                geom = QgsGeometry.fromWkt(record['wkt'])
+                record_crs = QgsCoordinateReferenceSystem(record.get('crs') or '')
+                if record_crs.isValid() and record_crs != layer_crs:
+                    geom.transform(QgsCoordinateTransform(record_crs, layer_crs, QgsProject.instance()))
+                feature = QgsFeature(self.profile_layer.fields())
+                feature.setGeometry(geom)
+                feature.setAttribute('id', self.profile_count)
+                feature.setAttribute('name', name)
+                feature.setAttribute('length_2d', float(geom.length()))
+                feature.setAttribute('elev_a', float(elevations[0]))
+                feature.setAttribute('elev_b', float(elevations[-1]))
+                for field, value in (record.get('stats') or {}).items():
+                    if field in STATS_FIELDS:
+                        feature.setAttribute(field, value)
+                success, features = self.profile_layer.dataProvider().addFeatures([feature])
+                if success and features:
+                    self.feature_ids[self.profile_count] = features[0].id()
+                # Labels are placed in canvas coordinates
+                label_geom = QgsGeometry(geom)
+                canvas_crs = self.canvas.mapSettings().destinationCrs()
+                if canvas_crs != layer_crs:
+                    label_geom.transform(QgsCoordinateTransform(layer_crs, canvas_crs, QgsProject.instance()))
+                vertices = label_geom.asPolyline()
+                if vertices:
+                    self.add_labels(vertices[0], vertices[-1], name)
+                QgsProject.instance().writeEntry("ClipRasterLayout", f"profile_geom_{name}", geom.asWkt())
+            
+            # Reuse the saved image when it is still on disk
+            image_path = record.get('image_path')
+            if not image_path or not os.path.exists(image_path):
+                image_path = profile_image_path(self.get_save_dir(), name)
+                self.render_profile_image(distances, elevations, name, image_path)
+            QgsProject.instance().writeEntry("ClipRasterLayout", f"profile_{name}", image_path)
+            
+            profile = {'name': name, 'distances': distances, 'elevations': elevations,
+                       'image_path': image_path, 'stats': record.get('stats'),
+                       'wkt': record.get('wkt'), 'crs': record.get('crs'), 'length': record.get('length')}
+            self.profiles.append(profile)
+            self.show_profile(profile)
+            self.profile_count += 1
+            loaded += 1
+            
+        self.profile_layer.updateExtents()
+        self.profile_layer.triggerRepaint()
+        QgsMessageLog.logMessage(f"Loaded {loaded} profiles from {path} (raster: {run.get('raster', '-')}; {self.memory_report()})",
+                                 "ClipRasterLayout", Qgis.Info)
+        return loaded
         
         
 class DemSelectionDialog(QDialog):
@@ -396,6 +583,7 @@ class DemSelectionDialog(QDialog):
         super().__init__(parent)
         self.iface = iface
         self.selected_layer = None
+        self.full_resolution = False
         self.setupUi()
         
     def setupUi(self):
@@ -405,12 +593,21 @@ class DemSelectionDialog(QDialog):
         layout.addWidget(QLabel("Seleziona il layer DEM:"))
         
         self.layer_combo = QComboBox()
-        for layer in QgsProject.instance().mapLayers().values():
-            if isinstance(layer, QgsRasterLayer):
-                self.layer_combo.addItem(layer.name(), layer)
+        registry = LayerRegistry.instance()
+        rasters = registry.raster_layers()
+        for layer in rasters:
+            self.layer_combo.addItem(layer.name(), layer)
+        # Preselect the DEM used last (or the likeliest one)
+        dem = registry.dem_layer()
+        if dem in rasters:
+            self.layer_combo.setCurrentIndex(rasters.index(dem))
                 
         layout.addWidget(self.layer_combo)
         
+        self.full_res_check = QCheckBox("Risoluzione piena (non usare le overview)")
+        self.full_res_check.setToolTip("Campiona ogni pixel del DEM: più lento sulle sezioni lunghe")
+        layout.addWidget(self.full_res_check)
+        
         self.ok_button = QPushButton("OK")
         self.ok_button.clicked.connect(self.accept)
         layout.addWidget(self.ok_button)
@@ -419,6 +616,7 @@ class DemSelectionDialog(QDialog):
         
     def accept(self):
         self.selected_layer = self.layer_combo.currentData()
+        self.full_resolution = self.full_res_check.isChecked()
         super().accept()
         
 class ProfileSaveDialog(QDialog):
@@ -467,22 +665,67 @@ class ProfileSaveDialog(QDialog):
         else:
             QMessageBox.warning(self, "Attenzione", "Seleziona una cartella")
 
-class ProfileTabDockWidget(QDockWidget):
-    def __init__(self, iface, parent=None):
+class ProfileBrowserDockWidget(QDockWidget):
+    """List of the session profiles with one chart showing the selected one
+    
+    The list is a model/view (only visible rows are painted) filtered by
+    name; the chart is drawn on demand from the profile arrays and the
+    thumbnails are generated a few at a time while the GUI is idle.
+    """
+    def __init__(self, iface, parent=None, profile_tool=None):
         super().__init__("Profili DEM", parent)
         self.iface = iface
+        self.profile_tool = profile_tool
         self.elevation_profiles = []  # Store references to elevation profile windows
         
         # Set object name for saving state
         self.setObjectName("ProfileTabDock")
         
-        # Create tab widget
-        self.tab_widget = QTabWidget()
+        # Profile list filtered by name
+        self.model = ProfileListModel(self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt_CaseInsensitive)
+        
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filtra per nome...")
+        self.filter_edit.textChanged.connect(self.proxy.setFilterFixedString)
+        
+        self.list_view = QListView()
+        self.list_view.setModel(self.proxy)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setIconSize(QSize(*THUMBNAIL_SIZE))
+        self.list_view.selectionModel().currentChanged.connect(self.on_current_changed)
+        
+        list_widget = QWidget()
+        list_layout = QVBoxLayout()
+        list_layout.setContentsMargins(0, 0, 0, 0)
+        list_layout.addWidget(self.filter_edit)
+        list_layout.addWidget(self.list_view)
+        list_widget.setLayout(list_layout)
+        
+        # Single chart for the selected profile
+        self.profile_canvas = ProfileView()
+        
+        splitter = QSplitter()
+        splitter.addWidget(list_widget)
+        splitter.addWidget(self.profile_canvas)
+        splitter.setStretchFactor(1, 3)
         
         # Create main widget
         widget = QWidget()
         layout = QVBoxLayout()
-        layout.addWidget(self.tab_widget)
+        layout.addWidget(splitter)
+        
+        # Memory used by the profiles of the session
+        self.memory_label = QLabel()
+        layout.addWidget(self.memory_label)
+        
+        # Thumbnails still to draw (source rows)
+        self.thumbnail_queue = deque()
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setInterval(0)
+        self.thumbnail_timer.timeout.connect(self.draw_thumbnails)
         
         # Add button bar
         button_layout = QHBoxLayout()
@@ -503,6 +746,18 @@ class ProfileTabDockWidget(QDockWidget):
         all_profiles_btn.clicked.connect(self.prepare_profiles_for_layout)
         button_layout.addWidget(all_profiles_btn)
         
+        # Export / reload of the sampled profiles
+        if self.profile_tool is not None:
+            export_btn = QPushButton("Esporta profili...")
+            export_btn.setToolTip("Salva distanze, quote e statistiche in NPZ, CSV o GeoPackage")
+            export_btn.clicked.connect(self.export_profiles)
+            button_layout.addWidget(export_btn)
+            
+            load_btn = QPushButton("Carica profili...")
+            load_btn.setToolTip("Ricarica profili salvati senza ricampionare il DEM")
+            load_btn.clicked.connect(self.load_profiles)
+            button_layout.addWidget(load_btn)
+        
         layout.addLayout(button_layout)
         
         widget.setLayout(layout)
@@ -515,24 +770,78 @@ class ProfileTabDockWidget(QDockWidget):
         # Allow docking on all sides
         self.setAllowedAreas(Qt.AllDockWidgetAreas)
         
-    def add_profile_tab(self, canvas, name):
-        """Add a new profile tab"""
-        # Create widget for the tab
-        tab_widget = QWidget()
-        layout = QVBoxLayout()
-        layout.addWidget(canvas)
-        tab_widget.setLayout(layout)
-        
-        # Add tab
-        self.tab_widget.addTab(tab_widget, name)
-        
-        # Switch to new tab
-        self.tab_widget.setCurrentIndex(self.tab_widget.count() - 1)
+    def add_profile(self, profile):
+        """Append a profile to the list and select it"""
+        row = self.model.add_profile(profile)
+        self.thumbnail_queue.append(row)
+        if not self.thumbnail_timer.isActive():
+            self.thumbnail_timer.start()
+        index = self.proxy.mapFromSource(self.model.index(row))
+        if index.isValid():
+            self.list_view.setCurrentIndex(index)
+        self.update_memory_label()
+        
+    def on_current_changed(self, current, previous):
+        if not current.isValid():
+            self.profile_canvas.clear()
+            return
+        profile = self.model.profile(self.proxy.mapToSource(current).row())
+        self.profile_canvas.set_profile(profile['distances'], profile['elevations'], f"Profilo {profile['name']}")
+        
+    def draw_thumbnails(self):
+        """Draw a batch of pending thumbnails; stops when the queue is empty"""
+        for _ in range(THUMBNAIL_BATCH):
+            if not self.thumbnail_queue:
+                self.thumbnail_timer.stop()
+                self.update_memory_label()
+                return
+            row = self.thumbnail_queue.popleft()
+            if row < self.model.rowCount():
+                profile = self.model.profile(row)
+                self.model.set_thumbnail(row, profile_thumbnail(profile['distances'], profile['elevations']))
         
     def close_all_profiles(self):
-        """Close all profile tabs"""
-        self.tab_widget.clear()
-        
+        """Empty the profile list and release the profile arrays
+
+        The profiles stay in the session archive and can be loaded again.
+        """
+        self.thumbnail_timer.stop()
+        self.thumbnail_queue.clear()
+        self.model.clear()
+        if self.profile_tool is not None:
+            self.profile_tool.profiles.clear()
+        self.profile_canvas.clear()
+        self.update_memory_label()
+        
+    def update_memory_label(self, *args):
+        if self.profile_tool is not None:
+            self.memory_label.setText(self.profile_tool.memory_report())
+        
+    def export_profiles(self):
+        """Ask for a file and export the sampled profiles"""
+        if not self.profile_tool.profiles:
+            QMessageBox.information(self, "Esporta profili", "Nessun profilo da esportare")
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Esporta profili", "",
+            "Archivio profili (*.npz);;CSV (*.csv);;GeoPackage (*.gpkg)")
+        if not path:
+            return
+        try:
+            self.profile_tool.export_profiles(path)
+        except Exception as e:
+            QMessageBox.warning(self, "Esporta profili", f"Esportazione non riuscita: {str(e)}")
+            
+    def load_profiles(self):
+        """Ask for an archive and restore its profiles"""
+        path, _ = QFileDialog.getOpenFileName(self, "Carica profili", "", "Archivio profili (*.npz)")
+        if not path:
+            return
+        try:
+            self.profile_tool.load_profiles(path)
+        except Exception as e:
+            QMessageBox.warning(self, "Carica profili", f"Caricamento non riuscito: {str(e)}")
+            
     def open_elevation_profile(self):
         """Open QGIS elevation profile panel and create profiles for all sections"""
         try:
@@ -580,11 +889,7 @@ class ProfileTabDockWidget(QDockWidget):
             QgsMessageLog.logMessage("Starting sequential profile creation...", "ClipRasterLayout", Qgis.Info)
             
             # Get the profile layer
-            profile_layer = None
-            for layer in QgsProject.instance().mapLayers().values():
-                if layer.name() == "Profili DEM":
-                    profile_layer = layer
-                    break
+            profile_layer = LayerRegistry.instance().layer(ROLE_PROFILES)
             
             if not profile_layer:
                 QgsMessageLog.logMessage("Profile layer not found", "ClipRasterLayout", Qgis.Warning)
@@ -756,11 +1061,7 @@ class ProfileTabDockWidget(QDockWidget):
             
             if capture_button:
                 # Select the profile feature in the layer FIRST
-                profile_layer = None
-                for layer in QgsProject.instance().mapLayers().values():
-                    if layer.name() == "Profili DEM":
-                        profile_layer = layer
-                        break
+                profile_layer = LayerRegistry.instance().layer(ROLE_PROFILES)
                 
                 if profile_layer:
                     # Clear any existing selection
@@ -801,10 +1102,9 @@ class ProfileTabDockWidget(QDockWidget):
         """Finish configuration after curve capture"""
         try:
             # Clear selection
-            for layer in QgsProject.instance().mapLayers().values():
-                if layer.name() == "Profili DEM":
-                    layer.removeSelection()
-                    break
+            profile_layer = LayerRegistry.instance().layer(ROLE_PROFILES)
+            if profile_layer is not None:
+                profile_layer.removeSelection()
             
             # Store that this profile is ready
             QgsProject.instance().writeEntry("ClipRasterLayout", f"profile_ready_{profile_name}", "yes")
@@ -832,6 +1132,15 @@ class ProfileTabDockWidget(QDockWidget):
         self.process_next_profile()
     
 
+def figure_canvas(figure):
+    """Qt canvas for a matplotlib figure (matplotlib imported only here)"""
+    try:
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+    except ImportError:  # matplotlib < 3.5
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+    return FigureCanvasQTAgg(figure)
+
+
 class ProfileDockWidget(QDockWidget):
     def __init__(self, figure, name, iface, parent=None):
         super().__init__(f"Profilo {name}", parent)
@@ -845,8 +1154,9 @@ class ProfileDockWidget(QDockWidget):
         widget = QWidget()
         layout = QVBoxLayout()
         
-        # Add matplotlib canvas
-        canvas = FigureCanvas(figure)
+        # Add matplotlib canvas (dense lines decimated for display)
+        decimate_figure_lines(figure)
+        canvas = figure_canvas(figure)
         layout.addWidget(canvas)
         
         # Add close button
@@ -867,6 +1177,103 @@ class ProfileDockWidget(QDockWidget):
         # Make it floating by default if preferred
         self.setFloating(False)
 
+def profile_thumbnail(distances, elevations, size=THUMBNAIL_SIZE):
+    """Small line drawing of a profile for the browser list"""
+    width, height = size
+    pixmap = QPixmap(width, height)
+    pixmap.fill(QColor(255, 255, 255))
+    d = np.asarray(distances, dtype=np.float64)
+    z = np.asarray(elevations, dtype=np.float64)
+    valid = ~np.isnan(z)
+    d, z = d[valid], z[valid]
+    if len(z) < 2:
+        return pixmap
+    # About two points per pixel column are enough at this size
+    if len(z) > 2 * width:
+        keep = np.linspace(0, len(z) - 1, 2 * width).astype(int)
+        d, z = d[keep], z[keep]
+    x = (d - d[0]) / ((d[-1] - d[0]) or 1.0) * (width - 3) + 1
+    y = (height - 2) - (z - z.min()) / ((z.max() - z.min()) or 1.0) * (height - 4)
+    
+    painter = QPainter(pixmap)
+    painter.setRenderHint(QPainter_Antialiasing)
+    painter.setPen(QPen(QColor(31, 119, 180), 1.2))
+    painter.drawPolyline(QPolygonF([QPointF(px, py) for px, py in zip(x, y)]))
+    painter.end()
+    return pixmap
+    
+    
+class ProfileListModel(QAbstractListModel):
+    """Profile records of the session with their thumbnails"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.profiles = []
+        self.thumbnails = {}  # row -> QPixmap
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.profiles)
+        
+    def data(self, index, role=Qt_DisplayRole):
+        if not index.isValid():
+            return None
+        profile = self.profiles[index.row()]
+        if role == Qt_DisplayRole:
+            return profile['name']
+        if role == Qt_DecorationRole:
+            return self.thumbnails.get(index.row())
+        if role == Qt_ToolTipRole:
+            stats = profile.get('stats') or {}
+            if not stats:
+                return profile['name']
+            return (f"{profile['name']}: lunghezza 3D {stats['length_3d']:.1f} m, "
+                    f"quote {stats['elev_min']:.1f}-{stats['elev_max']:.1f} m, "
+                    f"pendenza max {stats['max_slope']:.1f}°")
+        return None
+        
+    def profile(self, row):
+        return self.profiles[row]
+        
+    def add_profile(self, profile):
+        row = len(self.profiles)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.profiles.append(profile)
+        self.endInsertRows()
+        return row
+        
+    def set_thumbnail(self, row, pixmap):
+        self.thumbnails[row] = pixmap
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt_DecorationRole])
+        
+    def thumbnail_bytes(self):
+        return sum(p.width() * p.height() * p.depth() // 8 for p in self.thumbnails.values())
+        
+    def clear(self):
+        self.beginResetModel()
+        self.profiles = []
+        self.thumbnails = {}
+        self.endResetModel()
+        
+        
+class LiveProfilePreviewDock(QDockWidget):
+    """Small panel showing the profile under the rubber band while drawing"""
+    def __init__(self, parent=None):
+        super().__init__("Anteprima profilo", parent)
+        self.setObjectName("ProfilePreviewDock")
+        
+        # Native chart: every move only swaps the arrays and repaints
+        self.view = ProfileView(compact=True)
+        self.view.setMinimumHeight(120)
+        self.setWidget(self.view)
+        self.setAllowedAreas(Qt.AllDockWidgetAreas)
+        
+    def update_profile(self, distances, elevations):
+        self.view.set_profile(distances, elevations)
+        
+    def clear(self):
+        self.view.clear()
+
+
 class ProfileDialog(QDialog):
     def __init__(self, figure, name, parent=None):
         super().__init__(parent)
@@ -874,7 +1281,8 @@ class ProfileDialog(QDialog):
         self.setMinimumSize(800, 600)
         
         layout = QVBoxLayout()
-        canvas = FigureCanvas(figure)
+        decimate_figure_lines(figure)
+        canvas = figure_canvas(figure)
         layout.addWidget(canvas)
         
         # Add close button
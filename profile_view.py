@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# File: profile_view.py
+# Profile chart widget drawn with QPainter (no matplotlib), with a hover
+# readout of distance and elevation.
+# Compatible with QGIS 3.x (Qt5) and QGIS 4.x (Qt6)
+# -----------------------------------------------------------------------------
+import math
+
+import numpy as np
+from qgis.PyQt.QtCore import Qt, QPointF, QRectF
+from qgis.PyQt.QtGui import QColor, QPen, QBrush, QFont, QPainter, QPolygonF, QFontMetrics
+from qgis.PyQt.QtWidgets import QWidget
+
+from .profile_decimate import decimate
+
+# Qt5/Qt6 compatibility
+if hasattr(Qt, 'AlignmentFlag'):
+    Qt_AlignCenter = Qt.AlignmentFlag.AlignCenter
+    Qt_NoPen = Qt.PenStyle.NoPen
+    Qt_DashLine = Qt.PenStyle.DashLine
+    QPainter_Antialiasing = QPainter.RenderHint.Antialiasing
+else:
+    Qt_AlignCenter = Qt.AlignCenter
+    Qt_NoPen = Qt.NoPen
+    Qt_DashLine = Qt.DashLine
+    QPainter_Antialiasing = QPainter.Antialiasing
+
+LINE_COLOR = QColor(31, 119, 180)
+FILL_COLOR = QColor(31, 119, 180, 76)
+GRID_COLOR = QColor(0, 0, 0, 30)
+HOVER_COLOR = QColor(214, 39, 40)
+
+
+def nice_ticks(low, high, count=6):
+    """Round tick values (1, 2, 5 x 10^n steps) covering low..high"""
+    span = high - low
+    if not math.isfinite(span) or span <= 0:
+        return [low]
+    raw = span / max(count, 1)
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    first = math.ceil(low / step) * step
+    return [first + i * step for i in range(int((high - first) / step + 1e-9) + 1)]
+
+
+def _tick_label(value, step):
+    return f"{value:.0f}" if step >= 1 else f"{value:.{min(3, -math.floor(math.log10(step)))}f}"
+
+
+class ProfileView(QWidget):
+    """Distance/elevation chart of one profile
+
+    The arrays are kept as given; what is drawn is decimated (min-max per
+    pixel column) to the widget width, so redraws cost the same for short
+    and native-resolution profiles. Moving the mouse over the chart shows
+    the distance and elevation of the nearest sample.
+    """
+
+    def __init__(self, parent=None, x_label='Distanza (m)', y_label='Elevazione (m)', compact=False):
+        super().__init__(parent)
+        self.x_label = x_label
+        self.y_label = y_label
+        self.compact = compact
+        self.title = ''
+        self.distances = np.empty(0)
+        self.elevations = np.empty(0)
+        self.drawn = None  # (width, distances, elevations) decimated for that width
+        self.hover = None  # index of the sample under the mouse
+        self.setMouseTracking(True)
+        self.setMinimumSize(200, 100 if compact else 160)
+
+    def set_profile(self, distances, elevations, title=''):
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.elevations = np.asarray(elevations, dtype=np.float64)
+        self.title = title
+        self.drawn = None
+        self.hover = None
+        self.update()
+
+    def clear(self):
+        self.set_profile([], [])
+
+    # Geometry -----------------------------------------------------------------
+
+    def _plot_rect(self):
+        font = QFontMetrics(self.font())
+        left = font.horizontalAdvance('00000.0') + (10 if self.compact else 24)
+        bottom = font.height() * (1.4 if self.compact else 2.6)
+        top = font.height() * (0.6 if self.compact or not self.title else 2.0)
+        return QRectF(left, top, max(1.0, self.width() - left - 12), max(1.0, self.height() - top - bottom))
+
+    def _limits(self):
+        d, z = self.distances, self.elevations[~np.isnan(self.elevations)]
+        x0, x1 = float(d[0]), float(d[-1])
+        if x1 <= x0:
+            x1 = x0 + 1.0
+        low, high = float(z.min()), float(z.max())
+        pad = (high - low) * 0.1 if high > low else 1.0
+        return x0, x1, low - pad, high + pad
+
+    def _decimated(self, width):
+        if self.drawn is None or self.drawn[0] != width:
+            d, z = decimate(self.distances, self.elevations, width)
+            self.drawn = (width, d, z)
+        return self.drawn[1], self.drawn[2]
+
+    # Painting -----------------------------------------------------------------
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(255, 255, 255))
+        if len(self.distances) < 2 or np.isnan(self.elevations).all():
+            painter.end()
+            return
+        painter.setRenderHint(QPainter_Antialiasing)
+        rect = self._plot_rect()
+        x0, x1, y0, y1 = self._limits()
+        sx = rect.width() / (x1 - x0)
+        sy = rect.height() / (y1 - y0)
+
+        def to_x(value):
+            return rect.left() + (value - x0) * sx
+
+        def to_y(value):
+            return rect.bottom() - (value - y0) * sy
+
+        self._draw_axes(painter, rect, x0, x1, y0, y1, to_x, to_y)
+
+        # Curve and fill, one polygon per run of valid samples
+        d, z = self._decimated(max(1, int(rect.width())))
+        px, py = to_x(d), to_y(z)
+        valid = ~np.isnan(z)
+        breaks = np.flatnonzero(np.diff(valid.astype(np.int8))) + 1
+        painter.setClipRect(rect)
+        for segment in np.split(np.arange(len(z)), breaks):
+            if not len(segment) or not valid[segment[0]]:
+                continue
+            points = [QPointF(x, y) for x, y in zip(px[segment], py[segment])]
+            fill = QPolygonF(points + [QPointF(points[-1].x(), rect.bottom()), QPointF(points[0].x(), rect.bottom())])
+            painter.setPen(Qt_NoPen)
+            painter.setBrush(QBrush(FILL_COLOR))
+            painter.drawPolygon(fill)
+            painter.setPen(QPen(LINE_COLOR, 1.5))
+            painter.drawPolyline(QPolygonF(points))
+        painter.setClipping(False)
+
+        if self.hover is not None:
+            self._draw_hover(painter, rect, to_x, to_y)
+        painter.end()
+
+    def _draw_axes(self, painter, rect, x0, x1, y0, y1, to_x, to_y):
+        metrics = painter.fontMetrics()
+        painter.setPen(QPen(GRID_COLOR, 1))
+        x_ticks = nice_ticks(x0, x1, max(2, int(rect.width() / 90)))
+        y_ticks = nice_ticks(y0, y1, max(2, int(rect.height() / 40)))
+        for value in x_ticks:
+            painter.drawLine(QPointF(to_x(value), rect.top()), QPointF(to_x(value), rect.bottom()))
+        for value in y_ticks:
+            painter.drawLine(QPointF(rect.left(), to_y(value)), QPointF(rect.right(), to_y(value)))
+
+        painter.setPen(QPen(QColor(0, 0, 0), 1))
+        painter.drawRect(rect)
+        x_step = x_ticks[1] - x_ticks[0] if len(x_ticks) > 1 else 1
+        y_step = y_ticks[1] - y_ticks[0] if len(y_ticks) > 1 else 1
+        for value in x_ticks:
+            text = _tick_label(value, x_step)
+            painter.drawText(QPointF(to_x(value) - metrics.horizontalAdvance(text) / 2,
+                                     rect.bottom() + metrics.ascent() + 3), text)
+        for value in y_ticks:
+            text = _tick_label(value, y_step)
+            painter.drawText(QPointF(rect.left() - metrics.horizontalAdvance(text) - 4,
+                                     to_y(value) + metrics.ascent() / 2 - 1), text)
+        if self.compact:
+            return
+
+        painter.drawText(QPointF(rect.center().x() - metrics.horizontalAdvance(self.x_label) / 2,
+                                 rect.bottom() + metrics.height() * 2.3), self.x_label)
+        painter.save()
+        painter.translate(metrics.height() * 0.9, rect.center().y() + metrics.horizontalAdvance(self.y_label) / 2)
+        painter.rotate(-90)
+        painter.drawText(QPointF(0, 0), self.y_label)
+        painter.restore()
+        if self.title:
+            font = QFont(painter.font())
+            font.setBold(True)
+            painter.setFont(font)
+            width = QFontMetrics(font).horizontalAdvance(self.title)
+            painter.drawText(QPointF(rect.center().x() - width / 2, rect.top() - metrics.height() * 0.6), self.title)
+            painter.setFont(self.font())
+
+    def _draw_hover(self, painter, rect, to_x, to_y):
+        distance, elevation = float(self.distances[self.hover]), float(self.elevations[self.hover])
+        x, y = to_x(distance), to_y(elevation)
+        painter.setPen(QPen(HOVER_COLOR, 1, Qt_DashLine))
+        painter.drawLine(QPointF(x, rect.top()), QPointF(x, rect.bottom()))
+        painter.setPen(QPen(HOVER_COLOR, 1))
+        painter.setBrush(QBrush(HOVER_COLOR))
+        painter.drawEllipse(QPointF(x, y), 3, 3)
+
+        text = f"{distance:.1f} m  |  {elevation:.2f} m"
+        metrics = painter.fontMetrics()
+        box = QRectF(0, 0, metrics.horizontalAdvance(text) + 10, metrics.height() + 4)
+        box.moveTopLeft(QPointF(x + 8, rect.top() + 4))
+        if box.right() > rect.right():
+            box.moveRight(x - 8)
+        painter.setBrush(QBrush(QColor(255, 255, 255, 220)))
+        painter.drawRect(box)
+        painter.setPen(QPen(QColor(0, 0, 0), 1))
+        painter.drawText(box, Qt_AlignCenter, text)
+
+    # Hover readout -------------------------------------------------------------
+
+    def mouseMoveEvent(self, event):
+        hover = None
+        if len(self.distances) >= 2:
+            rect = self._plot_rect()
+            x = event.pos().x()
+            if rect.left() <= x <= rect.right():
+                x0, x1, _, _ = self._limits()
+                distance = x0 + (x - rect.left()) / rect.width() * (x1 - x0)
+                index = int(np.clip(np.searchsorted(self.distances, distance), 1, len(self.distances) - 1))
+                if distance - self.distances[index - 1] < self.distances[index] - distance:
+                    index -= 1
+                if not np.isnan(self.elevations[index]):
+                    hover = index
+        if hover != self.hover:
+            self.hover = hover
+            self.update()
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        if self.hover is not None:
+            self.hover = None
+            self.update()
+        super().leaveEvent(event)